@@ -1,4 +1,4 @@
-import copy
+from functools import partial
 
 from farmgym.v2.entities.Cide import Cide
 from farmgym.v2.entities.Pests import Pests
@@ -7,7 +7,7 @@ from farmgym.v2.entities.Pollinators import Pollinators
 from farmgym.v2.entities.Soil import Soil
 from farmgym.v2.entities.Weather import Weather
 from farmgym.v2.entities.Weeds import Weeds
-from farmgym.v2.policy_api import Policy_API, Policy_helper, run_policy_xp
+from farmgym.v2.policy_api import Policy_API, Policy_helper, evaluate_policy
 
 from utils import make_basicfarm, plot_coupling_results, plot_watering_results
 
@@ -16,51 +16,63 @@ field0 = {
     "shape": {"length#nb": 1, "width#nb": 1, "scale#m": 1.0},
 }
 
-f1 = make_basicfarm(
-    "dry_clay_bean", field0, [(Weather, "dry"), (Soil, "clay"), (Plant, "bean")]
+f1 = partial(
+    make_basicfarm,
+    "dry_clay_bean",
+    field0,
+    [(Weather, "dry"), (Soil, "clay"), (Plant, "bean")],
 )
-f2 = make_basicfarm(
+f2 = partial(
+    make_basicfarm,
     "dry_sand_bean",
     field0,
     [(Weather, "dry"), (Soil, "sand"), (Plant, "bean")],
 )
-f3 = make_basicfarm(
+f3 = partial(
+    make_basicfarm,
     "dry_clay_corn",
     field0,
     [(Weather, "dry"), (Soil, "clay"), (Plant, "corn")],
 )
-f4 = make_basicfarm(
+f4 = partial(
+    make_basicfarm,
     "dry_sand_corn",
     field0,
     [(Weather, "dry"), (Soil, "sand"), (Plant, "corn")],
 )
-f5 = make_basicfarm(
+f5 = partial(
+    make_basicfarm,
     "dry_clay_tomato",
     field0,
     [(Weather, "dry"), (Soil, "clay"), (Plant, "tomato")],
 )
-f6 = make_basicfarm(
+f6 = partial(
+    make_basicfarm,
     "dry_sand_tomato",
     field0,
     [(Weather, "dry"), (Soil, "sand"), (Plant, "tomato")],
 )
-f7 = make_basicfarm(
+f7 = partial(
+    make_basicfarm,
     "dry_clay_bean_pollinator",
     field0,
     [(Weather, "dry"), (Soil, "clay"), (Plant, "bean"), (Pollinators, "bee")],
 )
-f8 = make_basicfarm(
+f8 = partial(
+    make_basicfarm,
     "dry_clay_corn_pollinator",
     field0,
     [(Weather, "dry"), (Soil, "clay"), (Plant, "corn"), (Pollinators, "bee")],
 )
-f9 = make_basicfarm(
+f9 = partial(
+    make_basicfarm,
     "dry_clay_tomato_pollinator",
     field0,
     [(Weather, "dry"), (Soil, "clay"), (Plant, "tomato"), (Pollinators, "bee")],
 )
 
-ff1 = make_basicfarm(
+ff1 = partial(
+    make_basicfarm,
     "coupling_weeds_pests",
     field0,
     [
@@ -74,7 +86,8 @@ ff1 = make_basicfarm(
     ],
 )
 
-ff2 = make_basicfarm(
+ff2 = partial(
+    make_basicfarm,
     "coupling_weeds_nopests",
     field0,
     [
@@ -132,16 +145,14 @@ def xp_coupling(cide_amount, water_amount):
 
     results = []
     for f in farms:
+        farm = f()
         for p in range(len(policy_parameters)):
             policy = make_policy_herbicide(
-                f, cide_amount, policy_parameters[p], water_amount
+                farm, cide_amount, policy_parameters[p], water_amount
             )
-            cumrewards = []
-            for n in range(nb_replicate):
-                cr, _ = run_policy_xp(f, copy.deepcopy(policy), max_steps=150)
-                cr /= scale
-                cumrewards.append(cr)
-            results.append({"farm": f.name, "r": cumrewards})
+            xp = evaluate_policy(f, policy, nb_replicate, max_steps=150)
+            cumrewards = xp["rewards"] / scale
+            results.append({"farm": farm.name, "r": cumrewards})
     return farms, policy_parameters, results
 
 
@@ -153,28 +164,27 @@ def xp_watering():
 
     results = []
     for idx, f in enumerate(farms):
+        farm = f()
         for p in range(len(policy_parameters)):
             policy = make_policy_water_harvest(
-                farm=f, amount_water=policy_parameters[p]
+                farm=farm, amount_water=policy_parameters[p]
             )
-            cumrewards = []
-            for n in range(nb_replicate):
-                cr, _ = run_policy_xp(f, copy.deepcopy(policy), max_steps=150)
-                cr /= scale
-                cumrewards.append(cr)
-            results.append({"farm": f.name, "r": cumrewards})
+            xp = evaluate_policy(f, policy, nb_replicate, max_steps=150)
+            cumrewards = xp["rewards"] / scale
+            results.append({"farm": farm.name, "r": cumrewards})
     return farms, policy_parameters, results
 
 
-farms, policy_parameters, results = xp_watering()
-plot_watering_results(
-    farms, policy_parameters, results, "Watering policy (daily input in L)"
-)
+if __name__ == "__main__":
+    farms, policy_parameters, results = xp_watering()
+    plot_watering_results(
+        farms, policy_parameters, results, "Watering policy (daily input in L)"
+    )
 
-farms, policy_parameters, results = xp_coupling(0.0015, 6)
-plot_coupling_results(
-    farms, policy_parameters, results, "Herbicide policy (every x day)"
-)
+    farms, policy_parameters, results = xp_coupling(0.0015, 6)
+    plot_coupling_results(
+        farms, policy_parameters, results, "Herbicide policy (every x day)"
+    )
 
 
 # from farmgym.v2.rendering.monitoring import make_variables_to_be_monitored
@@ -184,7 +194,7 @@ plot_coupling_results(
 # 								  ]) + [("Field-0","Weather-0", "air_temperature", lambda x: x["mean#°C"].value, "Weather Temperature", "range_auto")]
 
 
-# farm=f2
+# farm=f2()
 # farm.add_monitoring(v,tensorboard=True)
 # farm.understand_the_farm()
 # policy = make_policy_water_harvest(farm=farm, amount_water=7.)
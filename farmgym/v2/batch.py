@@ -0,0 +1,178 @@
+import numpy as np
+
+from farmgym.v2.entity_api import RangeArray, entity_roles
+from farmgym.v2.field import Field
+
+
+class RangeStack:
+    """
+    The `Range` variables of all farms of a batch, seen as one variable whose value is
+    an array of shape (num_farms, 1, 1), so that it broadcasts against the stacked
+    values of `RangeArray` variables.
+    """
+
+    def __init__(self, ranges):
+        self.ranges = ranges
+
+    @property
+    def value(self):
+        return np.reshape([r.value for r in self.ranges], (-1, 1, 1))
+
+    def set_value(self, value):
+        values = np.broadcast_to(value, (len(self.ranges), 1, 1))
+        for r, v in zip(self.ranges, values.ravel().tolist()):
+            r.set_value(v)
+
+    def __getitem__(self, index):
+        return self.ranges[index]
+
+
+def stack_variables(variables):
+    """
+    Returns the variables of a batch from the list `variables` of the variables (a dict
+    of variables, or one variable) of each farm. Values of `RangeArray` are stacked
+    along a new leading axis, and the variables of each farm are made views of their
+    slice, `Range` are gathered in a `RangeStack`.
+    """
+    first = variables[0]
+    if isinstance(first, dict):
+        return {k: stack_variables([v[k] for v in variables]) for k in first}
+    if isinstance(first, RangeArray):
+        stacked = first._view(np.stack([v.values for v in variables]))
+        for i, v in enumerate(variables):
+            v.values = stacked.values[i]
+        return stacked
+    return RangeStack(list(variables))
+
+
+def restack_variables(stacked, variables, index):
+    """
+    Makes `variables`, the variables of farm `index` of a batch, views of the batch
+    variables `stacked` again, keeping their values. Needed when an entity replaces its
+    variables, as `reset` does.
+    """
+    if isinstance(stacked, dict):
+        for k in stacked:
+            restack_variables(stacked[k], variables[k], index)
+    elif isinstance(stacked, RangeArray):
+        stacked.values[index] = variables.values
+        variables.values = stacked.values[index]
+    else:
+        stacked.ranges[index] = variables
+
+
+def batch_entity(entities, field):
+    """
+    Returns an entity of the batch field `field` standing for `entities`, the copies of
+    one entity in each farm.
+    """
+    first = entities[0]
+    entity = first.__class__.__new__(first.__class__)
+    entity.__dict__.update(first.__dict__)
+    entity.field = field
+    entity.np_random = None  # Random draws use the generator of each farm.
+    entity.batch = list(enumerate(entities))
+    entity.variables = stack_variables([e.variables for e in entities])
+    return entity
+
+
+def batch_field(fields):
+    """
+    Returns a field standing for `fields`, the copies of one field in each farm, whose
+    entities are batch entities.
+    """
+    field = Field.__new__(Field)
+    field.__dict__.update(fields[0].__dict__)
+    field.np_random = None
+    field.entities = {}
+    field.entities_by_role = {}
+    for key, entity in fields[0].entities.items():
+        field.entities[key] = batch_entity([f.entities[key] for f in fields], field)
+        for role in entity_roles(entity.__class__):
+            field.entities_by_role.setdefault(role, []).append(field.entities[key])
+    return field
+
+
+class FarmBatch:
+    """
+    Batch of copies of one farm, whose variables are stacked along a leading axis,
+    stepped together.
+
+    The values of each `RangeArray` variable of all farms are held in one array of shape
+    (num_farms, X, Y), each farm seeing its own slice. When moving to the next day, each
+    entity whose update is vectorized over plots (see `Entity_API.batched_update`) is
+    updated once for the whole batch, the other ones farm by farm. Entities are updated
+    in the order of the field, and each farm keeps its own random generator, so that
+    each farm follows exactly the trajectory it would follow on its own.
+
+    Parameters
+    ----------
+    farms: a list of :class:`~farmgym.v2.farm.Farm`,
+        farms built from the same configuration.
+
+    Notes
+    -----
+    Resetting a farm replaces some of its variables: `restack` must then be called.
+    """
+
+    def __init__(self, farms):
+        self.farms = farms
+        self.fields = {
+            fi: batch_field([farm.fields[fi] for farm in farms])
+            for fi in farms[0].fields
+        }
+
+    def restack(self, index):
+        """
+        Makes the variables of farm `index` views of the batch variables again,
+        typically after resetting the farm.
+        """
+        for fi, field in self.fields.items():
+            for key, entity in field.entities.items():
+                restack_variables(
+                    entity.variables,
+                    self.farms[index].fields[fi].entities[key].variables,
+                    index,
+                )
+
+    def update_to_next_day(self, active=None):
+        """
+        Updates all fields of all farms after an increment of 1 day. Farms outside the
+        boolean array `active` may be updated by batched updates, but are meant to be
+        reset or discarded afterwards.
+        """
+        for fi, field in self.fields.items():
+            for key, entity in field.entities.items():
+                if entity.batched_update:
+                    entity.update_variables(field, field.entities)
+                    continue
+                for i, farm in enumerate(self.farms):
+                    if active is None or active[i]:
+                        f = farm.fields[fi]
+                        f.entities[key].update_variables(f, f.entities)
+
+    def farmgym_step(self, action_schedules, active=None):
+        """
+        Performs a farmgym step on all farms (or those of the boolean array `active`),
+        which must all be at the same time of the day, with the action schedule of each
+        farm. Returns the list of outputs of `Farm.farmgym_step`, None for inactive
+        farms.
+        """
+        outputs = [None] * len(self.farms)
+        indexes = [i for i in range(len(self.farms)) if active is None or active[i]]
+        if not indexes:
+            return outputs
+        is_new_day = self.farms[indexes[0]].is_new_day
+        assert all(
+            self.farms[i].is_new_day == is_new_day for i in indexes
+        ), "[Farmgym Error] Farms of a batch must be stepped at the same time of day."
+        if is_new_day:
+            for i in indexes:
+                outputs[i] = self.farms[i].farmgym_step(action_schedules[i])
+            return outputs
+        for i in indexes:
+            outputs[i] = self.farms[i].start_intervention_step(action_schedules[i])
+        self.update_to_next_day(active)
+        for i in indexes:
+            outputs[i] = self.farms[i].end_intervention_step(*outputs[i])
+        return outputs
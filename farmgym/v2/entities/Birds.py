@@ -1,6 +1,6 @@
 from PIL import Image
 
-from farmgym.v2.entity_api import Entity_API, Range, checkissubclass
+from farmgym.v2.entity_api import Entity_API, Range
 
 
 class Birds(Entity_API):
@@ -23,11 +23,7 @@ class Birds(Entity_API):
             self.variables["population#nb"].set_value(0.0)
 
     def update_variables(self, field, entities):
-        facilities = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Facility")
-        ]
+        facilities = field.get_entities("Facility")
 
         strength_scarecrow = 0
         for f in facilities:
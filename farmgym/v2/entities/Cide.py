@@ -1,9 +1,12 @@
+import numpy as np
 from PIL import Image
 
 from farmgym.v2.entity_api import Entity_API, Range, fillarray
 
 
 class Cide(Entity_API):
+    batched_update = True
+
     def __init__(self, field, parameters):
         Entity_API.__init__(self, field, parameters)
         X = self.field.X
@@ -49,12 +52,17 @@ class Cide(Entity_API):
         pass
 
     def release(self, position):
-        amount = min(
+        """
+        Releases cide (in kg) at `position`, which is either a plot (x,y) or ``...`` for
+        all plots at once.
+        """
+        amount = np.minimum(
             self.parameters["base_absorption_speed#kg.week-1"] / 7.0,
-            self.variables["amount#kg"][position].value,
+            self.variables["amount#kg"].values[position],
         )
-        self.variables["amount#kg"][position].set_value(
-            max(0, self.variables["amount#kg"][position].value - amount)
+        self.variables["amount#kg"].set_values(
+            np.maximum(0, self.variables["amount#kg"].values[position] - amount),
+            position,
         )
         return amount
 
@@ -5,6 +5,8 @@ from farmgym.v2.entity_api import Entity_API, Range
 
 
 class Facility(Entity_API):
+    batched_update = True
+
     def __init__(self, field, parameters):
         Entity_API.__init__(self, field, parameters)
         X = self.field.X
@@ -1,9 +1,12 @@
+import numpy as np
 from PIL import Image
 
 from farmgym.v2.entity_api import Entity_API, Range, fillarray
 
 
 class Fertilizer(Entity_API):
+    batched_update = True
+
     def __init__(self, field, parameters):
         Entity_API.__init__(self, field, parameters)
         X = self.field.X
@@ -42,17 +45,22 @@ class Fertilizer(Entity_API):
         pass
 
     def release_nutrients(self, position, soil):
+        """
+        Releases nutrients (in kg) at `position`, which is either a plot (x,y) or
+        ``...`` for all plots at once.
+        """
         r = {"N": 0.0, "K": 0.0, "P": 0.0, "C": 0.0}  # 'Water':(0.,1.)}
         amount = (
-            self.variables["amount#kg"][position].value
+            self.variables["amount#kg"].values[position]
             * self.parameters["base_absorption_speed#kg.week-1"]
             / 7.0
-            * (soil.variables["microlife_health_index#%"][position].value / 100.0)
+            * (soil.variables["microlife_health_index#%"].values[position] / 100.0)
         )
         for n in ["N", "K", "P", "C"]:
             r[n] = self.parameters[n + "#%"] * amount
-        self.variables["amount#kg"][position].set_value(
-            max(0, self.variables["amount#kg"][position].value - amount)
+        self.variables["amount#kg"].set_values(
+            np.maximum(0, self.variables["amount#kg"].values[position] - amount),
+            position,
         )
         return r
 
@@ -1,7 +1,7 @@
 import numpy as np
 from PIL import Image
 
-from farmgym.v2.entity_api import Entity_API, Range, checkissubclass, expglm, fillarray
+from farmgym.v2.entity_api import Condition, Entity_API, Range, fillarray
 
 
 class Pests(Entity_API):
@@ -14,16 +14,8 @@ class Pests(Entity_API):
         self.variables["plot_population#nb"] = fillarray(X, Y, (0, 1000), 0.0)
 
         # TODO: This is bad, as plants are perhaps added later on. + What about weeds?
-        plants = [
-            field.entities[e]
-            for e in field.entities
-            if checkissubclass(field.entities[e].__class__, "Plant")
-        ]
-        weeds = [
-            self.field.entities[e]
-            for e in self.field.entities
-            if checkissubclass(self.field.entities[e].__class__, "Weeds")
-        ]
+        plants = field.get_entities("Plant")
+        weeds = field.get_entities("Weeds")
         self.variables["onplant_population#nb"] = {}
         for i in range(len(plants)):
             self.variables["onplant_population#nb"][plants[i].name] = fillarray(
@@ -42,6 +34,9 @@ class Pests(Entity_API):
 
         self.dependencies = {"Weather", "Soil", "Plant", "Birds"}
 
+        # Compiled conditions, see compile_conditions.
+        self.conditions = None
+
     def get_parameter_keys(self):
         return [
             "min_population#nb",
@@ -59,16 +54,8 @@ class Pests(Entity_API):
             X, Y, (0, 1000), 0.0
         )  # np.full((X,Y),fill_value=Range((0,1000),0.))
 
-        plants = [
-            self.field.entities[e]
-            for e in self.field.entities
-            if checkissubclass(self.field.entities[e].__class__, "Plant")
-        ]
-        weeds = [
-            self.field.entities[e]
-            for e in self.field.entities
-            if checkissubclass(self.field.entities[e].__class__, "Weeds")
-        ]
+        plants = self.field.get_entities("Plant")
+        weeds = self.field.get_entities("Weeds")
         self.variables["onplant_population#nb"] = {}
         for i in range(len(plants)):
             self.variables["onplant_population#nb"][plants[i].name] = fillarray(
@@ -78,34 +65,46 @@ class Pests(Entity_API):
             self.variables["onplant_population#nb"][weeds[i].name] = fillarray(
                 X, Y, (0, 1000), 0.0
             )  # np.full((X,Y),fill_value=Range((0,1000),0.))
+        self.conditions = None
         self.initialize_variables(self.initial_conditions)
 
+    def compile_conditions(self):
+        """
+        Compiles the conditions of the `*_conditions` parameter blocks used in
+        `update_variables`, once per episode.
+        """
+        leave = self.parameters["leave_conditions"]
+        appear = self.parameters["appear_conditions"]
+        maxd = max(self.field.X, self.field.Y) / 2.0
+        return {
+            "stay": Condition(
+                leave,
+                "sensitivity_0",
+                [
+                    ("sensitivity_dist_edge", maxd, np.infty),
+                    ("sensitivity_death_birds", 0, "death_birds_max"),
+                    ("sensitivity_T", "T_min", "T_max"),
+                    ("sensitivity_pesticide", -np.infty, "pesticide_min"),
+                ],
+            ),
+            # TODO: Add total repulsive/attractive effect of plants on plot!
+            "appear": Condition(
+                appear,
+                "sensitivity_0",
+                [
+                    ("sensitivity_dist_edge", -np.infty, 0.0),
+                    ("sensitivity_T", "T_min", "T_max"),
+                    ("sensitivity_pesticide", -np.infty, "pesticide_min"),
+                ],
+            ),
+        }
+
     def update_variables(self, field, entities):
-        weather = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Weather")
-        ][0]
-        soil = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Soil")
-        ][0]
-        plants = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Plant")
-        ]
-        weeds = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Weeds")
-        ]
-        birds = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Birds")
-        ]
+        weather = field.get_entities("Weather")[0]
+        soil = field.get_entities("Soil")[0]
+        plants = field.get_entities("Plant")
+        weeds = field.get_entities("Weeds")
+        birds = field.get_entities("Birds")
 
         nb_birds_eating_pests = np.sum(
             [
@@ -115,6 +114,17 @@ class Pests(Entity_API):
             ]
         )
         # print("BIRDS_EAT_PESTS",nb_birds_eating_pests)
+        if self.conditions is None:
+            self.conditions = self.compile_conditions()
+        # Conditions are evaluated once for all plots (soil is not modified here):
+        air_temperature = weather.variables["air_temperature"]["mean#°C"].value
+        pesticide = soil.variables["amount_cide#g"]["pests"].values
+        q_stays = self.conditions["stay"].expglm(
+            field.distances_to_edge, nb_birds_eating_pests, air_temperature, pesticide
+        )
+        q_appears = self.conditions["appear"].expglm(
+            field.distances_to_edge, air_temperature, pesticide
+        )
         for x in range(self.field.X):
             for y in range(self.field.Y):
                 # pests randomly move to neighbor locations:
@@ -156,44 +166,7 @@ class Pests(Entity_API):
                 else:
                     nb_edge_arrival = 0
 
-                p = self.parameters["leave_conditions"]
-                q = []
-                maxd = max(field.X, field.Y) / 2.0
-                q.append(
-                    (
-                        p["sensitivity_dist_edge"],
-                        field.distance_to_edge((x, y)),
-                        maxd,
-                        np.infty,
-                    )
-                )
-                q.append(
-                    (
-                        p["sensitivity_death_birds"],
-                        nb_birds_eating_pests,
-                        0,
-                        p["death_birds_max"],
-                    )
-                )
-                q.append(
-                    (
-                        p["sensitivity_T"],
-                        weather.variables["air_temperature"]["mean#°C"].value,
-                        p["T_min"],
-                        p["T_max"],
-                    )
-                )
-                q.append(
-                    (
-                        p["sensitivity_pesticide"],
-                        soil.variables["amount_cide#g"]["pests"][x, y].value,
-                        -np.infty,
-                        p["pesticide_min"],
-                    )
-                )
-                # TODO: Add total repulsive/attractive effect of plants on plot!
-                q_stay = expglm(p["sensitivity_0"], q)
-
+                q_stay = q_stays[x, y]
                 self.variables["plot_population#nb"][x, y].set_value(
                     self.np_random.binomial(
                         (int)(self.variables["plot_population#nb"][x, y].value),
@@ -202,35 +175,7 @@ class Pests(Entity_API):
                     )[0]
                 )
 
-                p = self.parameters["appear_conditions"]
-                q = []
-                q.append(
-                    (
-                        p["sensitivity_dist_edge"],
-                        field.distance_to_edge((x, y)),
-                        -np.infty,
-                        0.0,
-                    )
-                )
-                q.append(
-                    (
-                        p["sensitivity_T"],
-                        weather.variables["air_temperature"]["mean#°C"].value,
-                        p["T_min"],
-                        p["T_max"],
-                    )
-                )
-                q.append(
-                    (
-                        p["sensitivity_pesticide"],
-                        soil.variables["amount_cide#g"]["pests"][x, y].value,
-                        -np.infty,
-                        p["pesticide_min"],
-                    )
-                )
-                # TODO: Add total repulsive/attractive effect of plants on plot!
-                q_appear = expglm(p["sensitivity_0"], q)
-
+                q_appear = q_appears[x, y]
                 nb_appear = self.np_random.binomial(nb_edge_arrival, q_appear, 1)[0]
                 new_value = min(
                     self.variables["plot_population#nb"][x, y].value + nb_appear,
@@ -3,14 +3,11 @@ import logging
 import numpy as np
 from PIL import Image
 
-from farmgym.v2.entities.Weather import irradiance_perday
-
 from farmgym.v2.entity_api import (
+    Condition,
     Entity_API,
     Range,
-    checkissubclass,
-    expglm,
-    expglmnoisy,
+    expglm_array,
     fillarray,
 )
 
@@ -18,7 +15,23 @@ logger = logging.getLogger()
 
 
 def increase(value, rate, valuemax):
-    return min(value + rate * (1.0 - value / valuemax) * np.sqrt(value), valuemax)
+    return np.minimum(
+        value + rate * (1.0 - value / valuemax) * np.sqrt(value), valuemax
+    )
+
+
+def _at_plot(value, position, shape):
+    """
+    Returns `value` (possibly a list or tuple of arrays broadcasting to `shape`, the
+    shape of the field) taken at plot `position`.
+    """
+    if isinstance(value, list):
+        return [_at_plot(v, position, shape) for v in value]
+    if isinstance(value, tuple):
+        return tuple(_at_plot(v, position, shape) for v in value)
+    if np.ndim(value) > 0:
+        return np.broadcast_to(value, shape)[position]
+    return value
 
 
 class Plant(Entity_API):
@@ -37,6 +50,7 @@ class Plant(Entity_API):
         "harvested",
         "dead",
     ]
+    batched_update = True
 
     def __init__(self, field, parameters):
         Entity_API.__init__(self, field, parameters)
@@ -96,6 +110,9 @@ class Plant(Entity_API):
         # Dependencies
         self.dependencies = {"Weather", "Soil", "Birds", "Pests", "Pollinators"}
 
+        # Compiled conditions, see compile_conditions.
+        self.conditions = None
+
     def get_parameter_keys(self):
         return [
             "initial_stage",
@@ -146,6 +163,8 @@ class Plant(Entity_API):
         self.variables["grow_size_threshold#cm"] = fillarray(X, Y, (0, 10000), 0.0)
         self.variables["fruit_weight_threshold#g"] = fillarray(X, Y, (0, 100000), 0.0)
 
+        self.conditions = None
+
         ## Init stage:
         for x in range(X):
             for y in range(Y):
@@ -208,7 +227,7 @@ class Plant(Entity_API):
                         )[0]
                     )
                     self.variables["fruits_per_plant#nb"][x, y].set_value(
-                        self.variables["flowers_pollinated_per_plant#nb"][x, y]
+                        self.variables["flowers_pollinated_per_plant#nb"][x, y].value
                     )
                     self.variables["fruit_weight#g"][x, y].set_value(1)
                 elif self.variables["stage"][x, y].value == "fruit":
@@ -294,818 +313,664 @@ class Plant(Entity_API):
         ## Init global stage:
         self.compute_globalstage()
 
+    def stage_in(self, position, *stages):
+        """
+        Returns whether the stage at `position` is one of `stages`, where `position` is
+        either a plot (x,y) or ``...`` for a boolean array over all plots.
+        """
+        return self.variables["stage"].isin(*stages)[position]
+
     def is_active(self, position):
-        return self.variables["stage"][position].value not in [
-            "none",
-            "seed",
-            "harvested",
-            "dead",
-        ]
+        return ~self.stage_in(position, "none", "seed", "harvested", "dead")
 
     def compute_globalstage(self):
         ## Init global stage:
         X = self.field.X
         Y = self.field.Y
-        unique, counts = np.unique(
-            [self.variables["stage"][x, y].value for x in range(X) for y in range(Y)],
-            return_counts=True,
-        )
-        d = dict(zip(unique, counts))
+        stage = self.variables["stage"]
+        counts = np.bincount(stage.values.ravel(), minlength=len(self.stages))
+        d = {
+            s: counts[stage.code(s)]
+            for s in sorted(self.stages)
+            if counts[stage.code(s)] > 0
+        }
         stage = max(d, key=d.get)
         if d[stage] > 0.75 * X * Y:
             self.variables["global_stage"].set_value(stage)
         else:
             self.variables["global_stage"].set_value("undefined")
 
+    def compile_conditions(self, soil):
+        """
+        Compiles the conditions of the `*_conditions` parameter blocks used in
+        `update_variables`, once per episode.
+        """
+
+        def draught_water(p, key):
+            # Available water under which the plant suffers from draught.
+            draught = p[key]
+            return (
+                (
+                    (1.0 - draught) * soil.parameters["wilting_point#L.m-3"]
+                    + draught * soil.parameters["max_water_capacity#L.m-3"]
+                )
+                * soil.parameters["depth#m"]
+                * self.field.plotsurface
+            )
+
+        seed = self.parameters["seed_conditions"]
+        grow = self.parameters["grow_conditions"]
+        bloom = self.parameters["bloom_conditions"]
+        fruit = self.parameters["fruit_conditions"]
+        ripe = self.parameters["ripe_conditions"]
+        return {
+            "seed_death": Condition(
+                seed,
+                "sensitivity_death_0",
+                [
+                    ("sensitivity_death_birds", 0, "death_birds_max#nb"),
+                    ("sensitivity_death_ageseed", 0, "death_ageseed_max#day"),
+                ],
+            ),
+            "sprout": Condition(
+                seed,
+                "sensitivity_sprout_0",
+                [
+                    (
+                        "sensitivity_sprout_air_temperature",
+                        "sprout_air_temperature_min#°C",
+                        "sprout_air_temperature_max#°C",
+                    ),
+                    (
+                        "sensitivity_sprout_humidity",
+                        "sprout_humidity_min#%",
+                        "sprout_humidity_max#%",
+                    ),
+                    ("sensitivity_sprout_age", "sprout_age_min#day", np.infty),
+                ],
+            ),
+            "grow": Condition(
+                grow,
+                "sensitivity_grow_0",
+                [
+                    ("sensitivity_grow_Energy", "grow_Energy_opt#kWh.m-2", np.infty),
+                    (
+                        "sensitivity_grow_air_temperature",
+                        "grow_air_temperature_min#°C",
+                        "grow_air_temperature_max#°C",
+                    ),
+                ]
+                + [
+                    ("sensitivity_grow_" + n, -np.infty, 0)
+                    for n in ["N", "K", "P", "C", "Water"]
+                ]
+                + [
+                    (
+                        "sensitivity_grow_Water",
+                        draught_water(grow, "sensitivity_draught#%"),
+                        np.infty,
+                    )
+                ],
+            ),
+            "grow_death": Condition(
+                grow,
+                "sensitivity_death_0",
+                [
+                    ("sensitivity_death_pests", 0, "death_pests_max#nb"),
+                    ("sensitivity_death_nogrow", 0, "death_nogrow_max#day"),
+                ],
+            ),
+            "bloom_boost": Condition(bloom, 0, [("sensitivity_stress", -np.infty, 0)]),
+            "wind_pollination": Condition(
+                bloom,
+                "sensitivity_wind_0",
+                [
+                    (
+                        "sensitivity_wind_air_temperature",
+                        "wind_air_temperature_min#°C",
+                        "wind_air_temperature_max#°C",
+                    ),
+                    (
+                        "sensitivity_wind_speed",
+                        "wind_speed_min#km.h-1",
+                        "wind_speed_max#km.h-1",
+                    ),
+                ],
+            ),
+            "insect_pollination": Condition(
+                bloom,
+                "sensitivity_pollinator_0",
+                [
+                    (
+                        "sensitivity_pollinator_visits",
+                        "pollinator_visits_min#nb",
+                        np.infty,
+                    )
+                ],
+            ),
+            "bloom_to_fruit": Condition(
+                bloom, 0.0, [(1.0, "bloom_duration#day", np.infty)]
+            ),
+            "bloom_death": Condition(
+                bloom,
+                "sensitivity_death_0",
+                [("sensitivity_death_frost", 0, "death_frost_max#day")],
+            ),
+            "fruit": Condition(
+                fruit,
+                "sensitivity_fruit_0",
+                [
+                    ("sensitivity_fruit_Energy", "fruit_Energy_opt#kWh.m-2", np.infty),
+                    (
+                        "sensitivity_fruit_air_temperature",
+                        "fruit_air_temperature_min#°C",
+                        "fruit_air_temperature_max#°C",
+                    ),
+                ]
+                + [
+                    ("sensitivity_fruit_" + n, -np.infty, 0)
+                    for n in ["N", "K", "P", "C", "Water"]
+                ]
+                + [
+                    (
+                        "sensitivity_fruit_Water",
+                        draught_water(fruit, "sensitivity_draught#%"),
+                        np.infty,
+                    )
+                ],
+            ),
+            "fruit_weight": Condition(
+                fruit,
+                0,
+                [
+                    (
+                        "sensitivity_fruit_pollinators",
+                        "fruit_pollinators_min#nb",
+                        np.infty,
+                    ),
+                    ("sensitivity_fruit_stress", -np.infty, 0.0),
+                ],
+            ),
+            "fruit_death": Condition(
+                fruit,
+                "sensitivity_death_0",
+                [
+                    ("sensitivity_death_pests", 0, "death_pests_max#nb"),
+                    (
+                        "sensitivity_death_humidity",
+                        "death_humidity_min#%",
+                        "death_humidity_max#%",
+                    ),
+                    ("sensitivity_death_noweight", -np.infty, "death_noweight_max#day"),
+                ],
+            ),
+            "ripe": Condition(
+                ripe,
+                "sensitivity_ripe_0",
+                [
+                    (
+                        "sensitivity_ripe_air_temperature",
+                        "ripe_air_temperature_min#°C",
+                        "ripe_air_temperature_max#°C",
+                    ),
+                    ("sensitivity_ripe_rain", -np.infty, 0.0),
+                    ("sensitivity_ripe_pests", -np.infty, 0.0),
+                    ("sensitivity_ripe_frost", 0, "ripe_frost_max#day"),
+                    ("sensitivity_ripe_age", 0, "ripe_age_max#day"),
+                ],
+            ),
+        }
+
     def update_variables(self, field, entities):
         ######################################
 
         # TODO: Add that plant stores Nitrogen into soil?
 
-        weather = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Weather")
-        ][0]
-        soil = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Soil")
-        ][0]
-        birds = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Birds")
-        ]
+        weather = field.get_entities("Weather")[0]
+        soil = field.get_entities("Soil")[0]
+        birds = field.get_entities("Birds")
         nb_birds_eating_seeds = np.sum(
             [
                 b.variables["population#nb"].value
                 for b in birds
                 if b.parameters["seed_eater"]
-            ]
+            ],
+            axis=0,
         )
-        pests = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Pests")
-        ]
-        pollinators = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Pollinators")
-        ]
-        for x in range(self.field.X):
-            for y in range(self.field.Y):
-                if self.variables["population#nb"][x, y].value > 0:
-                    # if (self.is_active((x,y))):
-
-                    total_stress = 0
-                    total_stress += self.variables["cumulated_stress_nutrients_N#g"][x, y].value
-                    total_stress += self.variables["cumulated_stress_nutrients_P#g"][x, y].value
-                    total_stress += self.variables["cumulated_stress_nutrients_K#g"][x, y].value
-                    total_stress += self.variables["cumulated_stress_nutrients_C#g"][x, y].value
-                    total_stress += (self.variables["cumulated_stress_water#L"][x, y].value * 1000)
-
-                    for n in ["N", "K", "P", "C"]:
-                        self.variables["cumulated_stress_nutrients_"+n+"#g"][x, y].set_value(
-                            self.variables["cumulated_stress_nutrients_"+n+"#g"][x, y].value*(1-self.parameters["stress_healing#%"])
-                        )
-                    self.variables["cumulated_stress_water#L"][x, y].set_value(
-                        self.variables["cumulated_stress_water#L"][x, y].value * (1 - self.parameters["stress_healing#%"])
-                    )
+        pests = field.get_entities("Pests")
+        pollinators = field.get_entities("Pollinators")
+        if self.conditions is None:
+            self.conditions = self.compile_conditions(soil)
+
+        # Plots are grouped by their stage at the beginning of the day, and each group
+        # is updated at once.
+        stage = self.variables["stage"]
+        is_populated = self.variables["population#nb"].values > 0
+        at = {s: is_populated & stage.isin(s) for s in self.stages}
+
+        total_stress = (
+            self.variables["cumulated_stress_nutrients_N#g"].values
+            + self.variables["cumulated_stress_nutrients_P#g"].values
+            + self.variables["cumulated_stress_nutrients_K#g"].values
+            + self.variables["cumulated_stress_nutrients_C#g"].values
+            + self.variables["cumulated_stress_water#L"].values * 1000
+        )
+        for key in [
+            "cumulated_stress_nutrients_N#g",
+            "cumulated_stress_nutrients_K#g",
+            "cumulated_stress_nutrients_P#g",
+            "cumulated_stress_nutrients_C#g",
+            "cumulated_stress_water#L",
+        ]:
+            variable = self.variables[key]
+            variable.set_values(
+                variable.values * (1 - self.parameters["stress_healing#%"]),
+                is_populated,
+            )
 
-                    if self.variables["stage"][x, y].value == "entered_grow":
-                        self.variables["size#cm"][x, y].set_value(0.1)
-                        self.variables["consecutive_nogrow#day"][x, y].set_value(0.0)
-                        self.variables["stage"][x, y].set_value("grow")
-                    elif self.variables["stage"][x, y].value == "entered_bloom":
-
-                        p = self.parameters["bloom_conditions"]
-                        q = []
-                        q.append(
-                            (
-                                p["sensitivity_stress"],
-                                total_stress,
-                                -np.infty,
-                                0,
-                            )
-                        )
-                        p_boost = 1.-expglm(0, q)
-
-                        self.variables["flowers_per_plant#nb"][x, y].set_value(
-                            self.np_random.binomial(
-                                self.parameters["flowers_max#nb"]*(1+p["stress_boost#%"]*p_boost),
-                                self.variables["size#cm"][x, y].value
-                                / self.parameters["size_max#cm"],
-                                1,
-                            )[0]
-                        )
-                        self.variables["age_bloom#day"][x, y].set_value(0.0)
-                        self.variables["pollinator_visits#nb"][x, y].set_value(0.0)
-                        self.variables["stage"][x, y].set_value("bloom")
-                    elif self.variables["stage"][x, y].value == "entered_fruit":
-                        self.variables["consecutive_noweight#day"][x, y].set_value(0.0)
-                        self.variables["fruits_per_plant#nb"][x, y].set_value(
-                            self.variables["flowers_pollinated_per_plant#nb"][x, y].value
-                        )
-                        self.variables["flowers_per_plant#nb"][x, y].set_value(0)
-                        self.variables["flowers_pollinated_per_plant#nb"][x, y].set_value(0)
-                        self.variables["fruit_weight#g"][x, y].set_value(1)
-                        self.variables["stage"][x, y].set_value("fruit")
-                    elif self.variables["stage"][x, y].value == "entered_ripe":
-                        self.variables["age_ripe#day"][x, y].set_value(0.0)
-                        self.variables["stage"][x, y].set_value("ripe")
-
-                    elif self.variables["stage"][x, y].value in ["seed"]:
-                        self.debug_death_info[x, y] = {}
-                        total_stress = 0
-                        for n in ["N", "K", "P", "C"]:
-                            self.variables["cumulated_nutrients_" + n + "#g"][x, y].set_value(0)
-                            self.variables["cumulated_stress_nutrients_" + n + "#g"][x, y].set_value(0)
-
-                            self.variables["cumulated_stress_water#L"][x, y].set_value(0)
-                            p = self.parameters["seed_conditions"]
-
-                            q = []
-                            q.append(
-                                (
-                                    p["sensitivity_death_birds"],
-                                    nb_birds_eating_seeds,
-                                    0,
-                                    p["death_birds_max#nb"],
-                                )
-                            )
-                            q.append(
-                                (
-                                    p["sensitivity_death_ageseed"],
-                                    self.variables["age_seed#day"][x, y].value,
-                                    0,
-                                    p["death_ageseed_max#day"],
-                                )
-                            )
-                            p_stayalive = expglm(p["sensitivity_death_0"], q)
-                            # print("SEED STAY ALIVE",p_stayalive,q)
-                            # w_stayalive = np.exp( -glm([p['sensitivity_death_0'],p['sensitivity_death_birds_max'],p['sensitivity_death_ageseed_max']],[nb_birds_eating_seeds,age_seed],[(0,p['death_birds_max']),(0,p['death_ageseed_max'])])) # in [0,1] : proba_death = 1-w_life
-
-                            is_dead = self.np_random.binomial(1, p_stayalive, 1)[0] == 0
-                            if is_dead:
-                                self.debug_death_info[x, y] = {"stage": self.variables["stage"][x, y].value, "p": p_stayalive, "q": q}
-                                logger.debug(
-                                    "[FarmGym] DEATH CAUSE:"
-                                    + str((x, y))
-                                    + str(self.debug_death_info[x, y])
-                                )
-                                self.variables["stage"][x, y].set_value("dead")
-
-                            else:
-                                q = []
-                                q.append(
-                                    (
-                                        p["sensitivity_sprout_air_temperature"],
-                                        weather.variables["air_temperature"][
-                                            "mean#°C"
-                                        ].value,
-                                        p["sprout_air_temperature_min#°C"],
-                                        p["sprout_air_temperature_max#°C"],
-                                    )
-                                )
-                                q.append(
-                                    (
-                                        p["sensitivity_sprout_humidity"],
-                                        weather.variables["humidity#%"].value,
-                                        p["sprout_humidity_min#%"],
-                                        p["sprout_humidity_max#%"],
-                                    )
-                                )
-                                q.append(
-                                    (
-                                        p["sensitivity_sprout_age"],
-                                        self.variables["age_seed#day"][x, y].value,
-                                        p["sprout_age_min#day"],
-                                        np.infty,
-                                    )
-                                )
-
-                                p_sprout = expglm(p["sensitivity_sprout_0"], q)
-                                # w_sprout = np.exp(- glm([p['sensitivity_sprout_0'], p['sensitivity_sprout_T'], p['sensitivity_sprout_RH']], [T, RH], [(p['sprout_T_min'], p['sprout_T_max']), (
-                                # p['sprout_RH_min'], p['sprout_RH_max'])]))  # \in [0,1] proba_sprout = w_sprout.
-                                # print("P_SPROUT", p_sprout, q)
-
-                                is_sprouting = (self.np_random.binomial(1, p_sprout, 1)[0] == 1)
-                                if is_sprouting:
-                                    self.variables["stage"][x, y].set_value("entered_grow")
-                                else:
-                                    self.variables["age_seed#day"][x, y].set_value(self.variables["age_seed#day"][x, y].value + 1)
-
-                    elif self.variables["stage"][x, y].value in ["grow"]:
-                        # TODO: Add that plants turn atmospheric N2 into soil, injecting N in it and C in their body, hence release C when dead.
-                        p = self.parameters["grow_conditions"]
-
-                        # Sun power in kWh/m2:
-                        sun_power = irradiance_perday(field.localization["longitude#°"], weather.variables["day#int365"].value) * (1.-weather.variables["clouds#%"].value / 100)
-                        # sun power received by plant in kWh:
-                        # sun_power *= self.parameters["grow_conditions"]["grow_leaf_surface#m2.cm-1"]* self.variables["size#cm"][(x,y)].value
-
-                        q = []
-                        q.append(
-                            (
-                                p["sensitivity_grow_Energy"],
-                                sun_power,
-                                p["grow_Energy_opt#kWh.m-2"],
-                                np.infty,
-                            )
-                        )
-                        #print("SUN POWER", sun_power, p["grow_Energy_opt#kWh.m-2"])
-                        q.append(
-                            (
-                                p["sensitivity_grow_air_temperature"],
-                                weather.variables["air_temperature"]["mean#°C"].value,
-                                p["grow_air_temperature_min#°C"],
-                                p["grow_air_temperature_max#°C"],
-                            )
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_grow_N"],
-                                self.variables["cumulated_stress_nutrients_N#g"][(x, y)].value,
-                                -np.infty,
-                                0,
-                            )
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_grow_K"],
-                                self.variables["cumulated_stress_nutrients_K#g"][(x, y)].value,
-                                -np.infty,
-                                0,
-                            )
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_grow_P"],
-                                self.variables["cumulated_stress_nutrients_P#g"][(x, y)].value,
-                                -np.infty,
-                                0,
-                            )
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_grow_C"],
-                                self.variables["cumulated_stress_nutrients_C#g"][(x, y)].value,
-                                -np.infty,
-                                0,
-                            )
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_grow_Water"],
-                                self.variables["cumulated_stress_water#L"][(x, y)].value,
-                                -np.infty,
-                                0,
-                            )
-                        )
-                        draught = p["sensitivity_draught#%"]
-                        w = (
-                            (
-                                (1.0 - draught) * soil.parameters["wilting_point#L.m-3"]
-                                + draught * soil.parameters["max_water_capacity#L.m-3"]
-                            )
-                            * soil.parameters["depth#m"]
-                            * self.field.plotsurface
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_grow_Water"],
-                                soil.variables["available_Water#L"][(x, y)].value,
-                                w,
-                                np.infty,
-                            )
-                        )
-                        #print("DRAUGHT", soil.variables["available_Water#L"][(x, y)].value, w)
-
-                        rate = max(
-                            0.0,
-                            expglmnoisy(
-                                p["sensitivity_grow_0"],
-                                q,
-                                p["grow_rate_sigma2"],
-                                np_random=self.np_random,
-                            ),
-                        )
+        mask = at["entered_grow"]
+        self.variables["size#cm"].set_values(0.1, mask)
+        self.variables["consecutive_nogrow#day"].set_values(0.0, mask)
+        stage.set_codes(stage.code("grow"), mask)
+
+        mask = at["entered_bloom"]
+        if np.any(mask):
+            p = self.parameters["bloom_conditions"]
+            p_boost = 1.0 - self.conditions["bloom_boost"].expglm(total_stress)
+            self.variables["flowers_per_plant#nb"].set_values(
+                self._draw(
+                    mask,
+                    self.parameters["flowers_max#nb"]
+                    * (1 + p["stress_boost#%"] * p_boost),
+                    self.variables["size#cm"].values / self.parameters["size_max#cm"],
+                ),
+                mask,
+            )
+            self.variables["age_bloom#day"].set_values(0.0, mask)
+            self.variables["pollinator_visits#nb"].set_values(0.0, mask)
+            stage.set_codes(stage.code("bloom"), mask)
+
+        mask = at["entered_fruit"]
+        self.variables["consecutive_noweight#day"].set_values(0.0, mask)
+        self.variables["fruits_per_plant#nb"].set_values(
+            self.variables["flowers_pollinated_per_plant#nb"].values, mask
+        )
+        self.variables["flowers_per_plant#nb"].set_values(0, mask)
+        self.variables["flowers_pollinated_per_plant#nb"].set_values(0, mask)
+        self.variables["fruit_weight#g"].set_values(1, mask)
+        stage.set_codes(stage.code("fruit"), mask)
+
+        mask = at["entered_ripe"]
+        self.variables["age_ripe#day"].set_values(0.0, mask)
+        stage.set_codes(stage.code("ripe"), mask)
+
+        mask = at["seed"]
+        if np.any(mask):
+            self.update_seed(mask, nb_birds_eating_seeds, weather)
+        mask = at["grow"]
+        if np.any(mask):
+            self.update_grow(mask, total_stress, weather, soil, pests, field)
+        mask = at["bloom"]
+        if np.any(mask):
+            self.update_bloom(mask, weather, pollinators)
+        mask = at["fruit"]
+        if np.any(mask):
+            self.update_fruit(mask, total_stress, weather, soil, pests, field)
+        mask = at["ripe"]
+        if np.any(mask):
+            self.update_ripe(mask, weather, pests)
+
+        mask = at["harvested"]
+        for n in ["N", "K", "P", "C"]:
+            self.variables["cumulated_nutrients_" + n + "#g"].set_values(0, mask)
+            self.variables["cumulated_stress_nutrients_" + n + "#g"].set_values(0, mask)
+        self.variables["cumulated_stress_water#L"].set_values(0, mask)
+
+        mask = at["dead"]
+        self.variables["fruits_per_plant#nb"].set_values(0, mask)
+        threshold = 0.1
+        # Dead-None
+        is_decomposed = mask
+        for n in ["N", "P", "K", "C"]:
+            is_decomposed = is_decomposed & (
+                self.variables["cumulated_nutrients_" + n + "#g"].values <= threshold
+            )
+        stage.set_codes(stage.code("none"), is_decomposed)
 
-                        is_growing = rate >= p["grow_rate_min#"]
-                        if is_growing:
-                            newsize = increase(
-                                self.variables["size#cm"][x, y].value,
-                                rate,
-                                self.parameters["size_max#cm"],
-                            )
-
-                            self.variables["size#cm"][x, y].set_value(newsize)
-                            self.variables["consecutive_nogrow#day"][x, y].set_value(0)
-                        else:
-                            self.variables["consecutive_nogrow#day"][x, y].set_value(
-                                self.variables["consecutive_nogrow#day"][x, y].value + 1
-                            )
-
-
-                        self.variables["grow_size_threshold#cm"][x, y].set_value(
-                            self.parameters["size_max#cm"]
-                            * (1 + np.exp(-total_stress / 1000))
-                            / 2.0
-                        )
+        # Update global_stage as being most present stage
+        for _, plant in self.batch_members():
+            plant.compute_globalstage()
 
-                        # Grow-Bloom
-                        q = []
-                        q.append(
-                            (
-                                1.0,
-                                self.variables["size#cm"][x, y].value,
-                                self.variables["grow_size_threshold#cm"][x, y].value,
-                                np.infty,
-                            )
-                        )
-                        p_bloom = expglm(0.0, q)
-                        is_blooming = self.np_random.binomial(1, p_bloom, 1)[0] == 1
-                        if is_blooming:
-                            self.variables["stage"][x, y].set_value("entered_bloom")
-
-                        # Grow-Death
-                        q = []
-                        nb_pests = np.sum(
-                            [
-                                p.variables["onplant_population#nb"][self.name][
-                                    x, y
-                                ].value
-                                for p in pests
-                                if self.name
-                                in p.variables["onplant_population#nb"].keys()
-                            ]
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_death_pests"],
-                                nb_pests,
-                                0,
-                                p["death_pests_max#nb"],
-                            )
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_death_nogrow"],
-                                self.variables["consecutive_nogrow#day"][x, y].value,
-                                0,
-                                p["death_nogrow_max#day"],
-                            )
-                        )
-                        p_stayalive = expglm(p["sensitivity_death_0"], q)
+    def update_seed(self, mask, nb_birds_eating_seeds, weather):
+        """
+        Updates all plots of `mask`, which are in "seed" stage.
+        """
+        stage = self.variables["stage"]
+        age_seed = self.variables["age_seed#day"]
+        for index, plant in self.batch_members():
+            for x, y in zip(*np.nonzero(mask[index])):
+                plant.debug_death_info[x, y] = {}
+        death = self.conditions["seed_death"]
+        sprout = self.conditions["sprout"]
+        # Each seed goes through one death/sprout trial per nutrient every day.
+        for n in ["N", "K", "P", "C"]:
+            self.variables["cumulated_nutrients_" + n + "#g"].set_values(0, mask)
+            self.variables["cumulated_stress_nutrients_" + n + "#g"].set_values(0, mask)
+            self.variables["cumulated_stress_water#L"].set_values(0, mask)
+
+            values = (nb_birds_eating_seeds, age_seed.values)
+            p_stayalive = death.expglm(*values)
+            is_dead = mask & (self._draw(mask, 1, p_stayalive) == 0)
+            self._kill(is_dead, {"p": p_stayalive, "q": death.params(*values)})
+
+            is_alive = mask & ~is_dead
+            p_sprout = sprout.expglm(
+                weather.variables["air_temperature"]["mean#°C"].value,
+                weather.variables["humidity#%"].value,
+                age_seed.values,
+            )
+            is_sprouting = is_alive & (self._draw(is_alive, 1, p_sprout) == 1)
+            stage.set_codes(stage.code("entered_grow"), is_sprouting)
+            age_seed.set_values(age_seed.values + 1, is_alive & ~is_sprouting)
 
-                        is_dead = self.np_random.binomial(1, p_stayalive, 1)[0] == 0
-                        if is_dead:
-                            self.debug_death_info[x, y] = {"stage": self.variables["stage"][x, y].value,
-                                                           "p": p_stayalive, "q": q}
-                            logger.debug(
-                                "[FarmGym] DEATH CAUSE:"
-                                + str((x, y))
-                                + str(self.debug_death_info[x, y])
-                            )
-                            self.variables["stage"][x, y].set_value("dead")
+    def update_grow(self, mask, total_stress, weather, soil, pests, field):
+        """
+        Updates all plots of `mask`, which are in "grow" stage.
+        """
+        # TODO: Add that plants turn atmospheric N2 into soil, injecting N in it and C
+        # in their body, hence release C when dead.
+        stage = self.variables["stage"]
+        size = self.variables["size#cm"]
+        nogrow = self.variables["consecutive_nogrow#day"]
+        p = self.parameters["grow_conditions"]
+
+        # Sun power in kWh/m2:
+        sun_power = weather.irradiances[weather.variables["day#int365"].value] * (
+            1.0 - weather.variables["clouds#%"].value / 100
+        )
 
-                    elif self.variables["stage"][x, y].value in ["bloom"]:
-                        p = self.parameters["bloom_conditions"]
+        rate = np.maximum(
+            0.0,
+            self.conditions["grow"].expglm(
+                sun_power,
+                weather.variables["air_temperature"]["mean#°C"].value,
+                self.variables["cumulated_stress_nutrients_N#g"].values,
+                self.variables["cumulated_stress_nutrients_K#g"].values,
+                self.variables["cumulated_stress_nutrients_P#g"].values,
+                self.variables["cumulated_stress_nutrients_C#g"].values,
+                self.variables["cumulated_stress_water#L"].values,
+                soil.variables["available_Water#L"].values,
+            )
+            + self._noise(mask) * p["grow_rate_sigma2"],
+        )
 
+        is_growing = mask & (rate >= p["grow_rate_min#"])
+        size.set_values(
+            increase(size.values, rate, self.parameters["size_max#cm"]), is_growing
+        )
+        nogrow.set_values(0, is_growing)
+        nogrow.set_values(nogrow.values + 1, mask & ~is_growing)
 
-                        #TODO: Add growth probability? to decide if growth day or not-growth day, hence decide death proba.
+        threshold = self.variables["grow_size_threshold#cm"]
+        threshold.set_values(
+            self.parameters["size_max#cm"] * (1 + np.exp(-total_stress / 1000)) / 2.0,
+            mask,
+        )
 
+        # Grow-Bloom
+        q = []
+        q.append((1.0, size.values, threshold.values, np.infty))
+        p_bloom = expglm_array(0.0, q)
+        stage.set_codes(
+            stage.code("entered_bloom"), mask & (self._draw(mask, 1, p_bloom) == 1)
+        )
 
+        # Grow-Death
+        death = self.conditions["grow_death"]
+        values = (self._nb_pests(pests), nogrow.values)
+        p_stayalive = death.expglm(*values)
+        self._kill(
+            mask & (self._draw(mask, 1, p_stayalive) == 0),
+            {"p": p_stayalive, "q": death.params(*values)},
+        )
 
+    def update_bloom(self, mask, weather, pollinators):
+        """
+        Updates all plots of `mask`, which are in "bloom" stage.
+        """
+        stage = self.variables["stage"]
+        visits = self.variables["pollinator_visits#nb"]
+        pollinated = self.variables["flowers_pollinated_per_plant#nb"]
+        age_bloom = self.variables["age_bloom#day"]
+        p = self.parameters["bloom_conditions"]
 
+        # TODO: Add growth probability? to decide if growth day or not-growth day, hence
+        # decide death proba.
 
-                        non_pollinated = max(
-                            self.variables["flowers_per_plant#nb"][x, y].value
-                            - self.variables["flowers_pollinated_per_plant#nb"][x, y].value,
-                            0,
-                        )
+        non_pollinated = np.maximum(
+            self.variables["flowers_per_plant#nb"].values - pollinated.values, 0
+        )
 
-                        w = []
-                        w.append(p["auto_pollination_rate#%"])
-                        w.append(p["wind_pollination_rate#%"])
-                        w.append(p["insect_pollination_rate#%"])
-                        W = np.sum(w)
-                        w = w / W
-
-                        # Wind conditions:
-                        q = []
-                        q.append(
-                            (
-                                p["sensitivity_wind_air_temperature"],
-                                weather.variables["air_temperature"]["mean#°C"].value,
-                                p["wind_air_temperature_min#°C"],
-                                p["wind_air_temperature_max#°C"],
-                            )
-                        )
+        w = []
+        w.append(p["auto_pollination_rate#%"])
+        w.append(p["wind_pollination_rate#%"])
+        w.append(p["insect_pollination_rate#%"])
+        W = np.sum(w)
+        w = w / W
+
+        # Wind conditions:
+        wind_pollination_success = self.conditions["wind_pollination"].expglm(
+            weather.variables["air_temperature"]["mean#°C"].value,
+            weather.variables["wind"]["speed#km.h-1"].value,
+        )
 
-                        q.append(
-                            (
-                                p["sensitivity_wind_speed"],
-                                weather.variables["wind"]["speed#km.h-1"].value,
-                                p["wind_speed_min#km.h-1"],
-                                p["wind_speed_max#km.h-1"],
-                            )
-                        )
-                        wind_pollination_success = expglm(p["sensitivity_wind_0"], q)
-
-                        # Pollinator conditions:
-                        for po in pollinators:
-                            if po.variables["occurrence#bin"][x, y].value == "True":
-                                self.variables["pollinator_visits#nb"][x, y].set_value(
-                                    self.variables["pollinator_visits#nb"][x, y].value + 1
-                                )
-                        q = []
-                        q.append(
-                            (
-                                p["sensitivity_pollinator_visits"],
-                                self.variables["pollinator_visits#nb"][x, y].value,
-                                p["pollinator_visits_min#nb"],
-                                np.infty,
-                            )
-                        )
-                        insect_pollination_success = expglm(p["sensitivity_pollinator_0"], q)
+        # Pollinator conditions:
+        for po in pollinators:
+            visits.set_values(
+                visits.values + 1, mask & po.variables["occurrence#bin"].isin("True")
+            )
+        insect_pollination_success = self.conditions["insect_pollination"].expglm(
+            visits.values
+        )
 
-                        pp = (
-                            w[0] * p["auto_pollination_success#%"]
-                            + w[1] * wind_pollination_success
-                            + w[2] * insect_pollination_success
-                        )
-                        # print("POLLINATION INSECT",insect_pollination_success, pp)
-                        self.variables["flowers_pollinated_per_plant#nb"][x, y].set_value(
-                            self.variables["flowers_pollinated_per_plant#nb"][x, y].value
-                            + np.floor(
-                                self.np_random.binomial(non_pollinated, pp, 1)[0]
-                            )
-                        )
-                        #                                                                + np.floor(
-                        # w[0]*self.np_random.binomial(non_pollinated, p['auto_pollination_success#%'],1)[0] + w[1] *
-                        # self.np_random.binomial(non_pollinated, wind_pollination_success, 1)[0]
-                        # + w[2] * self.np_random.binomial(non_pollinated, insect_pollination_success, 1)[0]))
+        pp = (
+            w[0] * p["auto_pollination_success#%"]
+            + w[1] * wind_pollination_success
+            + w[2] * insect_pollination_success
+        )
+        pollinated.set_values(
+            pollinated.values + np.floor(self._draw(mask, non_pollinated, pp)), mask
+        )
+        age_bloom.set_values(age_bloom.values + 1, mask)
 
-                        self.variables["age_bloom#day"][x, y].set_value(
-                            self.variables["age_bloom#day"][x, y].value + 1
-                        )
+        # Bloom-Fruit
+        p_fruit = self.conditions["bloom_to_fruit"].expglm(age_bloom.values)
+        stage.set_codes(
+            stage.code("entered_fruit"), mask & (self._draw(mask, 1, p_fruit) == 1)
+        )
 
+        # Bloom-Death
+        death = self.conditions["bloom_death"]
+        values = (weather.variables["consecutive_frost#day"].value,)
+        p_stayalive = death.expglm(*values)
+        self._kill(
+            mask & (self._draw(mask, 1, p_stayalive) == 0),
+            {"p": p_stayalive, "q": death.params(*values)},
+        )
 
-                        # Bloom-Fruit
-                        q = []
-                        q.append(
-                            (
-                                1.0,
-                                self.variables["age_bloom#day"][x, y].value,
-                                p["bloom_duration#day"],
-                                np.infty,
-                            )
-                        )
-                        p_fruit = expglm(0.0, q)
-                        is_fruiting = self.np_random.binomial(1, p_fruit, 1)[0] == 1
-                        if is_fruiting:
-                            self.variables["stage"][x, y].set_value("entered_fruit")
-
-                        # Bloom-Death
-                        q = []
-                        q.append(
-                            (
-                                p["sensitivity_death_frost"],
-                                weather.variables["consecutive_frost#day"].value,
-                                0,
-                                p["death_frost_max#day"],
-                            )
-                        )
-                        p_stayalive = expglm(p["sensitivity_death_0"], q)
-
-                        is_dead = self.np_random.binomial(1, p_stayalive, 1)[0] == 0
-                        if is_dead:
-                            self.debug_death_info[x, y] = {"stage": self.variables["stage"][x, y].value,
-                                                           "p": p_stayalive, "q": q}
-                            logger.debug(
-                                "[FarmGym] DEATH CAUSE:"
-                                + str((x, y))
-                                + str(self.debug_death_info[x, y])
-                            )
-                            self.variables["stage"][x, y].set_value("dead")
-
-                    elif self.variables["stage"][x, y].value in ["fruit"]:
-                        p = self.parameters["fruit_conditions"]
-
-
-                        # Sun power in kWh/m2:
-                        sun_power = irradiance_perday(field.localization["longitude#°"], weather.variables["day#int365"].value) * (1.-weather.variables["clouds#%"].value / 100)
-                        # sun power received by plant in kWh:
-                        # sun_power *= self.parameters["grow_conditions"]["grow_leaf_surface#m2.cm-1"]* self.variables["size#cm"][(x,y)].value
-
-                        q = []
-                        q.append(
-                            (
-                                p["sensitivity_fruit_Energy"],
-                                sun_power,
-                                p["fruit_Energy_opt#kWh.m-2"],
-                                np.infty,
-                            )
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_fruit_air_temperature"],
-                                weather.variables["air_temperature"]["mean#°C"].value,
-                                p["fruit_air_temperature_min#°C"],
-                                p["fruit_air_temperature_max#°C"],
-                            )
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_fruit_N"],
-                                self.variables["cumulated_stress_nutrients_N#g"][(x, y)].value,
-                                -np.infty,
-                                0,
-                            )
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_fruit_K"],
-                                self.variables["cumulated_stress_nutrients_K#g"][(x, y)].value,
-                                -np.infty,
-                                0,
-                            )
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_fruit_P"],
-                                self.variables["cumulated_stress_nutrients_P#g"][(x, y)].value,
-                                -np.infty,
-                                0,
-                            )
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_fruit_C"],
-                                self.variables["cumulated_stress_nutrients_C#g"][(x, y)].value,
-                                -np.infty,
-                                0,
-                            )
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_fruit_Water"],
-                                self.variables["cumulated_stress_water#L"][(x, y)].value,
-                                -np.infty,
-                                0,
-                            )
-                        )
-                        draught = p["sensitivity_draught#%"]
-                        w = (
-                            (
-                                (1.0 - draught) * soil.parameters["wilting_point#L.m-3"]
-                                + draught * soil.parameters["max_water_capacity#L.m-3"]
-                            )
-                            * soil.parameters["depth#m"]
-                            * self.field.plotsurface
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_fruit_Water"],
-                                soil.variables["available_Water#L"][(x, y)].value,
-                                w,
-                                np.infty,
-                            )
-                        )
-                        rate = max(
-                            0.0,
-                            expglmnoisy(
-                                p["sensitivity_fruit_0"],
-                                q,
-                                p["fruit_rate_sigma2"],
-                                np_random=self.np_random,
-                            ),
-                        )
-                        #print("Fruit rate", rate, q)
-
-                        qq = []
-                        qq.append(
-                            (
-                                p["sensitivity_fruit_pollinators"],
-                                self.variables["pollinator_visits#nb"][x, y].value,
-                                p["fruit_pollinators_min#nb"],
-                                np.infty,
-                            )
-                        )
-                        qq.append(
-                            (
-                                p["sensitivity_fruit_stress"],
-                                total_stress / 1000,
-                                -np.infty,
-                                0.0,
-                            )
-                        )
-                        self.variables["fruit_weight_threshold#g"][x, y].set_value(
-                            self.parameters["fruit_weight_max#g"] * expglm(0, qq)
-                        )
+    def update_fruit(self, mask, total_stress, weather, soil, pests, field):
+        """
+        Updates all plots of `mask`, which are in "fruit" stage.
+        """
+        stage = self.variables["stage"]
+        weight = self.variables["fruit_weight#g"]
+        noweight = self.variables["consecutive_noweight#day"]
+        p = self.parameters["fruit_conditions"]
+
+        # Sun power in kWh/m2:
+        sun_power = weather.irradiances[weather.variables["day#int365"].value] * (
+            1.0 - weather.variables["clouds#%"].value / 100
+        )
 
-                        is_weighting = rate >= p["weight_rate_min#"]
-                        if is_weighting:
-                            newweigth = increase(
-                                self.variables["fruit_weight#g"][x, y].value,
-                                rate,
-                                self.parameters["fruit_weight_max#g"],
-                            )
-                            self.variables["fruit_weight#g"][x, y].set_value(newweigth)
-                            self.variables["consecutive_noweight#day"][x, y].set_value(
-                                0
-                            )
-                        else:
-                            self.variables["consecutive_noweight#day"][x, y].set_value(
-                                self.variables["consecutive_noweight#day"][x, y].value
-                                + 1
-                            )
-
-                        # Fruit-Ripe
-                        q = []
-                        q.append(
-                            (
-                                1.0,
-                                self.variables["fruit_weight#g"][x, y].value,
-                                self.variables["fruit_weight_threshold#g"][x, y].value,
-                                np.infty,
-                            )
-                        )
-                        p_ripe = expglm(0.0, q)
-                        is_ripe = self.np_random.binomial(1, p_ripe, 1)[0] == 1
-                        if is_ripe:
-                            self.variables["stage"][x, y].set_value("entered_ripe")
-
-                        # Fruit-Death
-                        q = []
-                        # print("PESTS",[p for p in pests])
-                        nb_pests = np.sum(
-                            [
-                                p.variables["onplant_population#nb"][self.name][
-                                    x, y
-                                ].value
-                                for p in pests
-                                if self.name
-                                in p.variables["onplant_population#nb"].keys()
-                            ]
-                        )
-                        # print("PESTS",nb_pests)
-                        q.append(
-                            (
-                                p["sensitivity_death_pests"],
-                                nb_pests,
-                                0,
-                                p["death_pests_max#nb"],
-                            )
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_death_humidity"],
-                                weather.variables["humidity#%"].value,
-                                p["death_humidity_min#%"],
-                                p["death_humidity_max#%"],
-                            )
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_death_noweight"],
-                                self.variables["consecutive_noweight#day"][x, y].value,
-                                -np.infty,
-                                p["death_noweight_max#day"],
-                            )
-                        )
-                        p_stayalive = expglm(p["sensitivity_death_0"], q)
-                        is_dead = self.np_random.binomial(1, p_stayalive, 1)[0] == 0
-                        if is_dead:
-                            self.debug_death_info[x, y] = {"stage": self.variables["stage"][x, y].value,
-                                                           "p": p_stayalive, "q": q}
-                            logger.debug(
-                                "[FarmGym] DEATH CAUSE:"
-                                + str((x, y))
-                                + str(self.debug_death_info[x, y])
-                            )
-                            self.variables["stage"][x, y].set_value("dead")
-
-                    elif self.variables["stage"][x, y].value in ["ripe"]:
-                        p = self.parameters["ripe_conditions"]
-
-                        q = []
-                        q.append(
-                            (
-                                p["sensitivity_ripe_air_temperature"],
-                                weather.variables["air_temperature"]["mean#°C"].value,
-                                p["ripe_air_temperature_min#°C"],
-                                p["ripe_air_temperature_max#°C"],
-                            )
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_ripe_rain"],
-                                weather.variables["rain_amount#mm.day-1"].value,
-                                -np.infty,
-                                0.0,
-                            )
-                        )
-                        # [print("PESTS",p) for p in pests]
-                        nb_pests = np.sum(
-                            [
-                                p.variables["onplant_population#nb"][self.name][
-                                    x, y
-                                ].value
-                                for p in pests
-                                if self.name
-                                in p.variables["onplant_population#nb"].keys()
-                            ]
-                        )
+        rate = np.maximum(
+            0.0,
+            self.conditions["fruit"].expglm(
+                sun_power,
+                weather.variables["air_temperature"]["mean#°C"].value,
+                self.variables["cumulated_stress_nutrients_N#g"].values,
+                self.variables["cumulated_stress_nutrients_K#g"].values,
+                self.variables["cumulated_stress_nutrients_P#g"].values,
+                self.variables["cumulated_stress_nutrients_C#g"].values,
+                self.variables["cumulated_stress_water#L"].values,
+                soil.variables["available_Water#L"].values,
+            )
+            + self._noise(mask) * p["fruit_rate_sigma2"],
+        )
 
-                        q.append(
-                            (p["sensitivity_ripe_pests"], nb_pests, -np.infty, 0.0)
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_ripe_frost"],
-                                weather.variables["consecutive_frost#day"].value,
-                                0,
-                                p["ripe_frost_max#day"],
-                            )
-                        )
-                        q.append(
-                            (
-                                p["sensitivity_ripe_age"],
-                                self.variables["age_ripe#day"][x, y].value,
-                                0,
-                                p["ripe_age_max#day"],
-                            )
-                        )
-                        # q.append((p['sensitivity_death_humidity'], weather.variables['humidity#%'].value, p['death_humidity_min'], p['death_humidity_max']))
-                        rate = min(
-                            max(
-                                0.0,
-                                expglmnoisy(
-                                    p["sensitivity_ripe_0"],
-                                    q,
-                                    p["ripe_rate_sigma2"],
-                                    np_random=self.np_random,
-                                ),
-                            ),
-                            1.0,
-                        )
-                        # print(q,rate)
+        threshold = self.variables["fruit_weight_threshold#g"]
+        threshold.set_values(
+            self.parameters["fruit_weight_max#g"]
+            * self.conditions["fruit_weight"].expglm(
+                self.variables["pollinator_visits#nb"].values, total_stress / 1000
+            ),
+            mask,
+        )
 
-                        # TODO: generate seeds?
-                        self.variables["fruits_per_plant#nb"][x, y].set_value(
-                            np.floor(
-                                rate * self.variables["fruits_per_plant#nb"][x, y].value
-                            )
-                        )
-                        self.variables["age_ripe#day"][x, y].set_value(
-                            self.variables["age_ripe#day"][x, y].value + 1
-                        )
+        is_weighting = mask & (rate >= p["weight_rate_min#"])
+        weight.set_values(
+            increase(weight.values, rate, self.parameters["fruit_weight_max#g"]),
+            is_weighting,
+        )
+        noweight.set_values(0, is_weighting)
+        noweight.set_values(noweight.values + 1, mask & ~is_weighting)
+
+        # Fruit-Ripe
+        q = []
+        q.append((1.0, weight.values, threshold.values, np.infty))
+        p_ripe = expglm_array(0.0, q)
+        stage.set_codes(
+            stage.code("entered_ripe"), mask & (self._draw(mask, 1, p_ripe) == 1)
+        )
 
-                        # Ripe-Death
-                        if self.variables["fruits_per_plant#nb"][x, y].value == 0:
-                            self.debug_death_info[x, y] = {"stage": self.variables["stage"][x, y].value,
-                                                           "fruits": self.variables["fruits_per_plant#nb"][x, y].value}
-                            logger.debug(
-                                "[FarmGym] DEATH CAUSE:" 
-                                + str((x, y)) 
-                                + str(self.debug_death_info[x, y])
-                            )
-                            self.variables["stage"][x, y].set_value("dead")
-
-                    elif self.variables["stage"][x, y].value in ["harvested"]:
-                        for n in ["N", "K", "P", "C"]:
-                            self.variables["cumulated_nutrients_" + n + "#g"][x, y].set_value(0)
-                            self.variables["cumulated_stress_nutrients_" + n + "#g"][x, y].set_value(0)
-
-                        self.variables["cumulated_stress_water#L"][x, y].set_value(0)
-
-                    elif self.variables["stage"][x, y].value in ["dead"]:
-                        self.variables["fruits_per_plant#nb"][x, y].set_value(0)
-                        threshold = 0.1
-                        # Dead-None
-                        if (
-                            (self.variables["cumulated_nutrients_N#g"][x, y].value <= threshold)
-                            and (
-                                self.variables["cumulated_nutrients_P#g"][x, y].value
-                                <= threshold
-                            )
-                            and (
-                                self.variables["cumulated_nutrients_K#g"][x, y].value
-                                <= threshold
-                            )
-                            and (
-                                self.variables["cumulated_nutrients_C#g"][x, y].value
-                                <= threshold
-                            )
-                        ):
-                            self.variables["stage"][x, y].set_value("none")
+        # Fruit-Death
+        death = self.conditions["fruit_death"]
+        values = (
+            self._nb_pests(pests),
+            weather.variables["humidity#%"].value,
+            noweight.values,
+        )
+        p_stayalive = death.expglm(*values)
+        self._kill(
+            mask & (self._draw(mask, 1, p_stayalive) == 0),
+            {"p": p_stayalive, "q": death.params(*values)},
+        )
 
-        # Update global_stage as being most present stage
-        self.compute_globalstage()
+    def update_ripe(self, mask, weather, pests):
+        """
+        Updates all plots of `mask`, which are in "ripe" stage.
+        """
+        fruits = self.variables["fruits_per_plant#nb"]
+        age_ripe = self.variables["age_ripe#day"]
+        p = self.parameters["ripe_conditions"]
+
+        rate = np.minimum(
+            np.maximum(
+                0.0,
+                self.conditions["ripe"].expglm(
+                    weather.variables["air_temperature"]["mean#°C"].value,
+                    weather.variables["rain_amount#mm.day-1"].value,
+                    self._nb_pests(pests),
+                    weather.variables["consecutive_frost#day"].value,
+                    age_ripe.values,
+                )
+                + self._noise(mask) * p["ripe_rate_sigma2"],
+            ),
+            1.0,
+        )
+
+        # TODO: generate seeds?
+        fruits.set_values(np.floor(rate * fruits.values), mask)
+        age_ripe.set_values(age_ripe.values + 1, mask)
+
+        # Ripe-Death
+        self._kill(mask & (fruits.values == 0), {"fruits": fruits.values})
+
+    def _draw(self, mask, n, p):
+        """
+        Draws Binomial(`n`, `p`) outcomes for all plots of `mask` in a single call per
+        farm, where `n` and `p` are scalars or arrays over the field.
+        Plots outside `mask` get 0.
+        """
+        outcome = np.zeros(mask.shape, dtype=np.int64)
+        n = np.broadcast_to(n, mask.shape)
+        p = np.broadcast_to(p, mask.shape)
+        for index, plant in self.batch_members():
+            m = mask[index]
+            outcome[index][m] = plant.np_random.binomial(
+                n[index][m].astype(np.int64), p[index][m]
+            )
+        return outcome
+
+    def _noise(self, mask):
+        """
+        Draws standard normal noise for all plots of `mask` in a single call per farm.
+        Plots outside `mask` get 0.
+        """
+        noise = np.zeros(mask.shape)
+        for index, plant in self.batch_members():
+            m = mask[index]
+            noise[index][m] = plant.np_random.normal(size=np.count_nonzero(m))
+        return noise
+
+    def _nb_pests(self, pests):
+        return np.sum(
+            [
+                p.variables["onplant_population#nb"][self.name].values
+                for p in pests
+                if self.name in p.variables["onplant_population#nb"].keys()
+            ],
+            axis=0,
+        )
+
+    def _kill(self, mask, info):
+        """
+        Sets all plots of `mask` to "dead", recording `info` (values at each dead plot)
+        in `debug_death_info`.
+        """
+        stage = self.variables["stage"]
+        for index, plant in self.batch_members():
+            for x, y in zip(*np.nonzero(mask[index])):
+                position = (int(x), int(y))
+                at = position if index is Ellipsis else (index,) + position
+                plant.debug_death_info[position] = {"stage": stage[at].value}
+                plant.debug_death_info[position].update(
+                    {
+                        key: _at_plot(value, at, mask.shape)
+                        for key, value in info.items()
+                    }
+                )
+                logger.debug(
+                    "[FarmGym] DEATH CAUSE:"
+                    + str(position)
+                    + str(plant.debug_death_info[position])
+                )
+        stage.set_codes(stage.code("dead"), mask)
+
+    def get_state(self):
+        state = Entity_API.get_state(self)
+        state["debug_death_info"] = self.debug_death_info.copy()
+        return state
+
+    def set_state(self, state):
+        Entity_API.set_state(self, state)
+        self.debug_death_info[...] = state["debug_death_info"]
+
+    def valid_plots(self, action_name):
+        if action_name == "sow":
+            return self.stage_in(..., "none", "seed")
+        if action_name == "micro_harvest":
+            return self.stage_in(..., "entered_fruit", "fruit", "ripe", "entered_ripe")
+        return None
 
     def act_on_variables(self, action_name, action_params):
         def act_on_variables(self, action_name, action_params):
@@ -1238,156 +1103,144 @@ class Plant(Entity_API):
 
     def requirement_nutrients(self, position):
         """
-        return nutrients requirement in g
+        return nutrients requirement in g, at `position` being either a plot (x,y) or
+        ``...`` for all plots at once.
         """
         r = {"N": 0.0, "K": 0.0, "P": 0.0, "C": 0.0}  #'Water':(0.,1.)}
-        if not self.is_active(position):
-            return r
+        active = self.is_active(position)
+        is_growing = self.stage_in(
+            position,
+            "entered_grow",
+            "grow",
+            "entered_bloom",
+            "bloom",
+            "entered_fruit",
+            "fruit",
+        )
+        is_blooming = self.stage_in(position, "entered_bloom", "bloom")
+        is_fruiting = self.stage_in(position, "entered_fruit", "fruit")
         for n in ["N", "K", "P", "C"]:
-            if self.variables["stage"][position].value in [
-                "entered_grow",
-                "grow",
-                "entered_bloom",
-                "bloom",
-                "entered_fruit",
-                "fruit",
-            ]:
-                r[n] += (
-                    self.variables["size#cm"][position].value* 10
-                    * self.parameters["grow_conditions"][n + "_grow_consumption#g.mm-1"]
-                )
-            if self.variables["stage"][position].value in ["entered_bloom", "bloom"]:
-                r[n] += (
-                    self.variables["flowers_per_plant#nb"][position].value
-                    * self.parameters["bloom_conditions"][n + "_flower_consumption#g"]
-                )
-            if self.variables["stage"][position].value in ["entered_fruit", "fruit"]:
-                r[n] += (
-                    self.variables["fruits_per_plant#nb"][position].value
-                    * self.variables["fruit_weight#g"][position].value
-                    * self.parameters["fruit_conditions"][n + "_fruit_consumption#g.g-1"]
-                )
-            r[n] *= self.variables["population#nb"][position].value
+            r[n] = r[n] + np.where(
+                is_growing,
+                self.variables["size#cm"].values[position]
+                * 10
+                * self.parameters["grow_conditions"][n + "_grow_consumption#g.mm-1"],
+                0.0,
+            )
+            r[n] = r[n] + np.where(
+                is_blooming,
+                self.variables["flowers_per_plant#nb"].values[position]
+                * self.parameters["bloom_conditions"][n + "_flower_consumption#g"],
+                0.0,
+            )
+            r[n] = r[n] + np.where(
+                is_fruiting,
+                self.variables["fruits_per_plant#nb"].values[position]
+                * self.variables["fruit_weight#g"].values[position]
+                * self.parameters["fruit_conditions"][n + "_fruit_consumption#g.g-1"],
+                0.0,
+            )
+            r[n] = np.where(
+                active, r[n] * self.variables["population#nb"].values[position], 0.0
+            )
         return r
 
     def requirement_water(self, position, weather, field):
         """
-        return water requirement in mL
+        return water requirement in mL, at `position` being either a plot (x,y) or
+        ``...`` for all plots at once.
         """
-        if not self.is_active(position):
-            return 0
         w = (
-            weather.evaporation(field) # Evaporation in mL.m-2.day-1
+            weather.evaporation(field)  # Evaporation in mL.m-2.day-1
             * self.parameters["grow_conditions"]["grow_leaf_surface#m2.cm-1"]
-            * self.variables["size#cm"][position].value
+            * self.variables["size#cm"].values[position]
+        )
+        w = w + np.where(
+            self.stage_in(position, "entered_grow", "grow"),
+            self.parameters["grow_conditions"]["Water_grow_consumption#mL"],
+            0.0,
+        )
+        w = w + np.where(
+            self.stage_in(position, "entered_bloom", "bloom"),
+            self.variables["flowers_per_plant#nb"].values[position]
+            * self.parameters["bloom_conditions"]["Water_flower_consumption#mL"],
+            0.0,
+        )
+        w = w + np.where(
+            self.stage_in(position, "entered_fruit", "fruit"),
+            self.variables["fruits_per_plant#nb"].values[position]
+            * self.parameters["fruit_conditions"]["Water_fruit_consumption#mL.g-1"]
+            * self.variables["fruit_weight#g"].values[position],
+            0.0,
         )
-        if self.variables["stage"][position].value in ["entered_grow", "grow"]:
-            w += self.parameters["grow_conditions"]["Water_grow_consumption#mL"]
-        if self.variables["stage"][position].value in ["entered_bloom", "bloom"]:
-            w += (self.variables["flowers_per_plant#nb"][position].value
-                * self.parameters["bloom_conditions"]["Water_flower_consumption#mL"]
-            )
-
-        if self.variables["stage"][position].value in ["entered_fruit", "fruit"]:
-            w += (self.variables["fruits_per_plant#nb"][position].value
-                * self.parameters["fruit_conditions"]["Water_fruit_consumption#mL.g-1"]
-                * self.variables["fruit_weight#g"][position].value
-            )
-
-        w = w * self.variables["population#nb"][position].value
-        return w
 
+        w = w * self.variables["population#nb"].values[position]
+        return np.where(self.is_active(position), w, 0)
 
     def receive_nutrients(self, position, nutrients, stress):
-        if self.is_active(position):
-            self.variables["cumulated_nutrients_C#g"][position].set_value(
-                self.variables["cumulated_nutrients_C#g"][position].value
-                + nutrients["C#g"]
-            )
-            self.variables["cumulated_nutrients_N#g"][position].set_value(
-                self.variables["cumulated_nutrients_N#g"][position].value
-                + nutrients["N#g"]
-            )
-            self.variables["cumulated_nutrients_P#g"][position].set_value(
-                self.variables["cumulated_nutrients_P#g"][position].value
-                + nutrients["P#g"]
-            )
-            self.variables["cumulated_nutrients_K#g"][position].set_value(
-                self.variables["cumulated_nutrients_K#g"][position].value
-                + nutrients["K#g"]
-            )
-            self.variables["cumulated_stress_nutrients_C#g"][position].set_value(
-                self.variables["cumulated_stress_nutrients_C#g"][position].value
-                + stress["C#g"]
-            )
-            self.variables["cumulated_stress_nutrients_N#g"][position].set_value(
-                self.variables["cumulated_stress_nutrients_N#g"][position].value
-                + stress["N#g"]
-            )
-            self.variables["cumulated_stress_nutrients_P#g"][position].set_value(
-                self.variables["cumulated_stress_nutrients_P#g"][position].value
-                + stress["P#g"]
-            )
-            self.variables["cumulated_stress_nutrients_K#g"][position].set_value(
-                self.variables["cumulated_stress_nutrients_K#g"][position].value
-                + stress["K#g"]
-            )
+        active = self.is_active(position)
+        for n in ["C", "N", "P", "K"]:
+            for key, received in [
+                ("cumulated_nutrients_" + n + "#g", nutrients),
+                ("cumulated_stress_nutrients_" + n + "#g", stress),
+            ]:
+                variable = self.variables[key]
+                value = variable.values[position]
+                variable.set_values(
+                    np.where(active, value + received[n + "#g"], value), position
+                )
 
     def receive_water(self, position, water, stress):
-        if self.is_active(position):
-            # print("WATER RECEIVED", water, stress)
-            self.variables["cumulated_stress_water#L"][position].set_value(
-                self.variables["cumulated_stress_water#L"][position].value + stress
-            )
+        variable = self.variables["cumulated_stress_water#L"]
+        value = variable.values[position]
+        variable.set_values(
+            np.where(self.is_active(position), value + stress, value), position
+        )
 
     def release_nutrients(self, position, soil):
+        """
+        return nutrients released in g, at `position` being either a plot (x,y) or
+        ``...`` for all plots at once.
+        """
         r = {"N#g": 0.0, "K#g": 0.0, "P#g": 0.0, "C#g": 0.0}  # 'Water':(0.,1.)}
-        if self.variables["stage"][position].value in ["dead"]:
-            for n in ["N", "K", "P", "C"]:
-                # TODO: Use total nutrients received and release as function of soil_microlife_health_index in [0,1]?
-                r[n + "#g"] = (
-                    self.variables["cumulated_nutrients_" + n + "#g"][position].value
-                    * self.parameters["death_conditions"][
-                        n + "_release_speed#g.g-1.day-1"
-                    ]
-                    * (soil.variables["microlife_health_index#%"][position].value / 100)
-                    * self.variables["population#nb"][position].value
-                )
-                self.variables["cumulated_nutrients_" + n + "#g"][position].set_value(
-                    max(
-                        0,
-                        self.variables["cumulated_nutrients_" + n + "#g"][
-                            position
-                        ].value
-                        - r[n + "#g"],
-                    )
-                )
-        elif self.is_active(position):
-            p = self.parameters["grow_conditions"]
-            nb = self.variables["population#nb"][position].value
-            r["N#g"] = (
-                nb
-                * p["N_air_storage#g.mm-1"]
-                * self.variables["size#cm"][position].value
-                * 10
+        is_dead = self.stage_in(position, "dead")
+        for n in ["N", "K", "P", "C"]:
+            # TODO: Use total nutrients received and release as function of
+            # soil_microlife_health_index in [0,1]?
+            cumulated = self.variables["cumulated_nutrients_" + n + "#g"]
+            value = cumulated.values[position]
+            release = (
+                value
+                * self.parameters["death_conditions"][n + "_release_speed#g.g-1.day-1"]
+                * (soil.variables["microlife_health_index#%"].values[position] / 100)
+                * self.variables["population#nb"].values[position]
             )
-            r["C#g"] = (
-                nb
-                * p["C_air_storage#g.mm-1"]
-                * self.variables["size#cm"][position].value
-                * 10
+            r[n + "#g"] = np.where(is_dead, release, 0.0)
+            cumulated.set_values(
+                np.where(is_dead, np.maximum(0, value - release), value), position
             )
+        active = self.is_active(position)
+        p = self.parameters["grow_conditions"]
+        nb = self.variables["population#nb"].values[position]
+        size = self.variables["size#cm"].values[position]
+        r["N#g"] = np.where(
+            active, nb * p["N_air_storage#g.mm-1"] * size * 10, r["N#g"]
+        )
+        r["C#g"] = np.where(
+            active, nb * p["C_air_storage#g.mm-1"] * size * 10, r["C#g"]
+        )
         return r
 
     def compute_shadowsurface(self, position):
         # returns shadow effective size in m2
-        if self.is_active(position):
-            # Consider a plant is a ball of diameter size#cm
-            r = self.variables["size#cm"][position].value * 0.01 / 2.0
-            return (
-                np.pi * r * r * self.variables["population#nb"][position].value
-            )  * self.parameters['shadow_coeff#%']
-        return 0
+        # Consider a plant is a ball of diameter size#cm
+        r = self.variables["size#cm"].values[position] * 0.01 / 2.0
+        return np.where(
+            self.is_active(position),
+            (np.pi * r * r * self.variables["population#nb"].values[position])
+            * self.parameters["shadow_coeff#%"],
+            0,
+        )
 
     def to_fieldimage(self):
         im_width, im_height = 64, 64
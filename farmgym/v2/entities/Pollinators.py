@@ -1,7 +1,7 @@
 import numpy as np
 from PIL import Image
 
-from farmgym.v2.entity_api import Entity_API, Range, checkissubclass, expglm, fillarray
+from farmgym.v2.entity_api import Condition, Entity_API, Range, fillarray
 
 
 class Pollinators(Entity_API):
@@ -21,6 +21,9 @@ class Pollinators(Entity_API):
 
         self.dependencies = {"Weather", "Soil", "Plant", "Birds"}
 
+        # Compiled conditions, see compile_conditions.
+        self.conditions = None
+
     def get_parameter_keys(self):
         return ["visit_conditions"]
 
@@ -31,29 +34,34 @@ class Pollinators(Entity_API):
             X, Y, ["True", "False"], "False"
         )  # np.full((X,Y),fill_value=Range(['True','False'],'True'))
         self.variables["total_cumulated_occurrence#nb"] = Range((0, 1000), 0.0)
+        self.conditions = None
         self.initialize_variables(self.initial_conditions)
 
+    def compile_conditions(self):
+        """
+        Compiles the conditions of the `*_conditions` parameter blocks used in
+        `update_variables`, once per episode.
+        """
+        return {
+            "visit": Condition(
+                self.parameters["visit_conditions"],
+                "theta_0",
+                [
+                    ("theta_dist_edge", -np.infty, 0.0),
+                    ("theta_death_birds", 0, "death_birds_max"),
+                    ("theta_T", "T_min", "T_max"),
+                    ("theta_Wind", -np.infty, "Wind_max"),
+                    ("theta_Rain", -np.infty, 0.0),
+                    ("theta_pesticide", -np.infty, "pesticide_tol"),
+                ],
+            )
+        }
+
     def update_variables(self, field, entities):
-        weather = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Weather")
-        ][0]
-        soil = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Soil")
-        ][0]
-        plants = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Plant")
-        ]
-        birds = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Birds")
-        ]
+        weather = field.get_entities("Weather")[0]
+        soil = field.get_entities("Soil")[0]
+        plants = field.get_entities("Plant")
+        birds = field.get_entities("Birds")
         nb_birds_eating_pollinators = np.sum(
             [
                 b.variables["population#nb"].value
@@ -61,6 +69,16 @@ class Pollinators(Entity_API):
                 if b.parameters["pollinator_eater"]
             ]
         )
+        if self.conditions is None:
+            self.conditions = self.compile_conditions()
+        q_appears = self.conditions["visit"].expglm(
+            field.distances_to_edge,
+            nb_birds_eating_pollinators,
+            weather.variables["air_temperature"]["mean#°C"].value,
+            weather.variables["wind"]["speed#km.h-1"].value,
+            0 if weather.variables["rain_amount#mm.day-1"].value == "None" else 1.0,
+            soil.variables["amount_cide#g"]["pollinators"].values,
+        )
         for x in range(self.field.X):
             for y in range(self.field.Y):
                 flowers = np.sum(
@@ -73,60 +91,7 @@ class Pollinators(Entity_API):
                     ]
                 )
 
-                p = self.parameters["visit_conditions"]
-                q = []
-                q.append(
-                    (
-                        p["theta_dist_edge"],
-                        field.distance_to_edge((x, y)),
-                        -np.infty,
-                        0.0,
-                    )
-                )
-                q.append(
-                    (
-                        p["theta_death_birds"],
-                        nb_birds_eating_pollinators,
-                        0,
-                        p["death_birds_max"],
-                    )
-                )
-                q.append(
-                    (
-                        p["theta_T"],
-                        weather.variables["air_temperature"]["mean#°C"].value,
-                        p["T_min"],
-                        p["T_max"],
-                    )
-                )
-                q.append(
-                    (
-                        p["theta_Wind"],
-                        weather.variables["wind"]["speed#km.h-1"].value,
-                        -np.infty,
-                        p["Wind_max"],
-                    )
-                )
-                q.append(
-                    (
-                        p["theta_Rain"],
-                        0
-                        if weather.variables["rain_amount#mm.day-1"].value == "None"
-                        else 1.0,
-                        -np.infty,
-                        0.0,
-                    )
-                )
-                q.append(
-                    (
-                        p["theta_pesticide"],
-                        soil.variables["amount_cide#g"]["pollinators"][x, y].value,
-                        -np.infty,
-                        p["pesticide_tol"],
-                    )
-                )
-                # q.append((p['theta_pesticide'], soil.variables['amount_cide#g']['pollinators'][x,y], -np.infty, p['pesticide_tol']))
-                q_appear = expglm(p["theta_0"], q)
+                q_appear = q_appears[x, y]
                 #if flowers>0:
                 #    print("POLLINATOR appearance proba",q_appear, flowers)
 
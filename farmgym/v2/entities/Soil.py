@@ -1,10 +1,12 @@
 import numpy as np
 from PIL import Image
 
-from farmgym.v2.entity_api import Entity_API, Range, checkissubclass, expglm, fillarray
+from farmgym.v2.entity_api import Entity_API, Range, expglm, expglm_array, fillarray
 
 
 class Soil(Entity_API):
+    batched_update = True
+
     def __init__(self, field, parameters):
         Entity_API.__init__(self, field, parameters)
         X = self.field.X
@@ -77,29 +79,30 @@ class Soil(Entity_API):
 
     def reset(self):
         # Generate a random soil
-        for x in range(self.field.X):
-            for y in range(self.field.Y):
-                self.variables["depth#m"][x,y].set_value(self.parameters["depth#m"])
-                self.variables["available_N#g"][x, y].set_value(
-                    self.variables["depth#m"][x,y].value *self.field.plotsurface * (5000+200)/2
-                )
-                self.variables["available_P#g"][x, y].set_value(
-                    self.variables["depth#m"][x,y].value *self.field.plotsurface * (5000+100)/2
-                )
-                self.variables["available_K#g"][x, y].set_value(
-                    self.variables["depth#m"][x,y].value *self.field.plotsurface * (50000+5000)/2
-                )
-                self.variables["available_C#g"][x, y].set_value(
-                    self.variables["depth#m"][x,y].value *self.field.plotsurface * (50000+10000)/2
-                )
-                self.variables["available_Water#L"][x, y].set_value(
-                    self.variables["depth#m"][x, y].value * self.field.plotsurface * min(self.parameters["max_water_capacity#L.m-3"],(200+300)/2)
-                )
-                self.variables["microlife_health_index#%"][x, y].set_value(100)
-                self.variables["amount_cide#g"]["pollinators"][x, y].set_value(0)
-                self.variables["amount_cide#g"]["pests"][x, y].set_value(0)
-                self.variables["amount_cide#g"]["soil"][x, y].set_value(0)
-                self.variables["amount_cide#g"]["weeds"][x, y].set_value(0)
+        self.variables["depth#m"].fill(self.parameters["depth#m"])
+        depth = self.variables["depth#m"].values
+        self.variables["available_N#g"].set_values(
+            depth * self.field.plotsurface * (5000 + 200) / 2
+        )
+        self.variables["available_P#g"].set_values(
+            depth * self.field.plotsurface * (5000 + 100) / 2
+        )
+        self.variables["available_K#g"].set_values(
+            depth * self.field.plotsurface * (50000 + 5000) / 2
+        )
+        self.variables["available_C#g"].set_values(
+            depth * self.field.plotsurface * (50000 + 10000) / 2
+        )
+        self.variables["available_Water#L"].set_values(
+            depth
+            * self.field.plotsurface
+            * min(self.parameters["max_water_capacity#L.m-3"], (200 + 300) / 2)
+        )
+        self.variables["microlife_health_index#%"].fill(100)
+        self.variables["amount_cide#g"]["pollinators"].fill(0)
+        self.variables["amount_cide#g"]["pests"].fill(0)
+        self.variables["amount_cide#g"]["soil"].fill(0)
+        self.variables["amount_cide#g"]["weeds"].fill(0)
         self.variables["total_cumulated_added_water#L"].set_value(0.0)
         # self.variables["total_cumulated_added_pesticide#g"] = 0.
         # self.variables["total_cumulated_added_herbicide#g"] = 0.
@@ -110,6 +113,8 @@ class Soil(Entity_API):
         self.initialize_variables(self.initial_conditions)
 
     def update_variables(self, field, entities):
+        # All plots are updated at once: each quantity below is an array over the field,
+        # and entities are processed in the same order as a plot-by-plot update.
         max_water_plot_capacity = (
             self.parameters["max_water_capacity#L.m-3"]
             * self.field.plotsurface
@@ -117,268 +122,185 @@ class Soil(Entity_API):
         )
 
         # plants = [entities[e] for e in entities if issubclass(entities[e].__class__,Plant)]
-        plants = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Plant")
-        ]
-        weather = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Weather")
-        ][0]
-        fertilizers = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Fertilizer")
-        ]
-        weeds = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Weeds")
-        ]
-        cides = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Cide")
-        ]
+        plants = field.get_entities("Plant")
+        weather = field.get_entities("Weather")[0]
+        fertilizers = field.get_entities("Fertilizer")
+        weeds = field.get_entities("Weeds")
+        cides = field.get_entities("Cide")
+
+        water = self.variables["available_Water#L"]
+        microlife = self.variables["microlife_health_index#%"]
+        available = {
+            n: self.variables["available_" + n + "#g"] for n in ["N", "K", "P", "C"]
+        }
+        amount_cide = self.variables["amount_cide#g"]
+
+        # TODO : Water after input = actuel + precipation
+        # Natural water input (rain)
+        # rain_amount#mm.day-1
+        # TODO: Multiplier par la surface et convertir en L
+        water_after_input = (
+            water.values
+            + (
+                weather.variables["rain_amount#mm.day-1"].value
+                * self.field.plotsurface
+                / 1000
+            )
+            * 1000
+            # *1000  for conversion from m3 to L
+        )
+        water.set_values(np.minimum(max_water_plot_capacity, water_after_input))
+        water_surplus = water_after_input - water.values
+
+        # Natural nutrients input (earth)
+        for n in ["N", "K", "P", "C"]:
+            available[n].set_values(
+                available[n].values
+                + microlife.values
+                / 100.0
+                * self.parameters["bedrocks_release_" + n + "#mg.day-1"]
+                / 1000.0
+            )
 
-        for x in range(self.field.X):
-            for y in range(self.field.Y):
-                water_surplus = 0
-                # TODO : Water after input = actuel + precipation
-                # Natural water input (rain)
-                # rain_amount#mm.day-1
-                # TODO: Multiplier par la surface et convertir en L
-                water_after_input = (
-                    self.variables["available_Water#L"][x, y].value
-                    + (
-                        weather.variables["rain_amount#mm.day-1"].value
-                        * self.field.plotsurface
-                        / 1000
-                    )
-                    * 1000
-                    # *1000  for conversion from m3 to L
-                )
-                self.variables["available_Water#L"][x, y].set_value(
-                    min(max_water_plot_capacity, water_after_input)
-                )
-                water_surplus = (
-                    water_after_input - self.variables["available_Water#L"][x, y].value
+        # Other nutrients input (fertilizers)
+        for f in fertilizers:
+            # Q: Here, should we trigger update of f entity or simply compute amount?
+            # [f is updated later or earlier]
+            # Answer: Receiver always triggers action, Emitter never triggers it.
+            release = f.release_nutrients(..., self)  # in kg
+            for n in ["N", "K", "P", "C"]:
+                available[n].set_values(available[n].values + release[n] * 1000)
+
+        for c in cides:
+            release = c.release(...)  # in kg
+
+            for n in ["pollinators", "pests", "soil", "weeds"]:
+                amount_cide[n].set_values(
+                    amount_cide[n].values + release * 1000 * c.parameters[n]
                 )
 
-                # Natural nutrients input (earth)
-                for n in ["N", "K", "P", "C"]:
-                    self.variables["available_" + n + "#g"][x, y].set_value(
-                        self.variables["available_" + n + "#g"][x, y].value
-                        + self.variables["microlife_health_index#%"][x, y].value
-                        / 100.0
-                        * self.parameters["bedrocks_release_" + n + "#mg.day-1"]
-                        / 1000.0
+        # Weed nutrients and water consumption:
+        for w in weeds:
+            requirements = w.requirement(...)  # in g
+            release = w.release_nutrients(..., self)  # in g
+            for n in ["N", "K", "P", "C"]:
+                available[n].set_values(
+                    np.maximum(
+                        0.0,
+                        available[n].values
+                        - requirements[n + "#g"]
+                        + release[n + "#g"],
                     )
+                )
 
-                # Other nutrients input (fertilizers)
-                for f in fertilizers:
-                    # Q: Here, should we trigger update of f entity or simply compute amount? [f is updated later or earlier]
-                    # Answer: Receiver always triggers action, Emitter never triggers it.
-                    release = f.release_nutrients((x, y), self)  # in kg
-                    for n in ["N", "K", "P", "C"]:
-                        self.variables["available_" + n + "#g"][x, y].set_value(
-                            self.variables["available_" + n + "#g"][x, y].value
-                            + release[n] * 1000
-                        )
-
-                for c in cides:
-                    release = c.release((x, y))  # in kg
-
-                    for n in ["pollinators", "pests", "soil", "weeds"]:
-                        self.variables["amount_cide#g"][n][x, y].set_value(
-                            self.variables["amount_cide#g"][n][x, y].value
-                            + release * 1000 * c.parameters[n]
-                        )
-
-                # Weed nutrients and water consumption:
-                for w in weeds:
-                    requirements = w.requirement((x, y))  # in g
-                    release = w.release_nutrients((x, y), self)  # in g
-                    for n in ["N", "K", "P", "C"]:
-                        self.variables["available_" + n + "#g"][x, y].set_value(
-                            max(
-                                0.0,
-                                self.variables["available_" + n + "#g"][x, y].value
-                                - requirements[n + "#g"]
-                                + release[n + "#g"],
-                            )
-                        )
+            water.set_values(np.maximum(0.0, water.values - requirements["Water#L"]))
+
+        # Plant nutrients consumption or release:
+        milife = microlife.values / 100.0
+        for p in plants:
+            requirements = p.requirement_nutrients(...)
+            release = p.release_nutrients(..., self)  # in g
+            v = {}
+            stress = {}
+            for n in ["N", "K", "P", "C"]:
+                v[n + "#g"] = np.minimum(available[n].values, milife * requirements[n])
+                stress[n + "#g"] = requirements[n] - v[n + "#g"]
+                available[n].set_values(
+                    available[n].values - v[n + "#g"] + release[n + "#g"]
+                )
+            p.receive_nutrients(..., v, stress)
 
-                    self.variables["available_Water#L"][x, y].set_value(
-                        max(
-                            0.0,
-                            self.variables["available_Water#L"][x, y].value
-                            - requirements["Water#L"],
-                        )
-                    )
+            # Plant water requirement
+            requirement_water = p.requirement_water(..., weather, field)
+            # print("PLANT WATER REQUIRES", requirement_water)
+            wp = (
+                self.parameters["wilting_point#L.m-3"]
+                * self.parameters["depth#m"]
+                * self.field.plotsurface
+            )
 
-                # Plant nutrients consumption or release:
-                milife = self.variables["microlife_health_index#%"][x, y].value / 100.0
-                for p in plants:
-                    requirements = p.requirement_nutrients((x, y))
-                    release = p.release_nutrients((x, y), self)  # in g
-                    v = {}
-                    stress = {}
-                    for n in ["N", "K", "P", "C"]:
-                        v[n + "#g"] = min(
-                            self.variables["available_" + n + "#g"][x, y].value,
-                            milife * requirements[n],
-                        )
-                        stress[n + "#g"] = requirements[n] - v[n + "#g"]
-                        self.variables["available_" + n + "#g"][x, y].set_value(
-                            self.variables["available_" + n + "#g"][x, y].value
-                            - v[n + "#g"]
-                            + release[n + "#g"]
-                        )
-                    p.receive_nutrients((x, y), v, stress)
-
-                    # Plant water requirement
-                    requirement_water = p.requirement_water((x, y), weather, field)
-                    # print("PLANT WATER REQUIRES", requirement_water)
-                    wp = (
-                        self.parameters["wilting_point#L.m-3"]
-                        * self.parameters["depth#m"]
-                        * self.field.plotsurface
-                    )
+            w = np.minimum(requirement_water, np.maximum(water.values - wp, 0))
+            stress_water = requirement_water - w
 
-                    w = min(
-                        requirement_water,
-                        max(self.variables["available_Water#L"][x, y].value - wp, 0),
-                    )
-                    stress_water = requirement_water - w
+            water.set_values(water.values - w)
+            # print("SOIL ",requirement_water, w, stress_water)
+            p.receive_water(..., w, stress_water)
 
-                    self.variables["available_Water#L"][x, y].set_value(
-                        self.variables["available_Water#L"][x, y].value - w
-                    )
-                    # print("SOIL ",requirement_water, w, stress_water)
-                    p.receive_water((x, y), w, stress_water)
+        # Soil water evaporation (depend on shadows...)
+        soil_evaporated_water = (
+            self.ground_evaporation(..., weather, plants, weeds, field) / 1000
+        )
+        water.set_values(np.maximum(0, water.values - soil_evaporated_water))
+
+        # Microlife health index:
+        q = []
+        q.append((2.0, amount_cide["soil"].values / 100, 0, 0))
+        q.append((5.0, water_surplus / max_water_plot_capacity, 0, 0))
+        p_stayalive = expglm_array(0.0, q)
+        microlife.set_values(
+            (
+                p_stayalive * (1 + 0.02 * p_stayalive)
+                + (1 - p_stayalive) * (p_stayalive)
+            )
+            * microlife.values
+        )
 
-                # Soil water evaporation (depend on shadows...)
-                soil_evaporated_water = (
-                    self.ground_evaporation((x, y), weather, plants, weeds, field)
-                    / 1000
-                )
-                # water_evaporation_threshold = (
-                #     self.parameters["max_water_capacity#L.m-3"]
-                #     * self.field.plotsurface
-                #     * (
-                #         self.parameters["depth#m"]
-                #         - self.parameters["total_evaporable_water#mm"] / 1000
-                #     )
-                # )
-                # # print("SOIL", soil_evaporated_water)
-                # soil_evaporated_water = min(
-                #     soil_evaporated_water,
-                #     max(
-                #         self.variables["available_Water#L"][x, y].value
-                #         - water_evaporation_threshold,
-                #         0,
-                #     ),
-                # )
-                # print("SOIL", soil_evaporated_water, water_evaporation_threshold)
-                # if (self.variables['available_Water#L'][x,y].value  - soil_evaporated_water<water_evaporation_threshold):
-
-                self.variables["available_Water#L"][x, y].set_value(
-                    max(
+        # Soil nutrients/water/pesticide/herbicide leakage due to rain.
+        # TODO-WU : Rain intensity ?
+        # rain_intensity = weather.variables["rain_intensity"].value
+        # rain_intensity = 0
+        is_surplus = water_surplus > 0
+        if np.any(is_surplus):
+            milife = microlife.values / 100.0
+            surf = self.field.plotsurface
+            for n in ["N", "K", "P", "C"]:
+                available[n].set_values(
+                    np.maximum(
                         0,
-                        self.variables["available_Water#L"][x, y].value
-                        - soil_evaporated_water,
-                    )
+                        available[n].values
+                        - surf * water_surplus / max_water_plot_capacity * (1 - milife),
+                    ),
+                    is_surplus,
                 )
-
-                # Microlife health index:
-                q = []
-                q.append(
-                    (
-                        2.0,
-                        self.variables["amount_cide#g"]["soil"][x, y].value / 100,
-                        0,
+            for n in ["pollinators", "pests", "soil", "weeds"]:
+                amount_cide[n].set_values(
+                    np.maximum(
                         0,
-                    )
+                        amount_cide[n].values
+                        - surf * water_surplus / max_water_plot_capacity,
+                    ),
+                    is_surplus,
                 )
-                q.append((5.0, water_surplus / max_water_plot_capacity, 0, 0))
-                p_stayalive = expglm(0.0, q)
-                #print("WATER SURPLUS, MICROLIFE",p_stayalive, q)
-                # print("STAYALIVE",p_stayalive,self.variables['amount_cide#g']['soil'][x,y].value,water_surplus/max_water_plot_capacity)
-                # is_dead = (self.np_random.binomial(1, p_stayalive, 1)[0] == 0)
-                # if (is_dead):
-                #    self.variables['microlife_health_index#%'][x, y].set_value(
-                #        self.variables['microlife_health_index#%'][x, y].value * p_stayalive)
-                # else:
-                #    self.variables['microlife_health_index#%'][x, y].set_value(min(100,
-                #        self.variables['microlife_health_index#%'][x, y].value * (1+0.02*p_stayalive)))
-                self.variables["microlife_health_index#%"][x, y].set_value(
-                    (
-                        (
-                            p_stayalive * (1 + 0.02 * p_stayalive)
-                            + (1 - p_stayalive) * (p_stayalive)
-                        )
-                        * self.variables["microlife_health_index#%"][x, y].value
-                    )
-                )
-
-                # Soil nutrients/water/pesticide/herbicide leakage due to rain.
-                # TODO-WU : Rain intensity ?
-                # rain_intensity = weather.variables["rain_intensity"].value
-                # rain_intensity = 0
-                if water_surplus > 0:
-                    #print("WATER SURPLUS", water_surplus)
-                    milife = (
-                        self.variables["microlife_health_index#%"][x, y].value / 100.0
-                    )
-                    surf = self.field.plotsurface
-                    for n in ["N", "K", "P", "C"]:
-                        self.variables["available_" + n + "#g"][x, y].set_value(
-                            max(
-                                0,
-                                self.variables["available_" + n + "#g"][x, y].value
-                                - surf
-                                * water_surplus
-                                / max_water_plot_capacity
-                                * (1 - milife),
-                            )
-                        )
-                    for n in ["pollinators", "pests", "soil", "weeds"]:
-                        self.variables["amount_cide#g"][n][x, y].set_value(
-                            max(
-                                0,
-                                self.variables["amount_cide#g"][n][x, y].value
-                                - surf * water_surplus / max_water_plot_capacity,
-                            )
-                        )
 
     def ground_evaporation(self, position, weather, plants, weeds, field):
-        """in mL"""
+        """
+        in mL, at `position` being either a plot (x,y) or ``...`` for all plots at once.
+        """
         ET_0 = weather.evaporation(field)  # mL/m2/day
 
         # Compute % of ground covered by shadow:
-        plantshadow = np.sum(
-            [
-                p.compute_shadowsurface(position) for p in plants
-            ]
-        )
-        weedshadow = np.sum([w.compute_shadowsurface(position) for w in weeds])
-        shadow_proportion = min(
+        plantshadow = sum(p.compute_shadowsurface(position) for p in plants)
+        weedshadow = sum(w.compute_shadowsurface(position) for w in weeds)
+        shadow_proportion = np.minimum(
             (plantshadow + weedshadow) / self.field.plotsurface, 1.0
         )
         wp = (
-                self.parameters["wilting_point#L.m-3"]
-                * self.parameters["depth#m"]
-                * self.field.plotsurface
+            self.parameters["wilting_point#L.m-3"]
+            * self.parameters["depth#m"]
+            * self.field.plotsurface
+        )
+        wet_proportion = np.maximum(
+            self.variables["available_Water#L"].values[position] - wp, 0
+        ) / (
+            self.field.plotsurface
+            * self.variables["depth#m"].values[position]
+            * self.parameters["max_water_capacity#L.m-3"]
         )
-        wet_proportion = max(self.variables["available_Water#L"][position].value -wp,0)/ (self.field.plotsurface * self.variables["depth#m"][position].value*self.parameters["max_water_capacity#L.m-3"])
-        evapo_prop = min(1.0 - shadow_proportion, wet_proportion)
+        evapo_prop = np.minimum(1.0 - shadow_proportion, wet_proportion)
 
         # print("EVAPO_prop",evapo_prop,  shadow_proportion, wet_proportion)
         drop_proportion = (
-            (1.1 - self.variables["microlife_health_index#%"][position].value / 100)
+            (1.1 - self.variables["microlife_health_index#%"].values[position] / 100)
             * self.field.plotsurface
             * self.parameters["depth#m"]
             * self.parameters["water_leakage_max#L.m-3.day-1"]
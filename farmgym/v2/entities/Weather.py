@@ -1,16 +1,21 @@
+import functools
 import math
 
 import numpy as np
 from PIL import Image
 
 import farmgym.v2.specifications.specification_manager as sm
-from farmgym.v2.entity_api import Entity_API, Range
+from farmgym.v2.entity_api import Entity_API, Range, RangeArray
 
 
 class Weather(Entity_API):
     def __init__(self, field, parameters):
         Entity_API.__init__(self, field, parameters)
         self.localization = self.field.localization
+        # Solar irradiance of each day of the year, in kWh/m2 per day:
+        self.irradiances = np.array(irradiance_table(self.localization["longitude#°"]))
+        # Last evaporation computed, with the values it depends on:
+        self.evaporation_cache = (None, None)
 
         self.variables = {}
 
@@ -33,42 +38,19 @@ class Weather(Entity_API):
         self.variables["consecutive_frost#day"] = Range((0, 10000), 0.0)
         self.variables["consecutive_dry#day"] = Range((0, 10000), 0.0)
 
+        lookahead = self.parameters["forecast_lookahead"]
         self.variables["forecast"] = {
             "air_temperature": {
-                "mean#°C": np.full(
-                    self.parameters["forecast_lookahead"],
-                    fill_value=Range((-100, 100), 20.0),
-                ),
-                "min#°C": np.full(
-                    self.parameters["forecast_lookahead"],
-                    fill_value=Range((-100, 100), 18.0),
-                ),
-                "max#°C": np.full(
-                    self.parameters["forecast_lookahead"],
-                    fill_value=Range((-100, 100), 22.0),
-                ),
+                "mean#°C": RangeArray((lookahead,), (-100, 100), 20.0),
+                "min#°C": RangeArray((lookahead,), (-100, 100), 18.0),
+                "max#°C": RangeArray((lookahead,), (-100, 100), 22.0),
             },
-            "humidity#%": np.full(
-                self.parameters["forecast_lookahead"],
-                fill_value=Range((0.0, 100.0), 50.0),
-            ),
-            "clouds#%": np.full(
-                self.parameters["forecast_lookahead"],
-                fill_value=Range((0.0, 100.0), 0.0),
-            ),
-            "rain_amount#mm.day-1": np.full(
-                self.parameters["forecast_lookahead"],
-                fill_value=Range((0.0, 100.00), 0.0),
-            ),
+            "humidity#%": RangeArray((lookahead,), (0.0, 100.0), 50.0),
+            "clouds#%": RangeArray((lookahead,), (0.0, 100.0), 0.0),
+            "rain_amount#mm.day-1": RangeArray((lookahead,), (0.0, 100.00), 0.0),
             "wind": {
-                "speed#km.h-1": np.full(
-                    self.parameters["forecast_lookahead"],
-                    fill_value=Range((0.0, 500), 0.0),
-                ),
-                "direction": np.full(
-                    self.parameters["forecast_lookahead"],
-                    fill_value=Range(list(range(360)), 0),
-                ),
+                "speed#km.h-1": RangeArray((lookahead,), (0.0, 500), 0.0),
+                "direction": RangeArray((lookahead,), list(range(360)), 0),
             },
         }
 
@@ -83,10 +65,25 @@ class Weather(Entity_API):
             "WS": "WindSpeed",
             "WD": "WindDirection",
         }
+        # noise parameters of the forecast, in drawing order, and the one applying to
+        # each datakey:
+        self.forecast_noises = [
+            "air_temperature_noise",
+            "humidity_noise",
+            "wind_speed_noise",
+            "wind_direction_noise",
+            "clouds_noise",
+            "rain_amount_noise",
+        ]
+        self.forecast_noise_columns = [0, 0, 0, 1, 5, 4, 2, 3]
 
-        # self.year_weather = sm.load_weather_table(self.parameters["one_year_data_filename"])
-        self.year_weathers, self.weather_alphas = sm.load_weather_table(
-            self.parameters["one_year_data_filename"]
+        # Blended tables for the 365 days of the year, one column per datakey, so that
+        # day lookups are plain array indexing.
+        self.datacolumns = {
+            column: i for i, column in enumerate(self.datakeys.values())
+        }
+        self.weather_table = sm.load_weather_array(
+            self.parameters["one_year_data_filename"], list(self.datacolumns)
         )
         # Local weather
 
@@ -187,74 +184,40 @@ class Weather(Entity_API):
         else:
             self.variables["consecutive_dry#day"].set_value(0)
 
-        for i in range(self.parameters["forecast_lookahead"]):
-            eps = self.np_random.normal(
-                0,
-                self.parameters["air_temperature_noise"]
-                + self.parameters["forecast_noise"] * i,
-                1,
-            )[0]
-            self.variables["forecast"]["air_temperature"]["mean#°C"][i].set_value(
-                self.read_weathercsv(self.datakeys["T"], (day + i) % 365) + eps
-            )
-            self.variables["forecast"]["air_temperature"]["min#°C"][i].set_value(
-                self.read_weathercsv(self.datakeys["Tmin"], day % 365) + eps
-            )
-            self.variables["forecast"]["air_temperature"]["max#°C"][i].set_value(
-                self.read_weathercsv(self.datakeys["Tmax"], day % 365) + eps
-            )
-            eps = self.np_random.normal(
-                0,
-                self.parameters["humidity_noise"]
-                + self.parameters["forecast_noise"] * i,
-                1,
-            )[0]
-            self.variables["forecast"]["humidity#%"][i].set_value(
-                self.read_weathercsv(self.datakeys["H"], day % 365) + eps
-            )
-            eps = self.np_random.normal(
-                0,
-                self.parameters["wind_speed_noise"]
-                + self.parameters["forecast_noise"] * i,
-                1,
-            )[0]
-            self.variables["forecast"]["wind"]["speed#km.h-1"][i].set_value(
-                self.read_weathercsv(self.datakeys["WS"], day % 365) + eps
-            )
-            eps = self.np_random.normal(
-                0,
-                self.parameters["wind_direction_noise"]
-                + self.parameters["forecast_noise"] * i,
-                1,
-            )[0]
-            self.variables["forecast"]["wind"]["direction"][i].set_value(
-                int(self.read_weathercsv(self.datakeys["WD"], day % 365) + eps) % 360
-            )
-            eps = self.np_random.normal(
-                0,
-                self.parameters["clouds_noise"] + self.parameters["forecast_noise"] * i,
-                1,
-            )[0]
-            self.variables["forecast"]["clouds#%"][i].set_value(
-                self.read_weathercsv(self.datakeys["C"], day % 365) + eps
-            )
-            eps = self.np_random.normal(
-                0,
-                self.parameters["rain_amount_noise"]
-                + self.parameters["forecast_noise"] * i,
-                1,
-            )[0]
-            self.variables["forecast"]["rain_amount#mm.day-1"][i].set_value(
-                self.read_weathercsv(self.datakeys["R"], day % 365) + eps
-            )
+        self.update_forecast(day)
+
+    def update_forecast(self, day):
+        """
+        Draws the forecast of all variables for the next `forecast_lookahead` days at
+        once, the noise of the i-th day being increased by `forecast_noise` * i.
+        """
+        lookahead = self.parameters["forecast_lookahead"]
+        scales = np.array(
+            [self.parameters[n] for n in self.forecast_noises]
+        ) + self.parameters["forecast_noise"] * np.arange(lookahead).reshape(-1, 1)
+        eps = self.np_random.normal(0, scales)
+        forecast = (
+            self.weather_table[(day + np.arange(lookahead)) % 365]
+            + eps[:, self.forecast_noise_columns]
+        )
+        values = {k: forecast[:, self.datacolumns[c]] for k, c in self.datakeys.items()}
+
+        variables = self.variables["forecast"]
+        variables["air_temperature"]["mean#°C"].set_values(values["T"])
+        variables["air_temperature"]["min#°C"].set_values(values["Tmin"])
+        variables["air_temperature"]["max#°C"].set_values(values["Tmax"])
+        variables["humidity#%"].set_values(values["H"])
+        variables["wind"]["speed#km.h-1"].set_values(values["WS"])
+        variables["wind"]["direction"].set_values(
+            np.trunc(values["WD"]).astype(int) % 360
+        )
+        variables["clouds#%"].set_values(values["C"])
+        variables["rain_amount#mm.day-1"].set_values(values["R"])
 
     def read_weathercsv(self, variable, day):
-        value = 0
-        # In case there are many weather files, this enables to interpolate between the values of each file:
-        for i in range(len(self.weather_alphas)):
-            # print("VAR",variable,"DAY",day,i,self.year_weathers[i][variable][day],self.weather_alphas[i])
-            value += self.year_weathers[i][variable][day] * self.weather_alphas[i]
-        return value
+        # In case there are many weather files, weather_table already interpolates
+        # between the values of each file:
+        return float(self.weather_table[day, self.datacolumns[variable]])
 
     def act_on_variables(self, action_name, action_params):
         pass
@@ -265,9 +228,24 @@ class Weather(Entity_API):
         """
         Evaporation in mL.m-2.day-1 for a water surface in plain sunlight for the whole day.
         """
-        RA = irradiance_perday(
-            field.localization["longitude#°"], self.variables["day#int365"].value
-        )  # in kWh/m2 per day
+        if self.batch is not None:
+            # One evaporation per farm of the batch, broadcasting over plots.
+            return np.reshape([w.evaporation(field) for _, w in self.batch], (-1, 1, 1))
+        day = self.variables["day#int365"].value
+        inputs = (
+            field.localization["longitude#°"],
+            field.localization["altitude#m"],
+            day,
+            self.variables["humidity#%"].value,
+            self.variables["clouds#%"].value,
+            self.variables["air_temperature"]["mean#°C"].value,
+            self.variables["wind"]["speed#km.h-1"].value,
+        )
+        # Computed only once per day, as long as the weather is unchanged.
+        if self.evaporation_cache[0] == inputs:
+            return self.evaporation_cache[1]
+
+        RA = self.irradiances[day]  # in kWh/m2 per day
 
         rh = self.variables["humidity#%"].value / 100
         cl = self.variables["clouds#%"].value / 100
@@ -289,6 +267,7 @@ class Weather(Entity_API):
         )  # mm/m2
 
         # Base evaporation in mm per day at any point.
+        self.evaporation_cache = (inputs, evapo)
         return evapo
 
     def to_thumbnailimage(self):
@@ -344,6 +323,15 @@ def irradiance_perday(latitude, jour):
     return 24 * H / 1000  # in kWh/m2/day
 
 
+@functools.lru_cache(maxsize=None)
+def irradiance_table(latitude):
+    """
+    Returns the irradiance_perday of the 365 days of the year at `latitude`, computed
+    once per process.
+    """
+    return tuple(irradiance_perday(latitude, jour) for jour in range(365))
+
+
 if __name__ == "__main__":
     # Exemple d'utilisation
     latitude = 48.8566  # Latitude de Paris
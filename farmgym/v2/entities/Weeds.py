@@ -1,7 +1,7 @@
 import numpy as np
 from PIL import Image
 
-from farmgym.v2.entity_api import Entity_API, Range, checkissubclass, expglm, fillarray
+from farmgym.v2.entity_api import Condition, Entity_API, Range, fillarray
 
 
 class Weeds(Entity_API):
@@ -37,6 +37,9 @@ class Weeds(Entity_API):
 
         self.dependencies = {"Weather", "Soil"}
 
+        # Compiled conditions, see compile_conditions.
+        self.conditions = None
+
     def get_parameter_keys(self):
         return [
             "appear_conditions",
@@ -58,19 +61,81 @@ class Weeds(Entity_API):
             X, Y, (0, 1000), 0.0
         )  # np.full((X,Y),fill_value=Range((0,1000),0.))
         self.variables["total_cumulated_plot_population#nb"] = Range((0, 10000), 0.0)
+        self.conditions = None
         self.initialize_variables(self.initial_conditions)
 
+    def compile_conditions(self, soil):
+        """
+        Compiles the conditions of the `*_conditions` parameter blocks used in
+        `update_variables`, once per episode.
+        """
+        appear = self.parameters["appear_conditions"]
+        grow = self.parameters["grow_conditions"]
+        draught = grow["sensibility_draught#%"]
+        w = (
+            (
+                (1.0 - draught) * soil.parameters["wilting_point#L.m-3"]
+                + draught * soil.parameters["max_water_capacity#L.m-3"]
+            )
+            * soil.parameters["depth#m"]
+            * self.field.plotsurface
+        )
+        return {
+            "appear": Condition(
+                appear, "sensitivity_0", [("sensitivity_dist_edge", -np.infty, 0.0)]
+            ),
+            "grow": Condition(
+                grow,
+                "sensitivity_grow_0",
+                [
+                    ("sensitivity_grow_T", "grow_T_min", "grow_T_max"),
+                    ("sensitivity_grow_RH", "grow_RH_min", "grow_RH_max"),
+                    ("sensitivity_grow_herbicide", -np.infty, "grow_herbicide_max#g"),
+                ],
+            ),
+            "flowers": Condition(
+                grow,
+                self.parameters["sensitivity_flowers_0"],
+                [("sensitivity_grow_herbicide", -np.infty, "grow_herbicide_max#g")],
+            ),
+            "death": Condition(
+                grow,
+                "sensitivity_death_0",
+                [
+                    ("sensitivity_death_herbicide", -np.infty, "death_herbicide_max#g"),
+                    ("sensitivity_death_N", "N_grow_consumption#g.mm-1", np.infty),
+                    ("sensitivity_death_K", "K_grow_consumption#g.mm-1", np.infty),
+                    ("sensitivity_death_P", "P_grow_consumption#g.mm-1", np.infty),
+                    ("sensitivity_death_C", "C_grow_consumption#g.mm-1", np.infty),
+                    ("sensitivity_death_Water", w, np.infty),
+                ],
+            ),
+        }
+
     def update_variables(self, field, entities):
-        weather = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Weather")
-        ][0]
-        soil = [
-            entities[e]
-            for e in entities
-            if checkissubclass(entities[e].__class__, "Soil")
-        ][0]
+        weather = field.get_entities("Weather")[0]
+        soil = field.get_entities("Soil")[0]
+        if self.conditions is None:
+            self.conditions = self.compile_conditions(soil)
+
+        # Conditions are evaluated once for all plots (soil is not modified here), then
+        # read at the positions picked below.
+        herbicide = soil.variables["amount_cide#g"]["weeds"].values
+        p_appear = self.conditions["appear"].expglm(field.distances_to_edge)
+        p_grow = self.conditions["grow"].expglm(
+            weather.variables["air_temperature"]["mean#°C"].value,
+            weather.variables["humidity#%"].value,
+            herbicide,
+        )
+        p_flowers = self.conditions["flowers"].expglm(herbicide)
+        p_stayalive = self.conditions["death"].expglm(
+            herbicide,
+            soil.variables["available_N#g"].values,
+            soil.variables["available_K#g"].values,
+            soil.variables["available_P#g"].values,
+            soil.variables["available_C#g"].values,
+            soil.variables["available_Water#L"].values,
+        )
 
         p = 1.0 / (0.0 + self.parameters["time_to_grow#day"])
         # Pick some positions:
@@ -95,21 +160,10 @@ class Weeds(Entity_API):
 
         for pos in positions:
             x, y = pos
-            p = self.parameters["appear_conditions"]
-            q = []
-            q.append(
-                (
-                    p["sensitivity_dist_edge"],
-                    field.distance_to_edge((x, y)),
-                    -np.infty,
-                    0.0,
-                )
-            )
-            p_appear = expglm(p["sensitivity_0"], q)
             # print("WEEDS",p_appear,field.distance_to_edge((x, y)))
 
             z = self.np_random.binomial(
-                self.parameters["max_new_seeds#nb"], p_appear, 1
+                self.parameters["max_new_seeds#nb"], p_appear[x, y], 1
             )[0]
             self.variables["seeds#nb"][x, y].set_value(
                 self.variables["seeds#nb"][x, y].value + z
@@ -147,46 +201,10 @@ class Weeds(Entity_API):
         for pos in pos_grow:  # Seed to Grow
             x, y = pos
             # Grow
-            p = self.parameters["grow_conditions"]
-            q = []
-            q.append(
-                (
-                    p["sensitivity_grow_T"],
-                    weather.variables["air_temperature"]["mean#°C"].value,
-                    p["grow_T_min"],
-                    p["grow_T_max"],
-                )
-            )
-            q.append(
-                (
-                    p["sensitivity_grow_RH"],
-                    weather.variables["humidity#%"].value,
-                    p["grow_RH_min"],
-                    p["grow_RH_max"],
-                )
-            )
-            q.append(
-                (
-                    p["sensitivity_grow_herbicide"],
-                    soil.variables["amount_cide#g"]["weeds"][x, y].value,
-                    -np.infty,
-                    p["grow_herbicide_max#g"],
-                )
-            )
-            # TODO: SHOULD WE ADD THESE CONDITIONS?
-            #            q.append(
-            #                (np.infty, soil.variables['available_N#g'][(x, y)].value, p['N_grow_consumption#g.mm-1'], np.infty))
-            #            q.append(
-            #                (np.infty, soil.variables['available_K#g'][(x, y)].value, p['K_grow_consumption#g.mm-1'], np.infty))
-            #            q.append(
-            #                (np.infty, soil.variables['available_P#g'][(x, y)].value, p['P_grow_consumption#g.mm-1'], np.infty))
-            #            q.append(
-            #                (np.infty, soil.variables['available_C#g'][(x, y)].value, p['C_grow_consumption#g.mm-1'], np.infty))
-            p_grow = expglm(p["sensitivity_grow_0"], q)
-            # print("WEEDS",p_grow,weather.variables['air_temperature']['mean#°C'].value,soil.variables['available_N#g'][(x, y)].value)
-
+            # TODO: SHOULD WE ADD CONDITIONS ON AVAILABLE N, K, P, C (with
+            # N_grow_consumption#g.mm-1 as minimum, etc.)?
             nb_sprouts = self.np_random.binomial(
-                self.variables["seeds#nb"][x, y].value, p_grow, 1
+                self.variables["seeds#nb"][x, y].value, p_grow[x, y], 1
             )[0]
             self.variables["grow#nb"][x, y].set_value(
                 self.variables["grow#nb"][x, y].value + nb_sprouts
@@ -200,22 +218,9 @@ class Weeds(Entity_API):
 
         for pos in pos_bloom:  # Grow to Flowers
             x, y = pos
-            p = self.parameters["grow_conditions"]
             # Flowers
-            q = []
-            q.append(
-                (
-                    p["sensitivity_grow_herbicide"],
-                    soil.variables["amount_cide#g"]["weeds"][x, y].value,
-                    -np.infty,
-                    p["grow_herbicide_max#g"],
-                )
-            )
-            p_flowers = expglm(
-                self.parameters["sensitivity_flowers_0"], q
-            )  # np.exp(-self.parameters['sensitivity_flowers_0'])
             z = self.np_random.binomial(
-                self.variables["grow#nb"][x, y].value, p_flowers, 1
+                self.variables["grow#nb"][x, y].value, p_flowers[x, y], 1
             )[0]
             self.variables["grow#nb"][x, y].set_value(
                 self.variables["grow#nb"][x, y].value - z
@@ -224,75 +229,15 @@ class Weeds(Entity_API):
                 self.variables["flowers#nb"][x, y].value
                 + z
                 * self.np_random.binomial(
-                    self.parameters["flowers_per_plant#nb"], p_flowers, 1
+                    self.parameters["flowers_per_plant#nb"], p_flowers[x, y], 1
                 )[0]
             )
 
         for pos in positions:
             x, y = pos
             # Die
-            p = self.parameters["grow_conditions"]
-            draught = p["sensibility_draught#%"]
-            w = (
-                (
-                    (1.0 - draught) * soil.parameters["wilting_point#L.m-3"]
-                    + draught * soil.parameters["max_water_capacity#L.m-3"]
-                )
-                * soil.parameters["depth#m"]
-                * self.field.plotsurface
-            )
-            q = []
-            q.append(
-                (
-                    p["sensitivity_death_herbicide"],
-                    soil.variables["amount_cide#g"]["weeds"][x, y].value,
-                    -np.infty,
-                    p["death_herbicide_max#g"],
-                )
-            )
-            q.append(
-                (
-                    p["sensitivity_death_N"],
-                    soil.variables["available_N#g"][(x, y)].value,
-                    p["N_grow_consumption#g.mm-1"],
-                    np.infty,
-                )
-            )
-            q.append(
-                (
-                    p["sensitivity_death_K"],
-                    soil.variables["available_K#g"][(x, y)].value,
-                    p["K_grow_consumption#g.mm-1"],
-                    np.infty,
-                )
-            )
-            q.append(
-                (
-                    p["sensitivity_death_P"],
-                    soil.variables["available_P#g"][(x, y)].value,
-                    p["P_grow_consumption#g.mm-1"],
-                    np.infty,
-                )
-            )
-            q.append(
-                (
-                    p["sensitivity_death_C"],
-                    soil.variables["available_C#g"][(x, y)].value,
-                    p["C_grow_consumption#g.mm-1"],
-                    np.infty,
-                )
-            )
-            q.append(
-                (
-                    p["sensitivity_death_Water"],
-                    soil.variables["available_Water#L"][(x, y)].value,
-                    w,
-                    np.infty,
-                )
-            )
-            p_stayalive = expglm(p["sensitivity_death_0"], q)
             z = self.np_random.binomial(
-                self.variables["grow#nb"][x, y].value, p_stayalive, 1
+                self.variables["grow#nb"][x, y].value, p_stayalive[x, y], 1
             )[0]
 
             self.variables["grow#nb"][x, y].set_value(z)
@@ -324,7 +269,11 @@ class Weeds(Entity_API):
             self.variables["flowers#nb"][position].set_value(0)
 
     def requirement(self, position):
-        nb = self.variables["grow#nb"][position].value
+        """
+        Returns nutrients (in g) and water (in L) requirements at `position`, which is
+        either a plot (x,y) or ``...`` for all plots at once.
+        """
+        nb = self.variables["grow#nb"].values[position]
         p = self.parameters["grow_conditions"]
         return {
             "N#g": nb * p["N_grow_consumption#g.mm-1"],
@@ -337,8 +286,8 @@ class Weeds(Entity_API):
     def release_nutrients(self, position, soil):
         r = {"N#g": 0.0, "K#g": 0.0, "P#g": 0.0, "C#g": 0.0}  # 'Water':(0.,1.)}
 
-        nb = self.variables["grow#nb"][position].value
-        nb += self.variables["flowers#nb"][position].value
+        nb = self.variables["grow#nb"].values[position]
+        nb = nb + self.variables["flowers#nb"].values[position]
 
         p = self.parameters["grow_conditions"]
         estimated_size = (self.parameters["size#cm"] * 10) / 2
@@ -349,8 +298,8 @@ class Weeds(Entity_API):
     def compute_shadowsurface(self, position):
         # returns shadow effective size in m2
         n = (
-            self.variables["grow#nb"][position].value
-            + self.variables["flowers#nb"][position].value
+            self.variables["grow#nb"].values[position]
+            + self.variables["flowers#nb"].values[position]
         )
         # Consider a plant is a ball of diameter size#cm
         r = self.parameters["size#cm"] * 0.01 / 2.0
@@ -2,20 +2,25 @@ import itertools
 
 import gymnasium as gym
 import numpy as np
-from gymnasium.spaces import Box, Discrete
+from gymnasium.spaces import Box, Dict, Discrete, Tuple
 from PIL import Image
 
-from farmgym.v2.specifications.specification_manager import load_yaml
+from farmgym.v2.specifications.specification_manager import (
+    load_yaml,
+    specification_exists,
+)
 
 
 def checkissubclass(class_object, class_name):
-    name = class_object.__name__
-    if name == class_name:
-        return True
-    else:
-        for base in class_object.__bases__:
-            checkissubclass(base, class_name)
-        return False
+    return class_name in entity_roles(class_object)
+
+
+def entity_roles(class_object):
+    """
+    Returns the names of all classes in the MRO of `class_object`, e.g. ("CustomPlant",
+    "Plant", "Entity_API", "object").
+    """
+    return tuple(c.__name__ for c in class_object.__mro__)
 
 
 def kappa(x, range):
@@ -42,16 +47,135 @@ def expglmnoisy(theta0, params, sigma2, np_random=np.random):
     return expglm(theta0, params) + np_random.normal() * sigma2
 
 
+def kappa_array(x, range):
+    """
+    Elementwise version of `kappa` for numpy arrays (or scalars) `x`.
+    """
+    a, b = range
+    xx = np.where(x > b, x - b, 0)
+    yy = np.where(x < a, x - a, 0)
+    return xx - yy
+
+
+def glm_array(theta0, params):
+    """
+    Elementwise version of `glm`, where the values in `params` may be numpy arrays (e.g.
+    one value per plot).
+    """
+    v = theta0
+    # Infinite sensitivities times k=0 are discarded by np.where.
+    with np.errstate(invalid="ignore"):
+        for p in params:
+            k = kappa_array(p[1], (p[2], p[3]))
+            v = v + np.where(k > 0, p[0] * k, 0.0)
+    return v
+
+
+def expglm_array(theta0, params):
+    return np.exp(-glm_array(theta0, params))
+
+
+class Condition:
+    """
+    Compiled version of `expglm` for a condition whose sensitivities and ranges are read
+    once, typically from a `*_conditions` parameter block.
+
+    `theta0` and the items of each term (sensitivity, min, max) are either keys of
+    `parameters` or numbers, e.g.::
+
+        Condition(
+            p,
+            "sensitivity_death_0",
+            [("sensitivity_death_birds", 0, "death_birds_max#nb"), ...],
+        )
+
+    Calling `expglm(*values)`, with one value per term, then evaluates exp(-glm) at once
+    for all plots, each value being a scalar or an array over the field.
+    """
+
+    def __init__(self, parameters, theta0, terms):
+        def read(key):
+            return parameters[key] if type(key) == str else key
+
+        self.theta0 = read(theta0)
+        self.thetas = np.array([read(t[0]) for t in terms], dtype=float)
+        self.mins = np.array([read(t[1]) for t in terms], dtype=float)
+        self.maxs = np.array([read(t[2]) for t in terms], dtype=float)
+
+    def glm(self, *values):
+        assert len(values) == len(self.thetas)
+        x = np.stack(np.broadcast_arrays(*values))
+        shape = (len(self.thetas),) + (1,) * (x.ndim - 1)
+        mins = self.mins.reshape(shape)
+        maxs = self.maxs.reshape(shape)
+        k = np.where(x > maxs, x - maxs, 0) - np.where(x < mins, x - mins, 0)
+        # Infinite sensitivities times k=0 are discarded by np.where.
+        with np.errstate(invalid="ignore"):
+            terms = np.where(k > 0, self.thetas.reshape(shape) * k, 0.0)
+        # Terms are added one by one, in order, so that results are the same as `glm`.
+        v = self.theta0
+        for t in terms:
+            v = v + t
+        return v
+
+    def expglm(self, *values):
+        return np.exp(-self.glm(*values))
+
+    def params(self, *values):
+        """
+        Returns the terms of the condition for `values` in the (sensitivity, value, min,
+        max) format of `glm`, e.g. for debugging.
+        """
+        return list(zip(self.thetas, values, self.mins, self.maxs))
+
+
+def code_table(range):
+    """
+    Returns the code table of a list range, that is a dict mapping each element of the
+    range to its (first) index.
+    """
+    codes = {}
+    for i, v in enumerate(range):
+        codes.setdefault(v, i)
+    return codes
+
+
+def code_of(codes, value):
+    """
+    Returns the code of `value` in the code table `codes`, or None if `value` is not in
+    the range.
+    """
+    try:
+        return codes.get(value)
+    except TypeError:  # Unhashable values cannot belong to the range.
+        return None
+
+
+def code_dtype(n):
+    """
+    Returns the smallest signed integer dtype able to store the codes of a range with
+    `n` elements (and -1 for no value).
+    """
+    if n <= np.iinfo(np.int8).max:
+        return np.int8
+    if n <= np.iinfo(np.int16).max:
+        return np.int16
+    return np.int32
+
+
 class Range:
     def __init__(self, range, value):
         self.default_value = value
         self.range = range
         if type(range) == tuple:
+            self.codes = None
             self.min, self.max = range
             self.value = max(self.min, min(self.max, value))
         else:
-            if value in self.range:
-                self.value = value
+            self.codes = code_table(self.range)
+            code = code_of(self.codes, value)
+            if code is not None:
+                self.value = self.range[code]
             else:
                 if len(self.range) > 0:
                     self.value = self.range[0]
@@ -61,8 +185,10 @@ class Range:
     def set_value(self, value):
         if type(self.range) == tuple:
             self.value = max(self.min, min(self.max, value))
-        elif value in self.range:
-            self.value = value
+        else:
+            code = code_of(self.codes, value)
+            if code is not None:
+                self.value = self.range[code]
 
     def get_default_value(self):
         return self.default_value
@@ -106,7 +232,7 @@ class Range:
             # TODO: should be [self.value] for observation to be part of observation space, but creates spurious [][] elsewhere !
             return [self.value]
         else:
-            return self.range.index(self.value)
+            return self.codes[self.value]
 
     def __str__(self):
         s = "(range: "
@@ -131,12 +257,273 @@ class Range:
         return s
 
 
+class RangeArray:
+    """
+    Structure-of-arrays storage for a variable defined on every plot of a field.
+
+    All values are held in one contiguous numpy array (`values`) and the range, hence
+    the bounds, is stored only once.
+    Values of list ranges are stored as small-int codes, i.e. indexes in the range (-1
+    when the range is empty), with `codes` the table from elements to codes.
+    Indexing a single plot returns a `RangeView`, so that
+    ``variables["size#cm"][x, y].value`` and ``.set_value(...)`` keep working,
+    while vectorized code can read `values` and write with `set_values` (or `set_codes`)
+    directly.
+    """
+
+    def __init__(self, shape, range, value):
+        self.default_value = value
+        self.range = range
+        if type(range) == tuple:
+            self.codes = None
+            self.min, self.max = range
+            self.values = np.full(
+                shape, max(self.min, min(self.max, value)), dtype=np.float64
+            )
+        else:
+            self.codes = code_table(self.range)
+            code = code_of(self.codes, value)
+            if code is None:
+                code = 0 if len(self.range) > 0 else -1
+            self.values = np.full(shape, code, dtype=code_dtype(len(self.range)))
+
+    def _view(self, values):
+        view = RangeArray.__new__(RangeArray)
+        view.__dict__.update(self.__dict__)
+        view.values = values
+        return view
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def ndim(self):
+        return self.values.ndim
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        for i in range(len(self.values)):
+            yield self[i]
+
+    def __getitem__(self, key):
+        values = self.values[key]
+        if np.ndim(values) == 0:
+            return RangeView(self, key)
+        return self._view(values)
+
+    def __setitem__(self, key, value):
+        self.set_values(value, key)
+
+    def clip(self, values):
+        """
+        Returns `values` brought back into the range: clamped for continuous ranges,
+        unchanged for lists.
+        """
+        if type(self.range) == tuple:
+            return np.clip(values, self.min, self.max)
+        return values
+
+    def set_values(self, values, where=Ellipsis):
+        """
+        Vectorized counterpart of `Range.set_value`: sets all plots selected by `where`
+        (an index or boolean mask) at once.
+        Continuous values are clamped to the range, categorical values not in the range
+        are ignored.
+        When `where` is a boolean mask, `values` may also be given over the whole field.
+        """
+        if (
+            isinstance(where, np.ndarray)
+            and where.dtype == bool
+            and np.ndim(values) > 0
+        ):
+            values = np.broadcast_to(values, self.values.shape)[where]
+        if type(self.range) == tuple:
+            self.values[where] = np.clip(values, self.min, self.max)
+        else:
+            codes = self.encode(values)
+            self.values[where] = np.where(codes >= 0, codes, self.values[where])
+
+    def set_codes(self, codes, where=Ellipsis):
+        """
+        Sets the codes of a list-ranged variable for all plots selected by `where`,
+        without any lookup.
+        """
+        self.values[where] = codes
+
+    def fill(self, value):
+        self.set_values(value)
+
+    def code(self, value):
+        """
+        Returns the code of `value`, which must be an element of the range.
+        """
+        return self.codes[value]
+
+    def encode(self, values):
+        """
+        Returns the codes of `values` (a value or an array of values), with -1 for
+        values not in the range.
+        """
+
+        def encode_value(v):
+            code = code_of(self.codes, v)
+            return -1 if code is None else code
+
+        return np.vectorize(encode_value, otypes=[self.values.dtype])(
+            np.asarray(values, dtype=object)
+        )
+
+    def decode(self, codes):
+        """
+        Returns the values corresponding to `codes`, as an object array.
+        """
+        return np.array(list(self.range) + [None], dtype=object)[codes]
+
+    def isin(self, *values):
+        """
+        Returns the boolean mask of plots whose value is one of `values`, e.g.
+        ``stage.isin("fruit", "ripe")``.
+        """
+        if len(values) == 1:
+            return self.values == self.codes[values[0]]
+        selected = np.zeros(len(self.range), dtype=bool)
+        selected[[self.codes[v] for v in values]] = True
+        return selected[self.values]
+
+    def get_default_value(self):
+        return self.default_value
+
+    def random_value(self, np_random=np.random):
+        return Range(self.range, self.default_value).random_value(np_random)
+
+    def to_gym_space(self):
+        return Range(self.range, self.default_value).to_gym_space()
+
+    def __str__(self):
+        s = "(range: "
+        if type(self.range) == tuple:
+            m, M = self.range
+            s += str(m) + ", " + str(M)
+        else:
+            s += str(list(self.range))
+        s += "; values: "
+        if self.codes is None:
+            s += str(self.values.tolist()) + ")"
+        else:
+            s += str(self.decode(self.values).tolist()) + ")"
+        return s
+
+    def __repr__(self):
+        return str(self)
+
+
+class RangeView(Range):
+    """
+    A single plot of a `RangeArray`, behaving like a `Range` whose value lives in the
+    underlying array.
+    """
+
+    def __init__(self, array, index):
+        self.array = array
+        self.index = index
+
+    @property
+    def range(self):
+        return self.array.range
+
+    @property
+    def min(self):
+        return self.array.min
+
+    @property
+    def max(self):
+        return self.array.max
+
+    @property
+    def default_value(self):
+        return self.array.default_value
+
+    @property
+    def codes(self):
+        return self.array.codes
+
+    @property
+    def value(self):
+        array = self.array
+        if array.codes is None:
+            return array.values.item(self.index)
+        code = array.values.item(self.index)
+        return array.range[code] if code >= 0 else None
+
+    @value.setter
+    def value(self, value):
+        array = self.array
+        if array.codes is None:
+            array.values[self.index] = value
+        else:
+            array.values[self.index] = array.codes[value]
+
+    def set_value(self, value):
+        array = self.array
+        if array.codes is None:
+            array.values[self.index] = max(array.min, min(array.max, value))
+        else:
+            code = code_of(array.codes, value)
+            if code is not None:
+                array.values[self.index] = code
+
+    def gym_value(self):
+        if self.array.codes is None:
+            return [self.array.values.item(self.index)]
+        return self.array.values.item(self.index)
+
+
+def is_array_variable(x):
+    """
+    Returns True if `x` is a variable holding one value per position (a `RangeArray` or
+    a numpy array of `Range`).
+    """
+    return isinstance(x, (RangeArray, np.ndarray))
+
+
+def variable_leaves(x):
+    """
+    Returns the list of `Range` and `RangeArray` holding the values of `x` (a variable,
+    or a dict of variables), in a fixed order.
+    """
+    if isinstance(x, dict):
+        return [leaf for k in x for leaf in variable_leaves(x[k])]
+    if isinstance(x, RangeArray):
+        return [x]
+    if is_array_variable(x):
+        return [leaf for xx in x.flat for leaf in variable_leaves(xx)]
+    return [x]
+
+
+def variable_gym_space(x):
+    """
+    Returns the gym space of `x` (a variable, or a dict of variables): a `Dict` for
+    dicts, nested `Tuple` (one level per dimension) for array variables. All plots of a
+    `RangeArray` share the same range, hence the same element space, which is built only
+    once.
+    """
+    if isinstance(x, dict):
+        return Dict({k: variable_gym_space(x[k]) for k in x})
+    if isinstance(x, RangeArray):
+        space = x.to_gym_space()
+        for n in reversed(x.shape):
+            space = Tuple([space] * n)
+        return space
+    if is_array_variable(x):
+        return Tuple([variable_gym_space(xx) for xx in x])
+    return x.to_gym_space()
+
+
 def fillarray(x, y, myrange, value):
-    ar = np.empty((x, y), dtype=Range)
-    for xx in range(x):
-        for yy in range(y):
-            ar[xx, yy] = Range(myrange, value)
-    return ar
+    return RangeArray((x, y), myrange, value)
 
 
 class Entity_API:
@@ -147,14 +534,25 @@ class Entity_API:
     For variables and parameter names, please use "name_of_the_variable#name_of_the_unit" or "name_of_the_parameter#name_of_the_unit" in case there is a unit.
     """
 
+    # Whether `update_variables` only uses operations vectorized over plots, so that it
+    # can update all copies of the entity in a `~farmgym.v2.batch.FarmBatch` at once.
+    batched_update = False
+    # For an entity of a batch, (index, entity) pairs of the copies it stands for.
+    batch = None
+
     def __init__(self, field, parameters):
         self.name = "Entity"
         self.field = field
 
         if isinstance(parameters, str):
-            self.parameters = load_yaml(
-                (self.__class__.__name__).lower() + "_specifications.yaml", parameters
+            # Subclasses without their own specification file use the one of their
+            # closest parent class.
+            roles = entity_roles(self.__class__)
+            spec_files = [role.lower() + "_specifications.yaml" for role in roles]
+            spec_file = next(
+                (f for f in spec_files if specification_exists(f)), spec_files[0]
             )
+            self.parameters = load_yaml(spec_file, parameters)
         else:
             self.parameters = parameters
             for k in self.get_parameter_keys():
@@ -179,7 +577,9 @@ class Entity_API:
         def set_var(var, value):
             if isinstance(var, dict):
                 for k in var:
-                    if (type(var[k]) in [dict, np.ndarray]) and k in value.keys():
+                    if (
+                        isinstance(var[k], dict) or is_array_variable(var[k])
+                    ) and k in value.keys():
                         set_var(var[k], value[k])
                     else:
                         if k in value.keys():
@@ -190,6 +590,18 @@ class Entity_API:
                                 var[k].set_value(self.np_random.choice(list(value[k])))
                             else:
                                 var[k].set_value(value[k])
+            elif isinstance(var, RangeArray):
+                if type(value) == tuple:
+                    m, M = value
+                    var.set_values(m + self.np_random.random(var.shape) * (M - m))
+                elif isinstance(value, list):
+                    var.set_values(
+                        self.np_random.choice(list(value), size=var.shape).astype(
+                            object
+                        )
+                    )
+                else:
+                    var.fill(value)
             elif type(var) == np.ndarray:
                 if type(value) == tuple:
                     m, M = value
@@ -223,6 +635,18 @@ class Entity_API:
 
         pass
 
+    def batch_members(self):
+        """
+        Returns the (index, entity) pairs of the entities whose variables are held by
+        this entity: ``[(..., self)]`` for an entity of a single farm, one pair per farm
+        for an entity of a batch, where `index` selects the values of that farm in the
+        stacked variables. Updates that cannot be vectorized over farms (such as random
+        draws, or reductions over the field) loop over these pairs.
+        """
+        if self.batch is None:
+            return [(Ellipsis, self)]
+        return self.batch
+
     def assert_action_(self, action_key, action_value):
         assert action_key in self.actions
         if type(self.actions[action_key]) is tuple:
@@ -284,14 +708,14 @@ class Entity_API:
     def observe_variable(self, variable_key, path):
         # print("OBSERVE_VARIABLE:",variable_key,path)
         def make_obs(x):
-            if type(x) == Range:
+            if isinstance(x, Range):
                 return x.value  # x.gym_value()
             elif isinstance(x, dict):
                 ob = {}
                 for k in x.keys():
                     ob[k] = make_obs(x[k])
                 return ob
-            elif type(x) == np.ndarray:
+            elif is_array_variable(x):
                 ob = []
                 for xx in x:
                     ob.append(make_obs(xx))
@@ -308,7 +732,7 @@ class Entity_API:
         # print("OBSERVE_VARIABLE:",variable_key,path)
         def make_obs(x):
             # print("OBSERVE_VARIABLE:", x)
-            if type(x) == Range:
+            if isinstance(x, Range):
                 # TODO : change to [...] ?
                 return x.gym_value()
             elif isinstance(x, dict):
@@ -316,7 +740,7 @@ class Entity_API:
                 for k in x.keys():
                     ob[k] = make_obs(x[k])
                 return ob
-            elif type(x) == np.ndarray:
+            elif is_array_variable(x):
                 # print("OBS VARIABLE", x, " is array")
                 ob = []
                 for xx in x:
@@ -334,6 +758,37 @@ class Entity_API:
     def act_on_variables(self, action_name, action_params) -> None:
         return None
 
+    def valid_plots(self, action_name):
+        """
+        Returns a boolean array over the plots of the field telling where the
+        intervention `action_name` currently has an effect, or None if it is valid
+        everywhere. Used by :meth:`~farmgym.v2.farm.Farm.action_mask`.
+        """
+        return None
+
+    def get_state(self):
+        """
+        Returns a snapshot of the values of all variables, to be given back to
+        `set_state`. Entities holding other mutable state during simulation should
+        extend it.
+        """
+        return {
+            "variables": [
+                leaf.values.copy() if isinstance(leaf, RangeArray) else leaf.value
+                for leaf in variable_leaves(self.variables)
+            ]
+        }
+
+    def set_state(self, state):
+        """
+        Restores all variables to the values of a snapshot taken by `get_state`.
+        """
+        for leaf, value in zip(variable_leaves(self.variables), state["variables"]):
+            if isinstance(leaf, RangeArray):
+                np.copyto(leaf.values, value)
+            else:
+                leaf.value = value
+
     def load_images(self):
         import os
         from pathlib import Path
@@ -373,6 +828,12 @@ class Entity_API:
                 for k in x:
                     s += indent + ("  " + k + ": ")
                     s += make(x[k], indent=indent + "  ")
+            elif isinstance(x, RangeArray):
+                s += "["
+                for index in np.ndindex(x.shape):
+                    s += str(x[index]) + ","
+                s = s[:-1]
+                s += "]\n"
             elif type(x) == np.ndarray:
                 it = np.nditer(x, flags=["multi_index", "refs_ok"])
                 s += "["
@@ -380,7 +841,7 @@ class Entity_API:
                     s += str(x[it.multi_index]) + ","
                 s = s[:-1]
                 s += "]\n"
-            elif type(x) in [Range]:
+            elif isinstance(x, Range):
                 s += str(x) + "\n"
             else:
                 s += "???\n"
@@ -1,6 +1,9 @@
 ######################################
 # ruff: noqa: F841, F821
+import bisect
+import collections.abc
 import inspect
+import operator
 import os
 from pathlib import Path
 from textwrap import indent
@@ -11,6 +14,7 @@ from gymnasium.spaces import Box, Dict, Discrete, Tuple
 from gymnasium.spaces.utils import flatdim, flatten, flatten_space
 from gymnasium.utils import seeding
 
+from farmgym.v2.entity_api import RangeArray, is_array_variable, variable_gym_space
 from farmgym.v2.gymUnion import MultiUnion, Sequence, Union
 from farmgym.v2.rendering.monitoring import MonitorPlt, MonitorTensorBoard
 
@@ -26,6 +30,215 @@ def yml_tuple_constructor(v, f=float):
     return tup
 
 
+def canonical_action(x):
+    """
+    Converts (part of) a farmgym action into a hashable canonical form: dicts become
+    sorted tuples of items, lists become tuples.
+    """
+    if isinstance(x, dict):
+        return tuple(sorted((k, canonical_action(v)) for k, v in x.items()))
+    if isinstance(x, (list, tuple)):
+        return tuple(canonical_action(v) for v in x)
+    return x
+
+
+class ObservationActions(collections.abc.Sequence):
+    """
+    Lazy, read-only sequence of the farmgym observation-actions allowed by a
+    configuration file. Observation-actions are described per variable and path prefix
+    by the list of keys allowed at the end of the path (for instance the plots), so that
+    the i-th observation-action is only built when accessed. Supports ``len``, indexing,
+    slicing, iteration and :meth:`decode` to build the observation-actions of an array
+    of indices.
+    """
+
+    def __init__(self, groups):
+        # groups: list of (farmer, field, entity, variable, prefix, keys), keys being
+        # None for the single path prefix.
+        self.groups = groups
+        self.ends = []
+        n = 0
+        for group in groups:
+            n += 1 if group[5] is None else len(group[5])
+            self.ends.append(n)
+        self.prefixes = {}
+        for g, (fa, fi, e, var, prefix, keys) in enumerate(groups):
+            self.prefixes.setdefault((fa, fi, e, var, canonical_action(prefix)), g)
+        self.positions = {}
+
+    def __len__(self):
+        return self.ends[-1] if self.ends else 0
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.decode(range(len(self))[i])
+        i = operator.index(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("observation-action index out of range")
+        return self.build(bisect.bisect_right(self.ends, i), i)
+
+    def __iter__(self):
+        for g in range(len(self.groups)):
+            start = self.ends[g - 1] if g > 0 else 0
+            for i in range(start, self.ends[g]):
+                yield self.build(g, i)
+
+    def __repr__(self):
+        return "ObservationActions(" + str(len(self)) + ")"
+
+    def decode(self, indices):
+        """
+        Outputs the list of observation-actions of the (non-negative) indices `indices`.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        gs = np.searchsorted(self.ends, indices, side="right")
+        return [self.build(g, i) for g, i in zip(gs.tolist(), indices.tolist())]
+
+    def build(self, g, i):
+        fa, fi, e, var, prefix, keys = self.groups[g]
+        if keys is None:
+            return (fa, fi, e, var, list(prefix))
+        key = keys[i - self.ends[g] + len(keys)]
+        if key == "*":
+            return (fa, fi, e, var, list(prefix))
+        if isinstance(key, str) and "(" in key:  # Plots.
+            key = yml_tuple_constructor(key, int)
+        return (fa, fi, e, var, list(prefix) + [key])
+
+    def position(self, action):
+        """
+        Outputs the index of the observation-action `action`, or None if it is not in
+        the sequence.
+        """
+        fa, fi, e, var, path = action
+        if not isinstance(path, (list, tuple)):
+            return None
+        path = canonical_action(path)
+        g = self.prefixes.get((fa, fi, e, var, path))
+        if g is not None:
+            keys = self.groups[g][5]
+            if keys is None:
+                return self.ends[g] - 1
+            j = self.key_positions(g).get("*")
+            if j is not None:
+                return self.ends[g] - len(keys) + j
+        if len(path) > 0:
+            g = self.prefixes.get((fa, fi, e, var, path[:-1]))
+            if g is not None and self.groups[g][5] is not None:
+                j = self.key_positions(g).get(path[-1])
+                if j is not None:
+                    return self.ends[g] - len(self.groups[g][5]) + j
+        return None
+
+    def index(self, action, *args):
+        i = self.position(action)
+        if i is None:
+            raise ValueError(str(action) + " is not an allowed observation-action")
+        return i
+
+    def key_positions(self, g):
+        # Built on first use, as it requires to parse all keys of the group.
+        if g not in self.positions:
+            positions = {}
+            for j, key in enumerate(self.groups[g][5]):
+                if isinstance(key, str) and "(" in key:  # Plots.
+                    key = yml_tuple_constructor(key, int)
+                positions.setdefault(canonical_action(key), j)
+            self.positions[g] = positions
+        return self.positions[g]
+
+
+def observation_gym_space(observation, space):
+    """
+    Wraps `space`, the gym space of the variable observed by the farmgym observation
+    `observation`, in the nested `Dict` of the observation space.
+    """
+    fa_key, fi_key, e_key, variable_key, path = observation[:5]
+    if path != []:
+        space = Dict({str(path): space})
+    return Dict({fa_key: Dict({fi_key: Dict({e_key: Dict({variable_key: space})})})})
+
+
+class ObservationSpaces(collections.abc.Sequence):
+    """
+    Lazy, read-only sequence of the gym spaces of the free observations followed by
+    those of the observation-actions (an :class:`ObservationActions`). The space of an
+    observation-action is only built when accessed. The spaces of the variables observed
+    by the observation-actions of one group (for instance all plots of a variable) are
+    the same, hence built once per group and shared.
+    """
+
+    def __init__(self, fields, free_observations, observation_actions):
+        self.fields = fields
+        self.actions = observation_actions
+        self.free_spaces = [
+            observation_gym_space(o, variable_gym_space(self.variable(o)))
+            for o in free_observations
+        ]
+        self.spaces = {}
+        self.variable_spaces = {}
+        self.seed_value = None
+
+    def variable(self, observation):
+        fa_key, fi_key, e_key, variable_key, path = observation
+        x = self.fields[fi_key].entities[e_key].variables[variable_key]
+        for p in path:
+            x = x[p]
+        return x
+
+    def seed(self, seed=None):
+        """
+        Seeds all spaces, including those built later on.
+        """
+        self.seed_value = seed
+        for space in self.free_spaces:
+            space.seed(seed)
+        for space in self.spaces.values():
+            space.seed(seed)
+
+    def __len__(self):
+        return len(self.free_spaces) + len(self.actions)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(len(self))[i]]
+        i = operator.index(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("observation space index out of range")
+        if i < len(self.free_spaces):
+            return self.free_spaces[i]
+        i -= len(self.free_spaces)
+        if i not in self.spaces:
+            g = bisect.bisect_right(self.actions.ends, i)
+            observation = self.actions.build(g, i)
+            fa, fi, e, var, prefix, keys = self.actions.groups[g]
+            # Keys of a group are positions in the same array variable, but may be keys
+            # of differing variables of a dict.
+            if is_array_variable(self.variable((fa, fi, e, var, list(prefix)))):
+                key = (g, len(observation[4]))
+            else:
+                key = (g, canonical_action(observation[4]))
+            if key not in self.variable_spaces:
+                self.variable_spaces[key] = variable_gym_space(
+                    self.variable(observation)
+                )
+            space = observation_gym_space(observation, self.variable_spaces[key])
+            if self.seed_value is not None:
+                space.seed(self.seed_value)
+            self.spaces[i] = space
+        return self.spaces[i]
+
+    def __eq__(self, other):
+        return isinstance(other, collections.abc.Sequence) and list(self) == list(other)
+
+    def __repr__(self):
+        return "ObservationSpaces(" + str(len(self)) + ")"
+
+
 from farmgym.v2.specifications.specification_manager import (  # noqa: E402
     build_actionsyaml,
     build_inityaml,
@@ -221,6 +434,11 @@ class Farm(gym.Env):
         self.farmgym_intervention_actions = self.build_farmgym_intervention_actions(
             self.rules.actions_allowed["interventions"]
         )
+        (
+            self.discretized_action_ends,
+            self.discretized_action_decoders,
+            self.discretized_action_encoders,
+        ) = self.build_discretized_action_table()
         self.farmgym_state_space = self.build_gym_state_space()
 
         # GYM SPACES:
@@ -374,6 +592,41 @@ class Farm(gym.Env):
         self.np_random, seed = seeding.np_random(seed)
         return [seed]
 
+    def get_state(self):
+        """
+        Returns a snapshot of the simulation state of the farm, to be given back to
+        `set_state`: values of all variables, state of the random generator, time of the
+        day, farmers and rules states, and last action. Unlike a deepcopy of the farm,
+        it does not copy parameters, spaces, images or monitors, which do not change
+        during simulation.
+        """
+        return {
+            "fields": {
+                fi: {e: entity.get_state() for e, entity in field.entities.items()}
+                for fi, field in self.fields.items()
+            },
+            "np_random": self.np_random.bit_generator.state,
+            "is_new_day": self.is_new_day,
+            "last_farmgym_action": self.last_farmgym_action,
+            "farmers": {fa: farmer.get_state() for fa, farmer in self.farmers.items()},
+            "rules": self.rules.get_state(),
+        }
+
+    def set_state(self, state):
+        """
+        Restores the farm to a snapshot taken by `get_state` (on this farm, or on a farm
+        built the same way).
+        """
+        for fi, entities in state["fields"].items():
+            for e, entity_state in entities.items():
+                self.fields[fi].entities[e].set_state(entity_state)
+        self.np_random.bit_generator.state = state["np_random"]
+        self.is_new_day = state["is_new_day"]
+        self.last_farmgym_action = state["last_farmgym_action"]
+        for fa, farmer_state in state["farmers"].items():
+            self.farmers[fa].set_state(farmer_state)
+        self.rules.set_state(state["rules"])
+
     def get_free_observations(self):
         """
         Outputs free observations available at the current time.
@@ -455,24 +708,22 @@ class Farm(gym.Env):
         Performs a step evolution of the system, from current stage to next state given the input action.
         A farm gym step alternates between observation step and action step before moving to next day.
         """
-        # print("AS",action_schedule)
-        filtered_action_schedule = self.rules.filter_actions(
-            self, action_schedule, self.is_new_day
-        )
-        self.rules.assert_actions(filtered_action_schedule)
         if self.is_new_day:
+            # print("AS",action_schedule)
+            filtered_action_schedule = self.rules.filter_actions(
+                self, action_schedule, self.is_new_day
+            )
+            self.rules.assert_actions(filtered_action_schedule)
             self.last_farmgym_action = (filtered_action_schedule, None)
             output = self.observation_step(filtered_action_schedule)
             self.is_new_day = False
             return output
         else:
-            self.last_farmgym_action = (
-                self.last_farmgym_action[0],
-                filtered_action_schedule,
-            )
-            output = self.intervention_step(filtered_action_schedule)
-            self.is_new_day = True
-            return output
+            observations, cost = self.start_intervention_step(action_schedule)
+            # Update dynamics
+            for f in self.fields.values():
+                f.update_to_next_day()
+            return self.end_intervention_step(observations, cost)
 
     def _get_day(self):
         return (int)(
@@ -525,15 +776,26 @@ class Farm(gym.Env):
         }
         # return (observation, reward, terminated, truncated, info) or  (observation, reward, done, info)
 
-    def intervention_step(self, action_schedule):
+    def start_intervention_step(self, action_schedule):
         """
-        Performs an intervention step, one of the two types of farmgym steps.
+        Performs the interventions of an intervention step, one of the two types of
+        farmgym steps, before fields move to the next day. Returns the observations
+        output by the interventions and their cost, to be given to
+        `end_intervention_step` once fields are updated.
         """
+        filtered_action_schedule = self.rules.filter_actions(
+            self, action_schedule, self.is_new_day
+        )
+        self.rules.assert_actions(filtered_action_schedule)
+        self.last_farmgym_action = (
+            self.last_farmgym_action[0],
+            filtered_action_schedule,
+        )
         observations = []
 
         # Perform action
         intervention_schedule_cost = 0
-        for intervention_item in action_schedule:
+        for intervention_item in filtered_action_schedule:
             fa_key, fi_key, entity_key, action_name, params = intervention_item
             # We can change this to policies using:
             # fa_key,fi_key,pos,action = policy_item.action(observations)
@@ -547,10 +809,13 @@ class Farm(gym.Env):
             # print("OBSVEC", obs_vec)
             [observations.append(o) for o in obs_vec]
             intervention_schedule_cost += cost
+        return observations, intervention_schedule_cost
 
-        # Update dynamics
-        for f in self.fields.values():
-            f.update_to_next_day()
+    def end_intervention_step(self, observations, intervention_schedule_cost):
+        """
+        Ends an intervention step once fields have moved to the next day: updates
+        farmers, computes the reward and checks termination.
+        """
         for fa in self.farmers:
             self.farmers[fa].update_to_next_day()
 
@@ -573,6 +838,7 @@ class Farm(gym.Env):
             if self.monitor is not None:
                 self.monitor.stop()
 
+        self.is_new_day = True
         return (
             observations,
             reward,
@@ -581,6 +847,74 @@ class Farm(gym.Env):
             {"intervention cost": intervention_schedule_cost},
         )
 
+    def action_mask(self):
+        """
+        Outputs a boolean array over the discretized gym action space, telling which
+        actions can be performed at the current step. It accounts for the step type
+        (observation or intervention), the rules, the farmers (e.g. their remaining
+        daily interventions) and the entities (e.g. sowing only on plots with no plant,
+        see :meth:`~farmgym.v2.entity_api.Entity_API.valid_plots`).
+        The mask can be given to ``farm.action_space.sample(mask=...)``, together with
+        :meth:`remaining_actions` so that sampled schedules do not exceed what the
+        farmers can still perform:
+        ``mask=(farm.remaining_actions(), farm.action_mask())``.
+        """
+        observations = self.farmgym_observation_actions
+        ll = len(observations)
+        mask = np.zeros(ll + self.count_farmgym_intervention_actions(), dtype=bool)
+        # In POMDP mode, gym actions are always performed at intervention time.
+        is_observation_time = self.is_new_day and self.interaction_mode != "POMDP"
+        if is_observation_time:
+            for g, (fa, fi, e, var, prefix, keys) in enumerate(observations.groups):
+                start = observations.ends[g - 1] if g > 0 else 0
+                mask[start : observations.ends[g]] = self.farmers[
+                    fa
+                ].can_perform_observation(fi)
+            return mask
+
+        for k, (fa, fi, e, a, keys, digits) in enumerate(
+            self.discretized_action_decoders
+        ):
+            start = self.discretized_action_ends[k - 1] if k > 0 else 0
+            end = self.discretized_action_ends[k]
+            if start == end:
+                continue
+            if not self.farmers[fa].can_perform_intervention(fi):
+                continue
+            if not self.rules.is_allowed_action(
+                self.decode_discretized_action(k, start), False
+            ):
+                continue
+            plots = self.fields[fi].entities[e].valid_plots(a)
+            if plots is None:
+                mask[ll + start : ll + end] = True
+                continue
+            plot_digits = [digit for digit in digits if digit[0] == "plot"]
+            if plot_digits == []:
+                mask[ll + start : ll + end] = plots.any()
+                continue
+            key, stride, n, values = plot_digits[0]
+            valid = np.array([plots[plot] for plot in values], dtype=bool)
+            mask[ll + start : ll + end] = valid[(np.arange(end - start) // stride) % n]
+        return mask
+
+    def remaining_actions(self):
+        """
+        Outputs the number of actions the farmers can still perform at the current step:
+        observations or interventions, depending on the step type as in
+        :meth:`action_mask`.
+        """
+        is_observation_time = self.is_new_day and self.interaction_mode != "POMDP"
+        remaining = 0
+        for farmer in self.farmers.values():
+            if is_observation_time:
+                counts = [farmer.remaining_observations(fi) for fi in farmer.fields]
+            else:
+                counts = [farmer.remaining_interventions(fi) for fi in farmer.fields]
+            # Daily counters of a farmer are shared by all its fields.
+            remaining += max(counts, default=0)
+        return remaining
+
     def gymaction_to_farmgymaction(self, actions):
         # TODO: Check it on all cases. Is it still working?
         """
@@ -631,106 +965,115 @@ class Farm(gym.Env):
         Output:
             fg_actions = [('BasicFarmer-0', 'Field-0', 'Plant-0', 'stage', [(0, 0)]), ...]
         """
-
-        def convert(value, ranges):
-            if ranges is None:
-                return {}
-            if isinstance(ranges, list):
-                if isinstance(ranges[value], str) and "(" in ranges[value]:  # Plots.
-                    return yml_tuple_constructor(ranges[value], int)
-                return ranges[value]
-            elif (
-                isinstance(ranges, str) and "(" in ranges
-            ):  # Range of continuous values
-                # r = ranges.split(",")
-                # m=float(r[0][1:])
-                # M=float(r[1][:-1])
-                # print("?",value, ranges,m,M)
-                return (float)(value)
-            elif isinstance(ranges, dict):
-                c_v = {}
-                for k in ranges:
-                    c_v[k] = convert(value[k], ranges[k])
-                return c_v
-
+        ll = len(self.farmgym_observation_actions)
         fg_actions = []
         for action in actions:
-            if action < len(self.farmgym_observation_actions):
+            if action < ll:
                 fg_actions.append(self.farmgym_observation_actions[action])
             else:
-                theindex = action - len(self.farmgym_observation_actions)
-                theaction = None
-                # print("A", action)
-                # print("gymtodiscre", theindex, self.farmgym_intervention_actions,actions)
-                for fa, fi, e, a, f_a, g, ng in self.farmgym_intervention_actions:
-                    if ng > theindex:
-                        theaction = (fa, fi, e, a, f_a, g, ng)
-                        break
-                    else:
-                        theindex -= ng
-                # print("gymtodiscre", theindex, theaction)
-                fa, fi, e, a, f_a, g, ng = theaction
-
-                # print("B1",g,type(g), theindex, ng)
-
-                if type(g) == Discrete:
-                    act = theindex
-                elif type(g) == Box:
-                    m = g.low
-                    M = g.high
-                    factor = ng // self.discretization_nbins
-                    # factor = nbins
-                    j = i // factor
-                    i = i - j * factor
-                    act = m + j / (self.discretization_nbins + 1) * (M - m)
-
-                elif type(g) == Dict:
-                    i = theindex
-                    factor = ng
-                    act = {}
-                    for key in g:
-                        if type(g[key]) == Discrete:
-                            factor = factor // g[key].n
-                            # factor = g[key].n
-                            j = i // factor
-                            i = i - j * factor
-                            act[key] = j
-                            # print(g[key], i,j, act[key],factor)
-                        elif type(g[key]) == Box:
-                            # print("B2", g[key], g[key].shape, i, ng)
-                            # print(g[key].low, g[key].high)
-                            m = g[key].low
-                            M = g[key].high
-                            factor = factor // self.discretization_nbins
-                            # factor = nbins
-                            j = i // factor
-                            i = i - j * factor
-                            act[key] = m + j / (self.discretization_nbins + 1) * (M - m)
-                            # print(g[key], i,j, act[key],factor)
-                    # print("C",act,i,f_a)
-                farmgym_act = convert(act, f_a)
-                fg_actions.append((fa, fi, e, a, farmgym_act))
+                theindex = action - ll
+                k = bisect.bisect_right(self.discretized_action_ends, theindex)
+                fg_actions.append(self.decode_discretized_action(k, theindex))
         return fg_actions
 
+    def gymactions_to_discretized_farmgymactions(self, batch):
+        """
+        Batch version of :meth:`gymaction_to_discretized_farmgymaction`, e.g. for the
+        actions of a vector environment.
+        Input:
+            batch = [[4, 8 ...], [], [3] ...]
+        Output:
+            fg_batch = [
+                [('BasicFarmer-0', 'Field-0', 'Plant-0', 'stage', [(0, 0)]), ...],
+                [],
+                ...
+            ]
+        """
+        sizes = [len(actions) for actions in batch]
+        indices = np.fromiter(
+            (action for actions in batch for action in actions),
+            dtype=np.int64,
+            count=sum(sizes),
+        )
+        ll = len(self.farmgym_observation_actions)
+        ks = np.searchsorted(self.discretized_action_ends, indices - ll, side="right")
+        fg_actions = [
+            self.farmgym_observation_actions[action]
+            if action < ll
+            else self.decode_discretized_action(k, action - ll)
+            for action, k in zip(indices.tolist(), ks.tolist())
+        ]
+        fg_batch = []
+        start = 0
+        for size in sizes:
+            fg_batch.append(fg_actions[start : start + size])
+            start += size
+        return fg_batch
+
+    def decode_discretized_action(self, k, theindex):
+        """
+        Decodes the index `theindex` of the discretized gym action space into the k-th
+        farmgym intervention-action, using the table built by
+        :meth:`build_discretized_action_table`.
+        """
+        fa, fi, e, a, keys, digits = self.discretized_action_decoders[k]
+        if k > 0:
+            theindex -= self.discretized_action_ends[k - 1]
+        if keys is None:
+            farmgym_act = digits[0][3][theindex]
+        else:
+            act = {}
+            for key, stride, n, values in digits:
+                act[key] = values[(theindex // stride) % n]
+            farmgym_act = {key: act[key] for key in keys}
+        return (fa, fi, e, a, farmgym_act)
+
     def discretized_farmgymaction_to_gymaction(self, actions):
         """
         Input:
             actions = [('BasicFarmer-0', 'Field-0', 'Plant-0', 'stage', [(0, 0)]), ...]
         Output:
             ii = [4,5, etc]
+        Actions that are not in the discretized action space are skipped.
         """
         ii = []
-        nb_tot_actions = self.action_space.space.n + len(
-            self.farmgym_observation_actions
-        )
         for action in actions:
-            for i in range(nb_tot_actions):
-                a = self.farm.gymaction_to_discretized_farmgymaction([i])
-                fa, fi, e, a, p = a[0]
-                if action == a[0]:
-                    ii.append(i)
+            i = self.encode_discretized_action(action)
+            if i is not None:
+                ii.append(i)
         return ii
 
+    def encode_discretized_action(self, action):
+        """
+        Outputs the index in the discretized gym action space of the farmgym action
+        `action`, or None if it is not in that space, using the table built by
+        :meth:`build_discretized_action_table`.
+        """
+        fa, fi, e, a, params = action
+        i = self.farmgym_observation_actions.position(action)
+        if i is not None:
+            return i
+        encoder = self.discretized_action_encoders.get((fa, fi, e, a))
+        if encoder is None:
+            return None
+        k, keys, codes = encoder
+        i = len(self.farmgym_observation_actions)
+        if k > 0:
+            i += self.discretized_action_ends[k - 1]
+        if keys is None:
+            j = codes[0][2].get(canonical_action(params))
+            if j is None:
+                return None
+            return i + j
+        if not isinstance(params, dict) or set(params) != set(keys):
+            return None
+        for key, stride, code in codes:
+            j = code.get(canonical_action(params[key]))
+            if j is None:
+                return None
+            i += stride * j
+        return i
+
     def random_allowed_intervention(self):
         """
         Outputs a randomly generated intervention, as allowed by the yaml file, in farmgym format.
@@ -855,56 +1198,91 @@ class Farm(gym.Env):
             n += i[6]
         return n
 
+    def build_discretized_action_table(self):
+        """
+        Generates the table used to decode indices of the discretized gym action space
+        into farmgym intervention-actions. Outputs the cumulative numbers of discretized
+        actions, and for each farmgym intervention-action, its mixed-radix digits (key,
+        stride, radix, farmgym values), computed once so that decoding an index is a
+        bisection followed by integer arithmetic.
+        Also outputs the reverse index used to encode farmgym intervention-actions: for
+        each of them, the digit of each of its canonical farmgym values.
+        """
+
+        def values(gym_space, ranges):
+            if type(gym_space) == Discrete:
+                if ranges is None:
+                    return ({},)
+                return tuple(
+                    yml_tuple_constructor(r, int)
+                    if isinstance(r, str) and "(" in r  # Plots.
+                    else r
+                    for r in ranges
+                )
+            elif type(gym_space) == Box:
+                m = gym_space.low
+                M = gym_space.high
+                return tuple(
+                    float(m + j / (self.discretization_nbins + 1) * (M - m))
+                    for j in range(self.discretization_nbins)
+                )
+            return ()
+
+        def codes(values):
+            code = {}
+            for j, v in enumerate(values):
+                code.setdefault(canonical_action(v), j)
+            return code
+
+        ends = []
+        decoders = []
+        interventions = {}
+        n = 0
+        for fa, fi, e, a, f_a, g, ng in self.farmgym_intervention_actions:
+            n += ng
+            ends.append(n)
+            if type(g) == Dict:
+                digits = []
+                stride = ng
+                for key in g:
+                    v = values(g[key], f_a[key])
+                    if len(v) > 0:
+                        stride //= len(v)
+                        digits.append((key, stride, len(v), v))
+                decoders.append((fa, fi, e, a, tuple(f_a), tuple(digits)))
+            else:
+                v = values(g, f_a)
+                decoders.append((fa, fi, e, a, None, ((None, 1, len(v), v),)))
+            interventions[(fa, fi, e, a)] = (
+                len(decoders) - 1,
+                decoders[-1][4],
+                tuple(
+                    (key, stride, codes(v)) for key, stride, _, v in decoders[-1][5]
+                ),
+            )
+        return ends, decoders, interventions
+
     def build_farmgym_observation_actions(self, action_yaml):
         """
-        Generates a list of all possible farmgym observation-actions allowed by the configuration file action_yaml.
+        Generates the lazy sequence (:class:`ObservationActions`) of all possible
+        farmgym observation-actions allowed by the configuration file action_yaml.
         """
 
-        def make(dictio, variables):
-            if isinstance(dictio, list):
-                actions = {}
+        def describe(var, dictio, prefix, groups):
+            if isinstance(dictio, dict):
                 for key in dictio:
                     if key == "*":
-                        actions["*"] = ["'"]
-                    elif isinstance(key, str) and "(" in key:
-                        id = yml_tuple_constructor(key, int)
-                        actions[id] = [id]
-                    #    print("KEY2-")
-                    #    actions[key]=['\'']
+                        groups.append(var + (prefix, None))
                     else:
-                        actions[key] = [key]
-                return actions
-            elif dictio is None:
-                return ["'"]
-            elif isinstance(dictio, dict):
-                actions = {}
-                for key in dictio:
-                    if key == "*":
-                        actions["*"] = ["'"]
-                    # elif (key=='\'*\''):
-                    #    print("KEY2")
-                    #    actions[key]=['\'']
-                    else:
-                        # print("DICTIO", dictio, "key", key, "VAR", variables)
-                        p = make(dictio[key], variables[key])
-                        actions[key] = p
-                return actions
-
-        def unpile(var, paths, prefix):
-            actions = []
-            if isinstance(paths, dict):
-                for key in paths:
-                    if key == "*":
-                        acts = unpile(var, paths[key], prefix)
-                        [actions.append(o) for o in acts]
-                    else:
-                        acts = unpile(var, paths[key], prefix + [key])
-                        [actions.append(o) for o in acts]
+                        describe(var, dictio[key], prefix + (key,), groups)
+            elif isinstance(dictio, list):
+                if len(set(dictio)) < len(dictio):
+                    dictio = list(dict.fromkeys(dictio))
+                groups.append(var + (prefix, dictio))
             else:
-                actions.append((var[0], var[1], var[2], var[3], prefix))
-            return actions
+                groups.append(var + (prefix, None))
 
-        actions = []
+        groups = []
         for fa in self.farmers:
             if fa in action_yaml.keys():
                 for fi in self.fields:
@@ -914,16 +1292,15 @@ class Farm(gym.Env):
                                 if action_yaml[fa][fi][e] is not None:
                                     for var in self.fields[fi].entities[e].variables:
                                         if var in action_yaml[fa][fi][e].keys():
-                                            paths = make(
+                                            describe(
+                                                (fa, fi, e, var),
                                                 action_yaml[fa][fi][e][var],
-                                                self.fields[fi]
-                                                .entities[e]
-                                                .variables[var],
+                                                (),
+                                                groups,
                                             )
-                                            acts = unpile((fa, fi, e, var), paths, [])
-                                            [actions.append(o) for o in acts]
+        actions = ObservationActions(groups)
 
-        free_actions = []
+        free_groups = []
         if "Free" in action_yaml.keys():
             for fi in self.fields:
                 if fi in action_yaml["Free"].keys():
@@ -932,17 +1309,18 @@ class Farm(gym.Env):
                             if action_yaml["Free"][fi][e] is not None:
                                 for var in self.fields[fi].entities[e].variables:
                                     if var in action_yaml["Free"][fi][e].keys():
-                                        paths = make(
+                                        describe(
+                                            ("Free", fi, e, var),
                                             action_yaml["Free"][fi][e][var],
-                                            self.fields[fi].entities[e].variables[var],
+                                            (),
+                                            free_groups,
                                         )
-                                        acts = unpile(("Free", fi, e, var), paths, [])
-                                        [free_actions.append(o) for o in acts]
+        free_actions = list(ObservationActions(free_groups))
         self.rules.free_observations = free_actions
 
         if self.interaction_mode == "AOMDP":
             return actions
-        return []
+        return ObservationActions([])
 
     def build_gym_state_space(self):
         """
@@ -963,16 +1341,15 @@ class Farm(gym.Env):
                 for k in x:
                     state[k] = make_s(x[k], indent=indent + "  ")
                 return Dict(state)
-            elif type(x) == np.ndarray:
-                it = np.nditer(x, flags=["multi_index", "refs_ok"])
+            elif isinstance(x, RangeArray):
+                # All plots share the same range, hence the same space.
+                return Tuple([to_gym(x.range)] * int(np.prod(x.shape)))
+            elif is_array_variable(x):
                 # s+= str(len(it))+","+str(x.shape) +","+str(len(x.shape))+","+str(len(x))
                 if len(x.shape) > 1:
                     state = []
-                    state.append(to_gym(x[it.multi_index].range))
-                    it.iternext()
-                    while not it.finished:
-                        state.append(to_gym(x[it.multi_index].range))
-                        is_not_finished = it.iternext()
+                    for index in np.ndindex(x.shape):
+                        state.append(to_gym(x[index].range))
                     return Tuple(state)
                 else:
                     state = []
@@ -1001,74 +1378,19 @@ class Farm(gym.Env):
     def build_gym_observation_space(self, seed):
         """
         Outputs an observation space in gym MultiUnion format from all possible observations.
+        The spaces of the observation-actions are built lazily, see
+        :class:`ObservationSpaces`.
         """
 
         # TODO: flatten https://github.com/openai/gym/issues/1830?
         # Number all discrete actions, then discretize continuous ones with param N (nb of elements for each dim). number mutiactions etc.
-
-        def make_space(x):
-            if isinstance(x, dict):
-                xspace = {}
-                for k in x.keys():
-                    xspace[k] = make_space(x[k])
-                # print("MS",x.keys(),"\n\t",xspace,"\n\t",Dict(xspace))
-                # TODO: THe following does not keep the keys from x.keys() in the correct order !! This is a gymnasium (and gym) issue !! It seems to sort them by alphabetic order !!
-                return Dict(xspace)
-            elif type(x) == np.ndarray:
-                xspace = []
-                for xx in x:
-                    xspace.append(make_space(xx))
-                return Tuple(xspace)
-            else:
-                return x.to_gym_space()
-
-        observation_space = []
-
-        for fo in self.rules.free_observations:
-            fa_key, fi_key, e_key, variable_key, path = fo
-            var = self.fields[fi_key].entities[e_key].variables[variable_key]
-            x = var
-            for p in path:
-                x = x[p]
-            # print("x",x)
-            # observation_space.append(make_space(x))
-
-            o_space = {}
-            o_space[fa_key] = {}
-            o_space[fa_key][fi_key] = {}
-            o_space[fa_key][fi_key][e_key] = {}
-            o_space[fa_key][fi_key][e_key][variable_key] = {}
-            if path != []:
-                # oo ={}
-                # for p in path:
-                #    oo[p]={}
-
-                o_space[fa_key][fi_key][e_key][variable_key][str(path)] = x
-            else:
-                o_space[fa_key][fi_key][e_key][variable_key] = x
-            # print("MAKE SPACE",make_space(o_space))
-            observation_space.append(make_space(o_space))
-
-        for oa in self.farmgym_observation_actions:
-            fa_key, fi_key, e_key, variable_key, path = oa
-            var = self.fields[fi_key].entities[e_key].variables[variable_key]
-            x = var
-            for p in path:
-                x = x[p]
-
-            # observation_space.append(make_space(x))
-
-            o_space = {}
-            o_space[fa_key] = {}
-            o_space[fa_key][fi_key] = {}
-            o_space[fa_key][fi_key][e_key] = {}
-            o_space[fa_key][fi_key][e_key][variable_key] = {}
-            if path != []:
-                o_space[fa_key][fi_key][e_key][variable_key][str(path)] = x
-            else:
-                o_space[fa_key][fi_key][e_key][variable_key] = x
-            observation_space.append(make_space(o_space))
-
+        # TODO: Dict does not keep the keys in the order of the variables !! This is a
+        # gymnasium (and gym) issue !! It seems to sort them by alphabetic order !!
+        observation_space = ObservationSpaces(
+            self.fields,
+            self.rules.free_observations,
+            self.farmgym_observation_actions,
+        )
         multi_union = MultiUnion(observation_space)
         multi_union.seed(seed)
         return multi_union
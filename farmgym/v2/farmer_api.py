@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class Farmer_API:
     """
     class for farmer definition
@@ -21,6 +24,44 @@ class Farmer_API:
     def update_to_next_day(self):
         ()
 
+    def can_perform_intervention(self, fi_key):
+        """
+        Returns whether the farmer can still perform an intervention on field `fi_key`
+        today.
+        """
+        return True
+
+    def can_perform_observation(self, fi_key):
+        """
+        Returns whether the farmer can still perform an observation on field `fi_key`
+        today.
+        """
+        return True
+
+    def remaining_interventions(self, fi_key):
+        """
+        Returns the number of interventions the farmer can still perform on field
+        `fi_key` today.
+        """
+        return np.infty if self.can_perform_intervention(fi_key) else 0
+
+    def remaining_observations(self, fi_key):
+        """
+        Returns the number of observations the farmer can still perform on field
+        `fi_key` today.
+        """
+        return np.infty if self.can_perform_observation(fi_key) else 0
+
+    def get_state(self):
+        """
+        Returns a snapshot of the mutable state of the farmer (e.g. counters of the
+        day), to be given back to `set_state`.
+        """
+        return {}
+
+    def set_state(self, state):
+        pass
+
     def __str__(self):
         s = self.name
         return s
@@ -29,11 +29,39 @@ class BasicFarmer(Farmer_API):
         self.nb_interventions_in_day = 0
         self.nb_observations_in_day = 0
 
+    def get_state(self):
+        return {
+            "nb_interventions_in_day": self.nb_interventions_in_day,
+            "nb_observations_in_day": self.nb_observations_in_day,
+        }
+
+    def set_state(self, state):
+        self.nb_interventions_in_day = state["nb_interventions_in_day"]
+        self.nb_observations_in_day = state["nb_observations_in_day"]
+
+    def can_perform_intervention(self, fi_key):
+        return (
+            self.nb_interventions_in_day < self.max_daily_interventions
+        ) and self.can_intervene[fi_key]
+
+    def can_perform_observation(self, fi_key):
+        return (
+            self.nb_observations_in_day < self.max_daily_observations
+        ) and self.can_observe[fi_key]
+
+    def remaining_interventions(self, fi_key):
+        if not self.can_intervene[fi_key]:
+            return 0
+        return max(self.max_daily_interventions - self.nb_interventions_in_day, 0)
+
+    def remaining_observations(self, fi_key):
+        if not self.can_observe[fi_key]:
+            return 0
+        return max(self.max_daily_observations - self.nb_observations_in_day, 0)
+
     def perform_intervention(self, fi_key, entity_key, action, params, day):
         observations = []
-        if (
-            self.nb_interventions_in_day < self.max_daily_interventions
-        ) and self.can_intervene[fi_key]:
+        if self.can_perform_intervention(fi_key):
             obs = (
                 self.fields[fi_key]
                 .entities[entity_key]
@@ -57,9 +85,7 @@ class BasicFarmer(Farmer_API):
 
     def perform_observation(self, fi_key, entity_key, variable_key, path, day):
         observations = []
-        if (
-            self.nb_observations_in_day < self.max_daily_observations
-        ) and self.can_observe[fi_key]:
+        if self.can_perform_observation(fi_key):
             obs = (
                 self.fields[fi_key]
                 .entities[entity_key]
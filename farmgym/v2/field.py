@@ -1,5 +1,9 @@
 from textwrap import indent
 
+import numpy as np
+
+from farmgym.v2.entity_api import entity_roles
+
 
 class Plot:
     def __init__(self, field, position, type="base"):
@@ -53,11 +57,19 @@ class Field:
         self.X = self.shape["length#nb"]
         self.Y = self.shape["width#nb"]
         self.plots = [str((x, y)) for x in range(self.X) for y in range(self.Y)]
+        self.distances_to_edge = np.array(
+            [
+                [self.distance_to_edge((x, y)) for y in range(self.Y)]
+                for x in range(self.X)
+            ]
+        )
 
         self.entity_managers = entities_specifications
         self.np_random = None
 
         self.entities = {}
+        # Key: class name in the MRO of an entity, e.g. "Plant", value: list of such entities.
+        self.entities_by_role = {}
         cpt = {}
         for e, param in self.entity_managers:
             # print('ENAME',e.__name__)
@@ -76,6 +88,15 @@ class Field:
                 self.entities[name].name = name
                 self.entities[name].fullname = name + "(" + param + ")"
                 self.entities[name].shortname = param
+            for role in entity_roles(e):
+                self.entities_by_role.setdefault(role, []).append(self.entities[name])
+
+    def get_entities(self, role):
+        """
+        Returns the list of entities of the field whose class is, or derives from, a
+        class named `role` (e.g. "Plant").
+        """
+        return self.entities_by_role.get(role, [])
 
     def reset(self):
         """
@@ -71,16 +71,22 @@ class MultiUnion(Space):
     """
 
     def __init__(self, spaces, maxnonzero=np.infty):
+        # spaces: a list of spaces, or a lazy sequence of spaces (having its own `seed`
+        # method), whose elements are not checked.
         self.spaces = spaces
         self.maxnonzero = maxnonzero
-        for space in spaces:
-            assert isinstance(
-                space, Space
-            ), "Elements of the tuple must be instances of gym.Space"
+        if isinstance(spaces, list):
+            for space in spaces:
+                assert isinstance(
+                    space, Space
+                ), "Elements of the tuple must be instances of gym.Space"
         super(MultiUnion, self).__init__(None, None)
 
     def seed(self, seed=None):
-        [space.seed(seed) for space in self.spaces]
+        if hasattr(self.spaces, "seed"):
+            self.spaces.seed(seed)
+        else:
+            [space.seed(seed) for space in self.spaces]
 
     def sample(self):  # Sampling without replacement (not twice in the same space).
         m = self.np_random.integers(min(self.maxnonzero + 1, len(self.spaces) + 1))
@@ -158,11 +164,26 @@ class Sequence(Space):
     def seed(self, seed=None):
         self.space.seed(seed)
 
-    def sample(self):  # Sampling with replacement
-        m = self.np_random.integers(self.maxnonzero + 1)
+    def sample(self, mask=None):  # Sampling with replacement
+        """
+        If given, `mask` is a boolean array over the elements of a Discrete space
+        (e.g. from :meth:`~farmgym.v2.farm.Farm.action_mask`), only elements where it is
+        True are sampled. As for gymnasium's Sequence, `mask` may also be a pair
+        (max_size, mask), then at most `max_size` elements are sampled
+        (e.g. from :meth:`~farmgym.v2.farm.Farm.remaining_actions`).
+        """
+        max_size = self.maxnonzero
+        if isinstance(mask, tuple):
+            size, mask = mask
+            max_size = min(max_size, size)
+        m = self.np_random.integers(max_size + 1)
+        if mask is not None:
+            if not np.any(mask):
+                return []
+            mask = np.asarray(mask, dtype=np.int8)
         samples = []
         for n in range(m):
-            samples.append(self.space.sample())
+            samples.append(self.space.sample(mask=mask))
         return samples
 
     def contains(self, x):
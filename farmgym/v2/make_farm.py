@@ -81,3 +81,13 @@ def make_farm(yamlfile):
         interaction_mode=interaction_mode,
     )
     return farm
+
+
+def farm_factory(make_env):
+    """
+    Returns `make_env` if it is a callable, or a callable building the farm of the yaml
+    file `make_env` with `make_farm`.
+    """
+    if isinstance(make_env, str):
+        return lambda: make_farm(make_env)
+    return make_env
@@ -0,0 +1,137 @@
+import copy
+
+import numpy as np
+from gymnasium import Space
+
+from farmgym.v2.batch import FarmBatch
+
+
+def rollout(farm, schedule, horizon):
+    """
+    Runs `horizon` days of `farm` from its current state: the farmgym intervention
+    `schedule` is performed on the first day, nothing on the next ones. Returns the sum
+    of rewards, stopping early if the farm reaches a terminal state.
+    """
+    total = 0.0
+    for day in range(horizon):
+        if farm.is_new_day:
+            farm.farmgym_step([])
+        _, reward, terminated, truncated, _ = farm.farmgym_step(
+            schedule if day == 0 else []
+        )
+        total += reward
+        if terminated or truncated:
+            break
+    return total
+
+
+def batch_rollout(batch, schedules, horizon):
+    """
+    Runs `horizon` days of all farms of the :class:`~farmgym.v2.batch.FarmBatch` `batch`
+    from their current state, like `rollout`: the farmgym intervention schedule of each
+    farm in `schedules` is performed on the first day, nothing on the next ones. Returns
+    the array of sums of rewards of the farms, each farm stopping when it reaches a
+    terminal state.
+    """
+    totals = np.zeros(len(batch.farms))
+    active = np.ones(len(batch.farms), dtype=bool)
+    for day in range(horizon):
+        if not active.any():
+            break
+        if batch.farms[np.flatnonzero(active)[0]].is_new_day:
+            batch.farmgym_step([[] for _ in batch.farms], active)
+        outputs = batch.farmgym_step(
+            [schedule if day == 0 else [] for schedule in schedules], active
+        )
+        for i in np.flatnonzero(active):
+            _, reward, terminated, truncated, _ = outputs[i]
+            totals[i] += reward
+            if terminated or truncated:
+                active[i] = False
+    return totals
+
+
+def branch_copies(farm, n):
+    """
+    Returns `n` copies of `farm` without its monitor, sharing its spaces, which do not
+    change during simulation, instead of copying them.
+    """
+    monitor, farm.monitor = farm.monitor, None
+    try:
+        shared = {id(v): v for v in vars(farm).values() if isinstance(v, Space)}
+        return [copy.deepcopy(farm, dict(shared)) for _ in range(n)]
+    finally:
+        farm.monitor = monitor
+
+
+def branch_rollouts(farm, candidates, horizon, nb_rollouts=1, state=None, seed=None):
+    """
+    Evaluates candidate intervention schedules by running `nb_rollouts` rollouts of
+    `horizon` days for each of them, all starting from the same farm state.
+
+    Parameters
+    ----------
+    farm: a :class:`~farmgym.v2.farm.Farm`
+
+    candidates: a list of farmgym intervention schedules,
+        each a list of interventions such as::
+
+            ('BasicFarmer-0', 'Field-0', 'Soil-0', 'water_discrete',
+             {'plot': (0, 0), 'amount#L': 5.0})
+
+    horizon: an integer,
+        number of days of each rollout, the candidate being performed on the first one.
+
+    nb_rollouts: an integer,
+        number of rollouts per candidate.
+
+    state: a snapshot from :meth:`~farmgym.v2.farm.Farm.get_state`, optional
+        state the rollouts start from, the current state of the farm by default.
+
+    seed: an integer, optional
+        seed of the rollouts.
+
+    Returns
+    -------
+    A list with, for each candidate, a dict of statistics of the cumulated rewards of
+    its rollouts: "mean", "std", "min", "max", and the array of all "rewards".
+
+    Notes
+    -----
+    All candidates × `nb_rollouts` branches are simulated at once, as one
+    :class:`~farmgym.v2.batch.FarmBatch` of copies of `farm` restored with `set_state`:
+    each day, vectorized entity updates run once for all branches. `farm` itself is left
+    unchanged.
+    The k-th rollout of every candidate uses the same random numbers (common random
+    numbers), so that differences between candidates are due to the candidates
+    themselves.
+    """
+    if not candidates:
+        return []
+    if state is None:
+        state = farm.get_state()
+    bit_generator = type(farm.np_random.bit_generator)
+    rollout_states = [
+        bit_generator(s).state
+        for s in np.random.SeedSequence(seed).spawn(nb_rollouts)
+    ]
+
+    branches = [(schedule, k) for schedule in candidates for k in range(nb_rollouts)]
+    farms = branch_copies(farm, len(branches))
+    for branch, (_, k) in zip(farms, branches):
+        branch.set_state(state)
+        branch.np_random.bit_generator.state = rollout_states[k]
+    rewards = batch_rollout(
+        FarmBatch(farms), [schedule for schedule, _ in branches], horizon
+    ).reshape(len(candidates), nb_rollouts)
+
+    return [
+        {
+            "mean": r.mean(),
+            "std": r.std(),
+            "min": r.min(),
+            "max": r.max(),
+            "rewards": r,
+        }
+        for r in rewards
+    ]
@@ -1,8 +1,262 @@
 import ast
 import copy
+import heapq
+import os
 import random
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from statistics import NormalDist
 from typing import NamedTuple
 
+import numpy as np
+import yaml
+
+from farmgym.v2.make_farm import farm_factory
+from farmgym.v2.rules_api import OPERATORS
+
+
+def path_key(path):
+    """
+    Returns a hashable version of an observation path, e.g. ``((0, 0),)`` for
+    ``[(0, 0)]``.
+    """
+    return tuple(path_key(p) if isinstance(p, list) else p for p in path)
+
+
+def variable_key(variable_path):
+    """
+    Returns the key of `variable_path` = (field, entity, variable, path) in an
+    :class:`ObservationIndex`, or None if its path is not a list.
+    """
+    field, entity, variable, path = variable_path
+    if not isinstance(path, (list, tuple)):
+        return None
+    return (field, entity, variable, path_key(path))
+
+
+class ObservationIndex(list):
+    """
+    List of the observations (farmer, field, entity, variable, path, value) of a step,
+    together with their values indexed by :func:`variable_key`, so that triggers look up
+    their variables instead of scanning all observations.
+    """
+
+    def __init__(self, observations):
+        list.__init__(self, observations)
+        self.values = {}
+        for farmer, field, entity, variable, path, value in self:
+            key = variable_key((field, entity, variable, path))
+            if key is not None:
+                self.values.setdefault(key, []).append(value)
+
+
+def index_observations(observations):
+    """
+    Returns `observations` as an :class:`ObservationIndex`, indexing them only if they
+    are not already.
+    """
+    if isinstance(observations, ObservationIndex):
+        return observations
+    return ObservationIndex(observations)
+
+
+def compile_trigger(trigger):
+    """
+    Compiles a trigger in CNF, a list of lists of conditions (variable_path, fun,
+    operator, value), into a list of clauses, each a list of (key, fun, comparison,
+    value).
+    """
+    return [
+        [
+            (variable_key(variable_path), fun, OPERATORS.get(operator), value)
+            for variable_path, fun, operator, value in and_conditions
+        ]
+        for and_conditions in trigger
+    ]
+
+
+class Value:
+    """
+    Trigger function returning the observed value itself.
+    """
+
+    name = "value"
+
+    def __call__(self, x):
+        return x
+
+    def parameters(self):
+        return {}
+
+    def to_dict(self):
+        return {"name": self.name, **self.parameters()}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.parameters() == other.parameters()
+
+    def __repr__(self):
+        parameters = ", ".join(str(v) for v in self.parameters().values())
+        return f"{type(self).__name__}({parameters})"
+
+
+class Modulo(Value):
+    """
+    Trigger function returning the observed value modulo `n`, e.g. to act every `n`
+    days.
+    """
+
+    name = "modulo"
+
+    def __init__(self, n):
+        self.n = n
+
+    def __call__(self, x):
+        return x % self.n
+
+    def parameters(self):
+        return {"n": self.n}
+
+
+AGGREGATES = {"sum": np.sum, "mean": np.mean, "min": np.min, "max": np.max}
+
+
+class Aggregate(Value):
+    """
+    Trigger function aggregating the values observed over a path, e.g. the sum of a
+    variable over all plots, `how` being one of "sum", "mean", "min", "max".
+    """
+
+    name = "aggregate"
+
+    def __init__(self, how):
+        assert how in AGGREGATES, f"Aggregate must be one of {list(AGGREGATES)}."
+        self.how = how
+        self.aggregate = AGGREGATES[how]
+
+    def __call__(self, x):
+        return self.aggregate(x)
+
+    def parameters(self):
+        return {"how": self.how}
+
+
+TRIGGER_FUNCTIONS = {f.name: f for f in [Value, Modulo, Aggregate]}
+
+
+def day_modulo(frequency, field=0, remainder=0):
+    """
+    Condition holding every `frequency` days of the year, on days equal to `remainder`
+    modulo `frequency`.
+    """
+    return (
+        (f"Field-{field}", "Weather-0", "day#int365", []),
+        Modulo(frequency),
+        "==",
+        remainder,
+    )
+
+
+def on_day(day, field=0):
+    """
+    Condition holding on the given day of the year.
+    """
+    return ((f"Field-{field}", "Weather-0", "day#int365", []), Value(), "==", day)
+
+
+def threshold(variable_path, value, operator=">="):
+    """
+    Condition holding when the variable at `variable_path` = (field, entity, variable,
+    path) compares to `value` with `operator`.
+    """
+    return (variable_path, Value(), operator, value)
+
+
+def membership(variable_path, values):
+    """
+    Condition holding when the variable at `variable_path` is one of `values`, e.g. a
+    plant stage.
+    """
+    return (variable_path, Value(), "in", list(values))
+
+
+def aggregate(variable_path, how, operator, value):
+    """
+    Condition holding when the values of the variable at `variable_path` aggregated with
+    `how` compare to `value` with `operator`.
+    """
+    return (variable_path, Aggregate(how), operator, value)
+
+
+def to_plain(x):
+    """
+    Converts tuples to lists, recursively, so that `x` can be written in YAML or JSON.
+    """
+    if isinstance(x, (list, tuple)):
+        return [to_plain(xx) for xx in x]
+    if isinstance(x, dict):
+        return {k: to_plain(v) for k, v in x.items()}
+    return x
+
+
+def path_from_plain(path):
+    """
+    Inverse of :func:`to_plain` for an observation path, whose plot positions are
+    tuples.
+    """
+    return [tuple(p) if isinstance(p, list) else p for p in path]
+
+
+def condition_to_dict(condition):
+    variable_path, fun, operator, value = condition
+    if not isinstance(fun, Value):
+        raise TypeError(
+            f"Condition on {variable_path} does not use a declarative trigger "
+            f"function, hence cannot be serialized: {fun}"
+        )
+    return {
+        "variable": to_plain(variable_path),
+        "function": fun.to_dict(),
+        "operator": operator,
+        "value": to_plain(value),
+    }
+
+
+def condition_from_dict(condition):
+    field, entity, variable, path = condition["variable"]
+    parameters = dict(condition["function"])
+    fun = TRIGGER_FUNCTIONS[parameters.pop("name")](**parameters)
+    return (
+        (field, entity, variable, path_from_plain(path)),
+        fun,
+        condition["operator"],
+        condition["value"],
+    )
+
+
+def trigger_to_list(trigger):
+    return [
+        [condition_to_dict(c) for c in and_conditions] for and_conditions in trigger
+    ]
+
+
+def trigger_from_list(trigger):
+    return [
+        [condition_from_dict(c) for c in and_conditions] for and_conditions in trigger
+    ]
+
+
+def intervention_from_plain(action):
+    farmer, field, entity, intervention, parameters = action
+    parameters = {
+        k: tuple(v) if isinstance(v, list) else v for k, v in parameters.items()
+    }
+    return (farmer, field, entity, intervention, parameters)
+
+
+def observation_from_plain(action):
+    farmer, field, entity, variable, path = action
+    return (farmer, field, entity, variable, path_from_plain(path))
+
 
 class Policy_API:
     """
@@ -14,14 +268,22 @@ class Policy_API:
         self.triggered_interventions = triggered_interventions
         # TODO: Perhaps use discretized_farmgymaction_to_gymaction to be able to output gymactions (integers)  and not just farmgymactions?
 
+        # Heap of (due day, -order of scheduling, action), so that actions due the same
+        # day come out most recently scheduled first.
         self.delayed_actions = []
+        self.day = 0
+        self.nb_scheduled = 0
+        self.compiled_triggers = {}
 
     def reset(self):
         self.delayed_actions = []
+        self.day = 0
+        self.nb_scheduled = 0
 
     def observation_schedule(self, observations):
         # observations: list of (farmer,field,entity,variable,path,value)
         # contains all free observations, hence current day as minimum info.
+        observations = index_observations(observations)
         action_schedule = []
         for trigger, actions in self.triggered_observations:
             # Trigger is CNF
@@ -37,95 +299,170 @@ class Policy_API:
         """
         # observations: list of (farmer,field,entity,variable,path,value)
         # contains all free observations, hence current day as minimum info.
+        observations = index_observations(observations)
         action_schedule = []
         for trigger, actions in self.triggered_interventions:
             # Trigger is CNF
             trigger_on = self.is_trigger_on(trigger, observations)
             if trigger_on:
-                # [action_schedule.append(action) for action in actions]
-                [self.delayed_actions.append(copy.copy(action)) for action in actions]
+                for action in actions:
+                    if action["delay"] >= 0:
+                        self.nb_scheduled += 1
+                        heapq.heappush(
+                            self.delayed_actions,
+                            (
+                                self.day + action["delay"],
+                                -self.nb_scheduled,
+                                action["action"],
+                            ),
+                        )
 
-        for action in reversed(self.delayed_actions):
-            if action["delay"] == 0:
-                action_schedule.append(action["action"])
-                self.delayed_actions.remove(action)
-            else:
-                action["delay"] = action["delay"] - 1
+        while self.delayed_actions and self.delayed_actions[0][0] <= self.day:
+            action_schedule.append(heapq.heappop(self.delayed_actions)[2])
+        self.day += 1
 
         return action_schedule
 
     def is_trigger_on(self, trigger, observations):
+        """
+        A clause of the trigger is on if all its conditions hold on the matching
+        observations, and at least one of them matches an observation.
+        """
         ## Check Breaks
         if trigger == [[]]:
             return True
-        for and_conditions in trigger:
+        observations = index_observations(observations)
+        compiled = self.compiled_triggers.get(id(trigger))
+        if compiled is None or compiled[0] is not trigger:
+            compiled = (trigger, compile_trigger(trigger))
+            self.compiled_triggers[id(trigger)] = compiled
+        for clause in compiled[1]:
             bool_cond = True
             observation_exists = False
-            for condition in and_conditions:
-                for ob in observations:
-                    farm, field, entity, variable, path, v = ob
-                    variable_path, fun, operator, value = condition
-                    if variable_path == (field, entity, variable, path):
-                        observation_exists = True
-                        if operator == "==":
-                            bool_cond = bool_cond and fun(v) == value
-                        elif operator == "!=":
-                            bool_cond = bool_cond and fun(v) != value
-                        elif operator == "<=":
-                            bool_cond = bool_cond and fun(v) <= value
-                        elif operator == ">=":
-                            bool_cond = bool_cond and fun(v) >= value
-                        elif operator == "<":
-                            bool_cond = bool_cond and fun(v) < value
-                        elif operator == ">":
-                            bool_cond = bool_cond and fun(v) > value
-                        elif operator == "in":
-                            bool_cond = bool_cond and fun(v) in value
-                        elif operator == "ni":
-                            bool_cond = bool_cond and value in fun(v)
-                        elif operator == "not in":
-                            bool_cond = bool_cond and fun(v) not in value
-                        elif operator == "not ni":
-                            bool_cond = bool_cond and value not in fun(v)
-                        else:
-                            bool_cond = False
+            for key, fun, compare, value in clause:
+                for v in observations.values.get(key, ()):
+                    observation_exists = True
+                    bool_cond = compare is not None and compare(fun(v), value)
+                    if not bool_cond:
+                        break
+                if not bool_cond:
+                    break
             if bool_cond and observation_exists:
                 return True
         return False
 
     def __add__(self, other):
-        combined_obs = self.triggered_observations + other.triggered_observations
-        combined_interv = self.triggered_interventions + other.triggered_interventions
-
-        combined = Policy_API(combined_obs, combined_interv)
-        combined.reset = lambda: (self.reset(), other.reset())
-        combined.observation_schedule = lambda obs: (
-            self.observation_schedule(obs) + other.observation_schedule(obs)
-        )
-        combined.intervention_schedule = lambda obs: (
-            self.intervention_schedule(obs) + other.intervention_schedule(obs)
-        )
-
-        return combined
+        return CombinedPolicy([self, other])
 
     @classmethod
     def combine_policies(cls, policies):
+        return CombinedPolicy(policies)
+
+    def __getstate__(self):
+        # Compiled triggers are keyed by id and hold operator lambdas, they are rebuilt
+        # on demand.
+        state = self.__dict__.copy()
+        state["compiled_triggers"] = {}
+        return state
+
+    def to_dict(self):
+        """
+        Returns the policy as a dict of lists, strings and numbers, that can be written
+        in YAML or JSON, provided all its triggers are built from declarative trigger
+        functions (see :class:`Value`).
+        """
+        return {
+            "observations": [
+                {"trigger": trigger_to_list(trigger), "actions": to_plain(actions)}
+                for trigger, actions in self.triggered_observations
+            ],
+            "interventions": [
+                {
+                    "trigger": trigger_to_list(trigger),
+                    "actions": [
+                        {"action": to_plain(a["action"]), "delay": a["delay"]}
+                        for a in actions
+                    ],
+                }
+                for trigger, actions in self.triggered_interventions
+            ],
+        }
+
+    @staticmethod
+    def from_dict(policy):
+        """
+        Builds a policy from its :meth:`to_dict` description.
+        """
+        if "policies" in policy:
+            return CombinedPolicy([Policy_API.from_dict(p) for p in policy["policies"]])
+        triggered_observations = [
+            (
+                trigger_from_list(t["trigger"]),
+                [observation_from_plain(a) for a in t["actions"]],
+            )
+            for t in policy.get("observations", [])
+        ]
+        triggered_interventions = [
+            (
+                trigger_from_list(t["trigger"]),
+                [
+                    {
+                        "action": intervention_from_plain(a["action"]),
+                        "delay": a["delay"],
+                    }
+                    for a in t["actions"]
+                ],
+            )
+            for t in policy.get("interventions", [])
+        ]
+        return Policy_API(triggered_observations, triggered_interventions)
+
+    def save(self, filename):
+        """
+        Writes the policy in a YAML file.
+        """
+        with open(filename, "w", encoding="utf8") as file:
+            yaml.safe_dump(self.to_dict(), file, sort_keys=False)
+
+    @staticmethod
+    def load(filename):
+        """
+        Reads a policy from a YAML (or JSON) file written by :meth:`save`.
+        """
+        with open(filename, "r", encoding="utf8") as file:
+            return Policy_API.from_dict(yaml.safe_load(file))
+
+
+class CombinedPolicy(Policy_API):
+    """
+    Policy performing the observations and interventions of several policies, each
+    keeping its own delayed actions.
+    """
+
+    def __init__(self, policies):
         combined_obs = []
         combined_interv = []
         for policy in policies:
             combined_obs.extend(policy.triggered_observations)
             combined_interv.extend(policy.triggered_interventions)
+        Policy_API.__init__(self, combined_obs, combined_interv)
+        self.policies = list(policies)
 
-        combined = cls(combined_obs, combined_interv)
-        combined.reset = lambda: [p.reset() for p in policies]
-        combined.observation_schedule = lambda obs: [
-            a for p in policies for a in p.observation_schedule(obs)
-        ]
-        combined.intervention_schedule = lambda obs: [
-            a for p in policies for a in p.intervention_schedule(obs)
-        ]
+    def reset(self):
+        for policy in self.policies:
+            policy.reset()
 
-        return combined
+    # Observations are indexed once for all policies.
+    def observation_schedule(self, observations):
+        observations = index_observations(observations)
+        return [a for p in self.policies for a in p.observation_schedule(observations)]
+
+    def intervention_schedule(self, observations):
+        observations = index_observations(observations)
+        return [a for p in self.policies for a in p.intervention_schedule(observations)]
+
+    def to_dict(self):
+        return {"policies": [p.to_dict() for p in self.policies]}
 
 
 class Policy(NamedTuple):
@@ -204,7 +541,7 @@ class Policy_helper:
             [
                 (
                     ("Field-0", "Weather-0", "day#int365", []),
-                    lambda x: x % frequency,
+                    Modulo(frequency),
                     "==",
                     0,
                 )
@@ -265,13 +602,13 @@ class Policy_helper:
             [
                 (
                     (f"Field-{fi}", f"Plant-{idx}", "stage", [loc]),
-                    lambda x: x,
+                    Value(),
                     "in",
                     ["ripe"],
                 ),
                 (
                     (f"Field-{fi}", "Weather-0", "day#int365", []),
-                    lambda x: x % frequency,
+                    Modulo(frequency),
                     "==",
                     0,
                 ),
@@ -309,13 +646,13 @@ class Policy_helper:
             [
                 (
                     (f"Field-{fi}", f"Plant-{idx}", "stage", [loc]),
-                    lambda x: x,
+                    Value(),
                     "in",
                     ["fruit"],
                 ),
                 (
                     (f"Field-{fi}", "Weather-0", "day#int365", []),
-                    lambda x: x % frequency,
+                    Modulo(frequency),
                     "==",
                     0,
                 ),
@@ -395,13 +732,13 @@ class Policy_helper:
             [
                 (
                     (f"Field-{fi}", f"Weeds-{idx}", "grow#nb", [loc]),
-                    lambda x: x,
+                    Value(),
                     ">=",
                     float(threshold),
                 ),
                 (
                     (f"Field-{fi}", "Weather-0", "day#int365", []),
-                    lambda x: x % frequency,
+                    Modulo(frequency),
                     "==",
                     0,
                 ),
@@ -409,7 +746,7 @@ class Policy_helper:
         ]
         if day >= 0:
             scatter_conditions[0].append(
-                ((f"Field-{fi}", "Weather-0", "day#int365", []), lambda x: x, "==", day)
+                ((f"Field-{fi}", "Weather-0", "day#int365", []), Value(), "==", day)
             )
         if bag:
             scatter_actions = [
@@ -468,13 +805,13 @@ class Policy_helper:
             [
                 (
                     (f"Field-{fi}", f"Weeds-{idx}", "grow#nb", [loc]),
-                    lambda x: x,
+                    Value(),
                     ">=",
                     float(threshold),
                 ),
                 (
                     (f"Field-{fi}", "Weather-0", "day#int365", []),
-                    lambda x: x % frequency,
+                    Modulo(frequency),
                     "==",
                     0,
                 ),
@@ -528,7 +865,7 @@ class Policy_helper:
             [
                 (
                     (f"Field-{fi}", "Weather-0", "day#int365", []),
-                    lambda x: x % frequency,
+                    Modulo(frequency),
                     "==",
                     0,
                 )
@@ -539,7 +876,7 @@ class Policy_helper:
                 [
                     (
                         (f"Field-{fi}", "Weather-0", "day#int365", []),
-                        lambda x: x,
+                        Value(),
                         "==",
                         day,
                     )
@@ -599,7 +936,7 @@ class Policy_helper:
             [
                 (
                     (f"Field-{fi}", "Weather-0", "day#int365", []),
-                    lambda x: x % frequency,
+                    Modulo(frequency),
                     "==",
                     0,
                 ),
@@ -610,7 +947,7 @@ class Policy_helper:
                 [
                     (
                         (f"Field-{fi}", "Weather-0", "day#int365", []),
-                        lambda x: x,
+                        Value(),
                         "==",
                         day,
                     )
@@ -668,7 +1005,7 @@ class Policy_helper:
             [
                 (
                     (f"Field-{fi}", "Weather-0", "day#int365", []),
-                    lambda x: x % frequency,
+                    Modulo(frequency),
                     "==",
                     0,
                 ),
@@ -680,7 +1017,7 @@ class Policy_helper:
                     (
                         (
                             (f"Field-{fi}", "Weather-0", "day#int365", []),
-                            lambda x: x,
+                            Value(),
                             "==",
                             day,
                         )
@@ -735,7 +1072,7 @@ class Policy_helper:
             [
                 (
                     (f"Field-{fi}", "Weather-0", "day#int365", []),
-                    lambda x: x % frequency,
+                    Modulo(frequency),
                     "==",
                     0,
                 ),
@@ -938,13 +1275,13 @@ class Policy_helper:
         return policies
 
 
-def run_policy_xp(farm, policy, max_steps=10000, show_actions=False):
+def run_policy_xp(farm, policy, max_steps=10000, show_actions=False, seed=None):
     #    if farm.monitor is not None:
     #        farm.monitor = None
     cumreward = 0.0
     cumcost = 0.0
     policy.reset()
-    observation = farm.reset()
+    observation = farm.reset(seed=seed)
     terminated = False
     i = 0
     while (not terminated) and i <= max_steps:
@@ -965,6 +1302,129 @@ def run_policy_xp(farm, policy, max_steps=10000, show_actions=False):
     return cumreward, cumcost
 
 
+def episode_seeds(nb_episodes, seed=None):
+    """
+    Returns `nb_episodes` integer seeds, one per episode, drawn from independent streams
+    spawned from ``np.random.SeedSequence(seed)``.
+    """
+    return [
+        int(s.generate_state(1)[0])
+        for s in np.random.SeedSequence(seed).spawn(nb_episodes)
+    ]
+
+
+def run_policy_episodes(make_env, policy, seeds, max_steps=10000):
+    """
+    Runs one episode of `policy` per seed on a single farm built with `make_env`, and
+    returns the arrays of cumulated rewards and costs.
+    """
+    farm = farm_factory(make_env)()
+    rewards = np.zeros(len(seeds))
+    costs = np.zeros(len(seeds))
+    for i, seed in enumerate(seeds):
+        rewards[i], costs[i] = run_policy_xp(farm, policy, max_steps, seed=seed)
+    return rewards, costs
+
+
+def mean_confidence_interval(x, confidence=0.95):
+    """
+    Returns a dict with the "mean" and "std" of `x`, and the normal-approximation
+    confidence interval "ci" = (low, high) of its mean.
+    """
+    mean = x.mean()
+    std = x.std(ddof=1) if len(x) > 1 else np.nan
+    half_width = NormalDist().inv_cdf((1 + confidence) / 2) * std / np.sqrt(len(x))
+    return {"mean": mean, "std": std, "ci": (mean - half_width, mean + half_width)}
+
+
+def evaluate_policy(
+    make_env,
+    policy,
+    nb_episodes,
+    seed=None,
+    max_steps=10000,
+    num_workers=None,
+    context=None,
+    confidence=0.95,
+):
+    """
+    Monte Carlo evaluation of a policy: runs `nb_episodes` episodes with
+    :func:`run_policy_xp`, across a pool of processes.
+
+    Parameters
+    ----------
+    make_env: a yaml file name or a callable returning a :class:`~farmgym.v2.farm.Farm`,
+        picklable if the processes are not forked, e.g. a function or a
+        ``functools.partial``.
+
+    policy: a :class:`Policy_API`,
+        sent to the processes, hence with picklable triggers (see :class:`Value`).
+
+    nb_episodes: an integer,
+        number of episodes.
+
+    seed: an integer, optional
+        root of the seeds of the episodes (see :func:`episode_seeds`).
+
+    max_steps: an integer,
+        maximal number of days per episode.
+
+    num_workers: an integer, optional
+        number of processes, the number of CPUs by default. Episodes run in the current
+        process if it is 1.
+
+    context: a string, optional
+        multiprocessing start method ("fork", "spawn", "forkserver"), the platform
+        default if None.
+
+    confidence: a float,
+        level of the confidence intervals.
+
+    Returns
+    -------
+    A dict with the arrays of per-episode "seeds", "rewards" and "costs", and for
+    "reward" and "cost" a dict of statistics (see :func:`mean_confidence_interval`).
+
+    Notes
+    -----
+    Each episode resets its farm with its own seed, hence results do not depend on the
+    number of processes, and the k-th episode can be replayed with
+    ``run_policy_xp(farm, policy, seed=results["seeds"][k])``. Each process builds its
+    farm once and runs a contiguous chunk of episodes.
+    """
+    assert nb_episodes >= 1, "[Farmgym Error] At least one episode is needed."
+    seeds = episode_seeds(nb_episodes, seed)
+    num_workers = min(nb_episodes, num_workers or os.cpu_count() or 1)
+    if num_workers <= 1:
+        rewards, costs = run_policy_episodes(make_env, policy, seeds, max_steps)
+    else:
+        chunks = np.array_split(np.arange(nb_episodes), num_workers)
+        with ProcessPoolExecutor(
+            max_workers=num_workers, mp_context=get_context(context)
+        ) as executor:
+            futures = [
+                executor.submit(
+                    run_policy_episodes,
+                    make_env,
+                    policy,
+                    [seeds[i] for i in chunk],
+                    max_steps,
+                )
+                for chunk in chunks
+            ]
+            outputs = [future.result() for future in futures]
+        rewards = np.concatenate([r for r, _ in outputs])
+        costs = np.concatenate([c for _, c in outputs])
+
+    return {
+        "seeds": np.array(seeds),
+        "rewards": rewards,
+        "costs": costs,
+        "reward": mean_confidence_interval(rewards, confidence),
+        "cost": mean_confidence_interval(costs, confidence),
+    }
+
+
 if __name__ == "__main__":
     from farmgym.v2.make_farm import make_farm
 
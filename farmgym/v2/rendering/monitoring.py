@@ -8,13 +8,15 @@ import matplotlib.pyplot as plt
 import numpy as np
 from PIL import Image
 
-from farmgym.v2.entity_api import Range
+from farmgym.v2.entity_api import Range, RangeArray
 
 
 def sum_value(value_array):
     # print("SumValue",value_array)
     if isinstance(value_array, Range):
         return value_array.value
+    elif isinstance(value_array, RangeArray):
+        return value_array.values.sum()
     else:
         sum = 0
         it = np.nditer(value_array, flags=["multi_index", "refs_ok"])
@@ -27,6 +29,8 @@ def avg_value(value_array):
     # print("SumValue",value_array)
     if isinstance(value_array, Range):
         return value_array.value
+    elif isinstance(value_array, RangeArray):
+        return value_array.values.mean() if value_array.values.size > 0 else 0
     else:
         sum = 0
         nb = 0
@@ -41,6 +45,8 @@ def avg_value(value_array):
 
 
 def mat2d_value(value_array):
+    if isinstance(value_array, RangeArray):
+        return value_array.values.astype(float)
     X, Y = value_array.shape
     mat = np.zeros((X, Y))
     for x in range(X):
@@ -50,14 +56,16 @@ def mat2d_value(value_array):
 
 def name_value(value_array):
     if isinstance(value_array, Range):
-        return  value_array.range.index(value_array.value)
+        return value_array.codes[value_array.value]
+    elif isinstance(value_array, RangeArray):
+        return value_array.values.mean() if value_array.values.size > 0 else 0
     else:
         sum = 0
         nb = 0
         it = np.nditer(value_array, flags=["multi_index", "refs_ok"])
         for x in it:
             vv = value_array[it.multi_index]
-            sum += vv.range.index(vv.value)
+            sum += vv.codes[vv.value]
             nb += 1
         if nb > 0:
             return sum / nb
@@ -23,6 +23,16 @@ class BasicRule(Rules_API):
         self.max_action_schedule_cost = max_action_schedule_cost
         self.current_day_action_schedule_cost = 0
 
+    def get_state(self):
+        return {
+            "current_day_action_schedule_cost": self.current_day_action_schedule_cost
+        }
+
+    def set_state(self, state):
+        self.current_day_action_schedule_cost = state[
+            "current_day_action_schedule_cost"
+        ]
+
     def assert_actions(self, actions):
         pass
 
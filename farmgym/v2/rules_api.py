@@ -1,8 +1,14 @@
+import operator
+
 import numpy as np
 import yaml
 
+from farmgym.v2.entity_api import RangeArray
+
 
 def sum_value(value_array):
+    if isinstance(value_array, RangeArray):
+        return value_array.values.sum()
     sum = 0
     it = np.nditer(value_array, flags=["multi_index", "refs_ok"])
     for x in it:
@@ -11,6 +17,8 @@ def sum_value(value_array):
 
 
 def mean_value(value_array):
+    if isinstance(value_array, RangeArray):
+        return value_array.values.mean()
     sum = 0
     it = np.nditer(value_array, flags=["multi_index", "refs_ok"])
     n = 0
@@ -24,6 +32,111 @@ def id_value(x):
     return x.value
 
 
+TRIGGERS = {"value": id_value, "sum": sum_value, "mean": mean_value}
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<=": operator.le,
+    ">=": operator.ge,
+    "<": operator.lt,
+    ">": operator.gt,
+    "in": lambda va, value: va in value,
+    "ni": lambda va, value: value in va,
+    "not in": lambda va, value: va not in value,
+    "not ni": lambda va, value: value not in va,
+}
+
+
+def compile_condition(fields, condition):
+    """
+    Compiles a terminal condition, e.g.::
+
+        {state_variable: ["Field-0", "Weather-0", "day#int365", []],
+         function: "value", operator: ">=", ref_value: 360}
+
+    into a function of no argument evaluating it on `fields`. Returns None, with a
+    warning, if the condition cannot be evaluated (e.g. the variable does not exist).
+    """
+    field, entity, variable, path = condition["state_variable"]
+    function = condition["function"]
+    op = condition["operator"]
+    value = condition["ref_value"]
+
+    def ignore(reason):
+        print(
+            "[Farmgym Warning] Terminal condition",
+            str(condition),
+            "is ignored:",
+            reason + ".",
+        )
+        return None
+
+    if (
+        field not in fields
+        or entity not in fields[field].entities
+        or variable not in fields[field].entities[entity].variables
+    ):
+        return ignore("no variable " + str((field, entity, variable)))
+    if function not in TRIGGERS:
+        return ignore("unknown function " + str(function))
+    if op not in OPERATORS:
+        return ignore("unknown operator " + str(op))
+
+    # Entities may replace their variables (e.g. at reset), hence they are looked up at
+    # evaluation.
+    variables = fields[field].entities[entity].variables
+    trigger = TRIGGERS[function]
+    compare = OPERATORS[op]
+
+    def resolve():
+        x = variables[variable]
+        for p in path:
+            x = x[p]
+        return x
+
+    try:
+        x = resolve()
+    except (KeyError, IndexError, TypeError):
+        return ignore("no path " + str(path) + " in variable " + str(variable))
+    if function == "value" and not hasattr(x, "value"):
+        return ignore('function "value" applies to a single value, not ' + variable)
+    if function != "value" and not isinstance(x, (RangeArray, np.ndarray)):
+        return ignore("function " + function + " applies to an array, not " + variable)
+
+    if path == []:
+        evaluate = lambda: compare(trigger(variables[variable]), value)  # noqa: E731
+    else:
+        evaluate = lambda: compare(trigger(resolve()), value)  # noqa: E731
+    try:
+        evaluate()
+    except TypeError as err:
+        return ignore(str(err))
+    return evaluate
+
+
+def compile_allowed_paths(allowed):
+    """
+    Compiles the paths of a variable allowed by the actions yaml into a trie, in which a
+    node is either True (any path is allowed from there) or a pair (children by key,
+    whether the path may stop there).
+    """
+    if allowed is None:
+        return True
+    if isinstance(allowed, dict):
+        children = {
+            k: compile_allowed_paths(v)
+            for k, v in allowed.items()
+            if isinstance(k, str)
+        }
+        return children, ("*" in allowed) or allowed == {}
+    if not isinstance(allowed, list):
+        allowed = [allowed]
+    # Keys of a path are compared as strings, and only the first one is checked against
+    # a list.
+    return {x: True for x in allowed if isinstance(x, str)}, "*" in allowed
+
+
 class Rules_API:
     """
     class for rules definition
@@ -64,49 +177,35 @@ class Rules_API:
             y = yaml.safe_load(file)
             self.initial_conditions = y["Initial"]
             self.terminal_CNF_conditions = y["Terminal"]
+        self.compile_terminal_conditions(farm.fields)
 
         with open(self.actions_configuration, "r", encoding="utf8") as file:
             self.actions_allowed = yaml.safe_load(file)  # Note the safe_load
+        self.compile_actions_allowed()
 
         # self.actions_allowed['observations']['Free']
 
-    def is_terminal(self, fields):
-        trigger = {"value": id_value, "sum": sum_value, "mean": mean_value}
+    def compile_terminal_conditions(self, fields):
+        """
+        Compiles `terminal_CNF_conditions` for `fields` (see :func:`compile_condition`),
+        used by :meth:`is_terminal`. Conditions that cannot be evaluated are reported
+        and removed from their clause.
+        """
+        self.terminal_fields = fields
+        self.terminal_conditions = []
         for and_conditions in self.terminal_CNF_conditions:
-            bool_cond = True
+            clause = []
             for condition in and_conditions:
-                # variable_path, fun, operator, value = condition
-                variable_path = tuple(condition["state_variable"])
-                fun = condition["function"]
-                operator = condition["operator"]
-                value = condition["ref_value"]
-                field, entity, variable, path = variable_path
-                try:  # If the corresponding variable or entity does not exist, ignore the condition:
-                    v = fields[field].entities[entity].variables[variable]
-                    va = trigger[fun](v)
-                    if operator == "==":
-                        bool_cond = bool_cond and va == value
-                    elif operator == "!=":
-                        bool_cond = bool_cond and va != value
-                    elif operator == "<=":
-                        bool_cond = bool_cond and va <= value
-                    elif operator == ">=":
-                        bool_cond = bool_cond and va >= value
-                    elif operator == "<":
-                        bool_cond = bool_cond and va < value
-                    elif operator == ">":
-                        bool_cond = bool_cond and va > value
-                    elif operator == "in":
-                        bool_cond = bool_cond and va in value
-                    elif operator == "ni":
-                        bool_cond = bool_cond and va in fun(v)
-                    elif operator == "not in":
-                        bool_cond = bool_cond and va not in value
-                    elif operator == "not ni":
-                        bool_cond = bool_cond and value not in va
-                except:
-                    pass
-            if bool_cond:
+                evaluate = compile_condition(fields, condition)
+                if evaluate is not None:
+                    clause.append(evaluate)
+            self.terminal_conditions.append(clause)
+
+    def is_terminal(self, fields):
+        if fields is not self.terminal_fields:
+            self.compile_terminal_conditions(fields)
+        for clause in self.terminal_conditions:
+            if all(evaluate() for evaluate in clause):
                 return True
         return False
 
@@ -128,60 +227,59 @@ class Rules_API:
 
         return observations
 
-    def is_allowed_action(self, action, is_observation_time):
-        allowed_actions = self.actions_allowed
+    def compile_actions_allowed(self):
+        """
+        Compiles `actions_allowed` into the set of allowed (farmer, field, entity,
+        intervention) and the tries (see :func:`compile_allowed_paths`) of allowed paths
+        of each (farmer, field, entity, variable), used by :meth:`is_allowed_action`.
+        Must be called again if `actions_allowed` is modified.
+        """
+        self.allowed_interventions = set()
+        for fa, farmer in (self.actions_allowed["interventions"] or {}).items():
+            for fi, field in (farmer or {}).items():
+                for e, ent in (field or {}).items():
+                    if ent is not None:
+                        for a in ent:
+                            self.allowed_interventions.add((fa, fi, e, a))
 
-        def check(dic, param):
-            if dic is None:
-                return True
-            if len(param) > 0:
-                if isinstance(dic, dict):
-                    if str(param[0]) not in dic.keys():
-                        return False
-                    return check(dic[param[0]], param[1:])
-                else:
-                    if str(param[0]) not in dic:
-                        return False
-                    else:
-                        return True
-            else:
-                if ("*" in dic) or ("*" in dic.keys()):
-                    return True
-                return dic == {}
+        self.allowed_observations = {}
+        for fa, farmer in (self.actions_allowed["observations"] or {}).items():
+            for fi, field in (farmer or {}).items():
+                for e, ent in (field or {}).items():
+                    if ent is not None:
+                        for var in ent:
+                            self.allowed_observations[
+                                (fa, fi, e, var)
+                            ] = compile_allowed_paths(ent[var])
 
+    def is_allowed_action(self, action, is_observation_time):
         fa, fi, e, a, p = action
         if not isinstance(p, list):  # Intervention
             if is_observation_time:
                 return False
-            env_space = allowed_actions["interventions"]
-            if fa in env_space.keys():
-                farmer = env_space[fa]
-                if fi in farmer.keys():
-                    field = farmer[fi]
-                    # print("FIELD",field)
-                    if e in field.keys():
-                        ent = field[e]
-                        # print("ENT",ent)
-                        if a in ent.keys():
-                            act = ent[a]
-                            # print("ACT",act)
-                            return True
-        else:
-            env_space = allowed_actions["observations"]
-            if not is_observation_time:
+            return (fa, fi, e, a) in self.allowed_interventions
+        if not is_observation_time:
+            return False
+        node = self.allowed_observations.get((fa, fi, e, a))
+        if node is None:
+            return False
+        for key in p:
+            if node is True:
+                return True
+            node = node[0].get(str(key))
+            if node is None:
                 return False
-            if fa in env_space.keys():
-                farmer = env_space[fa]
-                if fi in farmer.keys():
-                    field = farmer[fi]
-                    if e in field.keys():
-                        ent = field[e]
-                        # print("ENT", ent)
-                        if a in ent.keys():
-                            act = ent[a]
-                            # print("ACT", act, p)
-                            return check(act, p)
-        return False
+        return node is True or node[1]
+
+    def get_state(self):
+        """
+        Returns a snapshot of the mutable state of the rules (e.g. costs accumulated
+        during the day), to be given back to `set_state`.
+        """
+        return {}
+
+    def set_state(self, state):
+        pass
 
     def assert_actions(self, actions):
         ()
@@ -1,14 +1,17 @@
 import numpy as np
 
 import farmgym.v2.scorings.reward_functions as rf
+from farmgym.v2.entity_api import RangeArray, is_array_variable
 from farmgym.v2.score_api import Score_API
 
 
 def compute_sizeobservation(variable):
-    if type(variable) not in [dict, np.ndarray]:
+    if not (isinstance(variable, dict) or is_array_variable(variable)):
         return 1
-    if isinstance(variable, dict()):
+    if isinstance(variable, dict):
         return sum([compute_sizeobservation(variable[a]) for a in variable.keys()])
+    if isinstance(variable, RangeArray):
+        return variable.values.size
     if type(variable) == np.ndarray:
         return sum(1 for x in np.nditer(variable, flags=["multi_index", "refs_ok"]))
 
@@ -1,6 +1,9 @@
+import hashlib
 import os
+import tempfile
 from pathlib import Path
 
+import numpy as np
 import pandas
 import yaml
 
@@ -10,13 +13,72 @@ CURRENT_DIR = file_path.parent
 # print(type(CURRENT_DIR))
 
 
+class FrozenDict(dict):
+    """
+    Read-only dict, used for parameters loaded from specification files so that they can
+    be shared by all entities.
+    Copying returns the same object, and pickling gives a FrozenDict back.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError(
+            "Specification parameters are read-only, build a new dict to change them."
+        )
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+    def __repr__(self):
+        return "FrozenDict(" + dict.__repr__(self) + ")"
+
+
+def freeze(x):
+    """
+    Returns `x` with all its dicts turned into FrozenDicts and lists into tuples.
+    """
+    if isinstance(x, dict):
+        return FrozenDict((k, freeze(v)) for k, v in x.items())
+    if isinstance(x, list):
+        return tuple(freeze(v) for v in x)
+    return x
+
+
+# Parsed specification files of this process, by path:
+# (modification time, frozen content).
+SPECIFICATIONS = {}
+
+
+def load_specification(spec_file):
+    """
+    Returns the frozen content of the specification file `spec_file`, parsed only once
+    per process unless the file is modified.
+    """
+    string = CURRENT_DIR / spec_file
+    mtime = string.stat().st_mtime
+    if string not in SPECIFICATIONS or SPECIFICATIONS[string][0] != mtime:
+        with open(string, "r", encoding="utf8") as file:
+            doc_yaml = yaml.safe_load(file)  # Note the safe_load
+        SPECIFICATIONS[string] = (mtime, freeze(doc_yaml))
+    return SPECIFICATIONS[string][1]
+
+
 def load_yaml(spec_file, parameter_string):
     # spec_file=(class_.__class__.__name__).lower()+'_specifications.yaml'
     # string = CURRENT_DIR / 'specifications'/spec_file
-    string = CURRENT_DIR / spec_file
-    with open(string, "r", encoding="utf8") as file:
-        doc_yaml = yaml.safe_load(file)  # Note the safe_load
-        return doc_yaml[parameter_string]
+    return load_specification(spec_file)[parameter_string]
+
+
+def specification_exists(spec_file):
+    return (CURRENT_DIR / spec_file).exists()
 
 
 def load_weather_table(filename):
@@ -37,6 +99,68 @@ def load_weather_table(filename):
         return [table], [1]
 
 
+# Blended weather arrays already loaded in this process, by (files and alphas, columns).
+WEATHER_ARRAYS = {}
+
+
+def weather_cache_dir():
+    """
+    Directory where blended weather arrays are stored: $FARMGYM_CACHE_DIR if set, else
+    $XDG_CACHE_HOME/farmgym (~/.cache/farmgym by default).
+    """
+    if os.environ.get("FARMGYM_CACHE_DIR"):
+        return Path(os.environ["FARMGYM_CACHE_DIR"])
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "farmgym"
+
+
+def blend_weather_tables(filename, columns):
+    tables, alphas = load_weather_table(filename)
+    array = np.zeros((365, len(columns)))
+    for table, alpha in zip(tables, alphas):
+        array += table[list(columns)].to_numpy(dtype=float)[:365] * alpha
+    return array
+
+
+def load_weather_array(filename, columns):
+    """
+    Returns the `columns` of the weather table `filename` (a csv file, or a dict of csv
+    files with their interpolation weights) for the 365 days of the year, blended into
+    one read-only (365, len(columns)) float array.
+
+    The array is computed once and saved as a .npy file in `weather_cache_dir()`,
+    rebuilt whenever a csv file is more recent.
+    It is then memory-mapped and shared by all farms of the process, as well as by
+    processes using the same cache.
+    """
+    files = filename if isinstance(filename, dict) else {filename: 1}
+    key = (tuple(files.items()), tuple(columns))
+    if key in WEATHER_ARRAYS:
+        return WEATHER_ARRAYS[key]
+
+    sources = [CURRENT_DIR / f for f in files]
+    digest = hashlib.sha1(repr((key, [str(s) for s in sources])).encode("utf8"))
+    path = weather_cache_dir() / ("weather_" + digest.hexdigest() + ".npy")
+    try:
+        if not path.exists() or path.stat().st_mtime < max(
+            s.stat().st_mtime for s in sources
+        ):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Written aside then renamed, so that concurrent processes never read a
+            # partial file.
+            fd, tmp = tempfile.mkstemp(suffix=".npy", dir=path.parent)
+            with os.fdopen(fd, "wb") as file:
+                np.save(file, blend_weather_tables(filename, columns))
+            os.replace(tmp, path)
+        array = np.load(path, mmap_mode="r")
+    except OSError:
+        # No usable cache directory: keep the array in memory only.
+        array = blend_weather_tables(filename, columns)
+        array.flags.writeable = False
+    WEATHER_ARRAYS[key] = array
+    return array
+
+
 def build_scoreyaml(filepath, farm):
     fields = farm.fields
     s = "observation-cost" + ":\n"
@@ -75,9 +199,7 @@ def build_scoreyaml(filepath, farm):
         print(s, file=file)
 
 
-import numpy as np  # noqa: E402
-
-from farmgym.v2.entity_api import Range  # noqa: E402
+from farmgym.v2.entity_api import Range, RangeArray, is_array_variable  # noqa: E402
 
 
 def build_inityaml(filepath, farm, mode="default", init_values=None):
@@ -93,6 +215,14 @@ def build_inityaml(filepath, farm, mode="default", init_values=None):
                     s += make(x[k], indent=indent + "  ", mode=mode)
                 else:  # custom
                     s += make(x[k], indent=indent + "  ", mode="custom", value=value[k])
+        elif isinstance(x, RangeArray):
+            if mode == "default":
+                r = x.get_default_value()
+            elif mode == "random":
+                r = x.random_value()
+            else:  # custom
+                r = value
+            s += str(r) + "\n"
         elif type(x) == np.ndarray:
             it = np.nditer(x, flags=["multi_index", "refs_ok"])
             if mode == "default":
@@ -102,7 +232,7 @@ def build_inityaml(filepath, farm, mode="default", init_values=None):
             else:  # custom
                 r = value
             s += str(r) + "\n"
-        elif type(x) in [Range]:
+        elif isinstance(x, Range):
             if mode == "default":
                 # print("x", x, type(x))
                 r = x.get_default_value()
@@ -216,21 +346,16 @@ def build_actionsyaml(filepath, farm):
             s += "\n"
             s += indent + ("  '*': \n")
             for k in x:
-                if type(x[k]) == np.ndarray:
+                if is_array_variable(x[k]):
                     s += indent + ("  " + k + ": ")
                 else:
                     s += indent + ("  " + k + ": ")
                 s += make_s(x[k], indent=indent + "  ")
-        elif type(x) == np.ndarray:
+        elif is_array_variable(x):
             s += "['*',"
-            it = np.nditer(x, flags=["multi_index", "refs_ok"])
             # s+= str(len(it))+","+str(x.shape) +","+str(len(x.shape))+","+str(len(x))
             if len(x.shape) > 1:
-                s += "'" + str(it.multi_index) + "'"
-                it.iternext()
-                while not it.finished:
-                    s += ", " + "'" + str(it.multi_index) + "'"
-                    is_not_finished = it.iternext()  # noqa: F841
+                s += ", ".join("'" + str(index) + "'" for index in np.ndindex(x.shape))
                 s += "]\n"
             else:
                 for i in range(len(x) - 1):
@@ -239,7 +364,7 @@ def build_actionsyaml(filepath, farm):
 
             # r=x[it.multi_index].range
             # s+= str(r) + "\n"
-        elif type(x) in [Range]:
+        elif isinstance(x, Range):
             s += "\n"
         else:
             s += "???\n"
@@ -261,7 +386,7 @@ def build_actionsyaml(filepath, farm):
             for e in fields[fi].entities:
                 s += "  " * 3 + e + ":\n"
                 for v in fields[fi].entities[e].variables:
-                    if type(fields[fi].entities[e].variables[v]) == np.ndarray:
+                    if is_array_variable(fields[fi].entities[e].variables[v]):
                         s += (
                             "  " * 4
                             + v
@@ -0,0 +1,470 @@
+import copy
+import os
+import traceback
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from gymnasium.error import ClosedEnvironmentError
+from gymnasium.spaces import Box, Dict, MultiBinary, Tuple
+from gymnasium.vector import AutoresetMode, VectorEnv
+from gymnasium.vector.utils import batch_space
+
+from farmgym.v2.batch import FarmBatch
+from farmgym.v2.entity_api import Range, RangeArray, is_array_variable
+from farmgym.v2.make_farm import farm_factory
+
+
+def observation_key(fi_key, e_key, variable_key, path):
+    """
+    Key of an observation in the `ObservationEncoder`, the same for free observations
+    and observations made by a farmer.
+    """
+    return (fi_key, e_key, variable_key, tuple(path))
+
+
+def flat_values(x):
+    """
+    Returns the values of a variable (or part of a variable) as a flat list of numbers,
+    in the order of `gym_observe_variable`: continuous values are given as is, values of
+    list ranges as their index in the range (-1 if there is none).
+    """
+    if isinstance(x, dict):
+        return [v for k in x for v in flat_values(x[k])]
+    if isinstance(x, RangeArray):
+        return x.values.ravel().tolist()
+    if is_array_variable(x):
+        return [v for xx in x.flat for v in flat_values(xx)]
+    if isinstance(x, Range):
+        if x.codes is None:
+            return [x.value]
+        return [x.codes.get(x.value, -1)]
+    return [x]
+
+
+class ObservationEncoder:
+    """
+    Encodes farmgym observations into fixed-size arrays.
+
+    Each observation a farm may output (the free observations and all the farmgym
+    observation-actions) is given a fixed slot in a flat vector of values. An encoded
+    observation is a dict with the vector ``"values"`` and a ``"mask"`` telling which
+    slots have actually been observed, so that all observations of a farm share the same
+    `observation_space`. Observations that are not part of the farm configuration (such
+    as outputs of interventions) are ignored.
+    """
+
+    def __init__(self, farm):
+        self.farm = farm
+        self.slots = {}
+        size = 0
+        for fa_key, fi_key, e_key, variable_key, path in (
+            farm.rules.free_observations + list(farm.farmgym_observation_actions)
+        ):
+            key = observation_key(fi_key, e_key, variable_key, path)
+            if key not in self.slots:
+                n = len(flat_values(self.variable(key)))
+                self.slots[key] = slice(size, size + n)
+                size += n
+        self.size = size
+        self.observation_space = Dict(
+            {
+                "values": Box(
+                    low=-np.inf, high=np.inf, shape=(size,), dtype=np.float64
+                ),
+                "mask": MultiBinary(size),
+            }
+        )
+
+    def variable(self, key):
+        fi_key, e_key, variable_key, path = key
+        x = self.farm.fields[fi_key].entities[e_key].variables[variable_key]
+        for p in path:
+            x = x[p]
+        return x
+
+    def encode_into(self, farmgym_observations, values, mask):
+        """
+        Writes the encoding of `farmgym_observations` into the arrays `values` and
+        `mask`, of size `self.size`.
+        """
+        mask[:] = 0
+        for fa_key, fi_key, e_key, variable_key, path, value in farmgym_observations:
+            key = observation_key(fi_key, e_key, variable_key, path)
+            if key in self.slots:
+                values[self.slots[key]] = flat_values(self.variable(key))
+                mask[self.slots[key]] = 1
+
+    def encode(self, farmgym_observations):
+        values = np.zeros(self.size)
+        mask = np.zeros(self.size, dtype=np.int8)
+        self.encode_into(farmgym_observations, values, mask)
+        return {"values": values, "mask": mask}
+
+
+def reset_seeds(seed, num_envs):
+    """
+    Seeds of the `num_envs` farms from the `seed` given to `reset`: an integer (then
+    used for the first farm, the next ones using the following integers), a list, or
+    None.
+    """
+    if seed is None or isinstance(seed, int):
+        return [None if seed is None else seed + i for i in range(num_envs)]
+    assert len(seed) == num_envs, "One seed per farm is required."
+    return list(seed)
+
+
+# Arrays holding the outputs of a vector env: name, dtype and whether there is one value
+# per observation slot.
+BUFFERS = [
+    ("values", np.float64, True),
+    ("masks", np.int8, True),
+    ("rewards", np.float64, False),
+    ("terminations", np.bool_, False),
+    ("truncations", np.bool_, False),
+]
+
+
+def buffer_shape(num_envs, size, per_slot):
+    return (num_envs, size) if per_slot else (num_envs,)
+
+
+class FarmVectorEnv(VectorEnv):
+    """
+    Gymnasium vector environment running `num_envs` copies of one farm in lockstep, in
+    the current process.
+    The state of the farms is stacked along a leading batch axis (see
+    :class:`~farmgym.v2.batch.FarmBatch`), so that each entity type with a vectorized
+    update (soils, plants, ...) is updated once per step for all farms.
+
+    Parameters
+    ----------
+    make_env: a callable or a string,
+        a callable without argument returning a new :class:`~farmgym.v2.farm.Farm`, or
+        the path to a farm yaml file, built with :func:`~farmgym.v2.make_farm.make_farm`.
+
+    num_envs: an integer,
+        number of farms.
+
+    buffers: a dict of arrays, optional
+        Arrays (as named in `BUFFERS`) to write outputs into, instead of allocating new
+        ones. Used by the workers of :class:`AsyncFarmVectorEnv`.
+
+    Notes
+    -----
+    Observations are encoded into fixed-size arrays by an :class:`ObservationEncoder`,
+    and batched along the first axis. Actions are given as a sequence of `num_envs` gym
+    actions of the farm.
+    Each farm follows exactly the trajectory it would follow alone: it keeps its own
+    random generator, and entities whose update is not vectorized over plots (weather,
+    weeds, pests, ...) are updated farm by farm.
+    A farm that terminates (or is truncated) is reset at the next call to `step`, which
+    then returns its first observation with reward 0 (gymnasium "next step" autoreset).
+    """
+
+    metadata = {"autoreset_mode": AutoresetMode.NEXT_STEP}
+
+    def __init__(self, make_env, num_envs, buffers=None):
+        make_env = farm_factory(make_env)
+        self.farms = [make_env() for _ in range(num_envs)]
+        self.batch = FarmBatch(self.farms)
+        self.num_envs = num_envs
+        self.encoders = [ObservationEncoder(farm) for farm in self.farms]
+        self.encoder = self.encoders[0]
+
+        self.single_observation_space = self.encoder.observation_space
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+        self.single_action_space = self.farms[0].action_space
+        self.action_space = Tuple([farm.action_space for farm in self.farms])
+
+        for name, dtype, per_slot in BUFFERS:
+            if buffers is None:
+                shape = buffer_shape(num_envs, self.encoder.size, per_slot)
+                setattr(self, name, np.zeros(shape, dtype=dtype))
+            else:
+                setattr(self, name, buffers[name])
+        self.autoreset = np.zeros(num_envs, dtype=bool)
+
+    def observations(self):
+        return {"values": self.values.copy(), "mask": self.masks.copy()}
+
+    def _reset(self, seeds, options=None):
+        """
+        Resets all farms with their `seeds`, writing outputs in the buffers. Returns the
+        list of infos of the farms.
+        """
+        infos = []
+        for i, farm in enumerate(self.farms):
+            observations, info = farm.farmgym_reset(seeds[i], options)
+            self.batch.restack(i)
+            self.encoders[i].encode_into(observations, self.values[i], self.masks[i])
+            infos.append(info)
+        self.rewards[:] = 0.0
+        self.terminations[:] = False
+        self.truncations[:] = False
+        self.autoreset[:] = False
+        return infos
+
+    def _step(self, actions):
+        """
+        Steps (or autoresets) all farms, writing outputs in the buffers. Returns the
+        list of infos of the farms.
+        """
+        stepped = ~self.autoreset
+        action_schedules = [
+            farm.gymaction_to_discretized_farmgymaction(action) if stepped[i] else []
+            for i, (farm, action) in enumerate(zip(self.farms, actions))
+        ]
+        is_pomdp = self.farms[0].interaction_mode == "POMDP"
+        if is_pomdp:
+            self.batch.farmgym_step([[] for _ in self.farms], stepped)
+        outputs = self.batch.farmgym_step(action_schedules, stepped)
+
+        infos = []
+        for i, farm in enumerate(self.farms):
+            if self.autoreset[i]:
+                observations, info = farm.farmgym_reset()
+                self.batch.restack(i)
+                self.rewards[i] = 0.0
+                self.terminations[i] = False
+                self.truncations[i] = False
+            else:
+                (
+                    observations,
+                    self.rewards[i],
+                    self.terminations[i],
+                    self.truncations[i],
+                    info,
+                ) = outputs[i]
+                if is_pomdp:
+                    observations = farm.get_free_observations()
+            self.encoders[i].encode_into(observations, self.values[i], self.masks[i])
+            infos.append(info)
+        self.autoreset[:] = self.terminations | self.truncations
+        return infos
+
+    def _vector_infos(self, infos):
+        vector_infos = {}
+        for i, info in enumerate(infos):
+            vector_infos = self._add_info(vector_infos, info, i)
+        return vector_infos
+
+    def reset(self, seed=None, options=None):
+        infos = self._reset(reset_seeds(seed, self.num_envs), options)
+        return self.observations(), self._vector_infos(infos)
+
+    def step(self, actions):
+        infos = self._step(actions)
+        return (
+            self.observations(),
+            self.rewards.copy(),
+            self.terminations.copy(),
+            self.truncations.copy(),
+            self._vector_infos(infos),
+        )
+
+
+def shared_buffers(memories, num_envs, size):
+    """
+    Returns the arrays of `BUFFERS` backed by the shared memory blocks `memories`.
+    """
+    return {
+        name: np.ndarray(
+            buffer_shape(num_envs, size, per_slot), dtype=dtype, buffer=memory.buf
+        )
+        for (name, dtype, per_slot), memory in zip(BUFFERS, memories)
+    }
+
+
+def async_worker(make_env, start, stop, num_envs, size, memories, connection):
+    """
+    Worker process of :class:`AsyncFarmVectorEnv`, running the farms `start` to `stop`
+    and writing their outputs in shared memory.
+    """
+    try:
+        buffers = shared_buffers(memories, num_envs, size)
+        env = FarmVectorEnv(
+            make_env,
+            stop - start,
+            buffers={name: array[start:stop] for name, array in buffers.items()},
+        )
+        connection.send(("ok", None))
+        while True:
+            command, data = connection.recv()
+            if command == "reset":
+                connection.send(("ok", env._reset(*data)))
+            elif command == "step":
+                connection.send(("ok", env._step(data)))
+            elif command == "close":
+                break
+    except Exception:
+        connection.send(("error", traceback.format_exc()))
+    finally:
+        buffers = env = None
+        for memory in memories:
+            memory.close()
+        connection.close()
+
+
+class AsyncFarmVectorEnv(FarmVectorEnv):
+    """
+    Gymnasium vector environment running `num_envs` farms in `num_workers` subprocesses,
+    each owning several farms.
+
+    Parameters
+    ----------
+    make_env: a callable or a string,
+        a picklable callable without argument returning a new
+        :class:`~farmgym.v2.farm.Farm` (e.g. a module-level function), or the path to a
+        farm yaml file.
+
+    num_envs: an integer,
+        number of farms.
+
+    num_workers: an integer, optional
+        number of worker processes, the number of CPUs by default.
+
+    context: a string, optional
+        multiprocessing start method ("fork", "spawn", "forkserver"), the platform
+        default if None.
+
+    Notes
+    -----
+    Workers write encoded observations, rewards and termination flags directly into
+    `multiprocessing.shared_memory` arrays, only actions and infos go through pipes.
+    Behaves as :class:`FarmVectorEnv` otherwise.
+    If a worker fails, the environment is closed (all workers are shut down) and the
+    error of the worker is raised; any later call to `reset` or `step` raises a
+    `ClosedEnvironmentError`.
+    """
+
+    def __init__(self, make_env, num_envs, num_workers=None, context=None):
+        # One farm is built in this process, only to define spaces.
+        farm = farm_factory(make_env)()
+        self.num_envs = num_envs
+        self.encoder = ObservationEncoder(farm)
+        self.single_observation_space = self.encoder.observation_space
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+        self.single_action_space = farm.action_space
+        self.action_space = Tuple(
+            [copy.deepcopy(farm.action_space) for _ in range(num_envs)]
+        )
+
+        self.memories = [
+            SharedMemory(
+                create=True,
+                size=max(
+                    1,
+                    int(np.prod(buffer_shape(num_envs, self.encoder.size, per_slot)))
+                    * np.dtype(dtype).itemsize,
+                ),
+            )
+            for name, dtype, per_slot in BUFFERS
+        ]
+        for name, array in shared_buffers(
+            self.memories, num_envs, self.encoder.size
+        ).items():
+            setattr(self, name, array)
+
+        num_workers = min(num_envs, num_workers or os.cpu_count() or 1)
+        self.bounds = [
+            (int(r[0]), int(r[-1]) + 1)
+            for r in np.array_split(np.arange(num_envs), num_workers)
+        ]
+        ctx = get_context(context)
+        self.connections = []
+        self.processes = []
+        for start, stop in self.bounds:
+            parent_connection, child_connection = ctx.Pipe()
+            process = ctx.Process(
+                target=async_worker,
+                args=(
+                    make_env,
+                    start,
+                    stop,
+                    num_envs,
+                    self.encoder.size,
+                    self.memories,
+                    child_connection,
+                ),
+                daemon=True,
+            )
+            process.start()
+            child_connection.close()
+            self.connections.append(parent_connection)
+            self.processes.append(process)
+        self._receive()
+
+    def _assert_is_running(self):
+        if self.closed:
+            raise ClosedEnvironmentError(
+                "[Farmgym Error] Trying to operate on AsyncFarmVectorEnv after it was"
+                " closed, either by a call to `close` or after a worker failed."
+            )
+
+    def _send(self, command, data):
+        self._assert_is_running()
+        try:
+            for (start, stop), connection in zip(self.bounds, self.connections):
+                connection.send((command, data(start, stop)))
+        except OSError:  # Including BrokenPipeError, when a worker died.
+            self.close(terminate=True)
+            raise RuntimeError(
+                "[Farmgym Error] AsyncFarmVectorEnv worker exited unexpectedly."
+                " The environment has been closed."
+            )
+
+    def _receive(self):
+        infos = []
+        errors = []
+        for connection in self.connections:
+            try:
+                status, data = connection.recv()
+            except (EOFError, OSError):
+                status, data = "error", "Worker exited unexpectedly.\n"
+            if status == "error":
+                errors.append(data)
+            elif data is not None:
+                infos += data
+        if errors:
+            # As in gymnasium's AsyncVectorEnv, a failure shuts down all workers.
+            self.close(terminate=True)
+            raise RuntimeError(
+                "[Farmgym Error] AsyncFarmVectorEnv worker failed, the environment"
+                " has been closed:\n" + errors[0]
+            )
+        return infos
+
+    def _reset(self, seeds, options=None):
+        self._send("reset", lambda start, stop: (seeds[start:stop], options))
+        return self._receive()
+
+    def _step(self, actions):
+        self._send("step", lambda start, stop: list(actions[start:stop]))
+        return self._receive()
+
+    def close_extras(self, terminate=False, **kwargs):
+        """
+        Shuts down the workers, asking them to stop (or terminating them at once if
+        `terminate`), and frees shared memory.
+        """
+        for connection, process in zip(self.connections, self.processes):
+            if process.is_alive() and not terminate:
+                try:
+                    connection.send(("close", None))
+                except OSError:
+                    pass
+            process.join(timeout=0 if terminate else 5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            connection.close()
+        for name, dtype, per_slot in BUFFERS:
+            setattr(self, name, None)
+        for memory in self.memories:
+            memory.close()
+            memory.unlink()
+
+    def __del__(self):
+        if not getattr(self, "closed", True) and hasattr(self, "memories"):
+            self.close()
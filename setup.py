@@ -18,7 +18,7 @@ setup(
     version=__version__,  # noqa: F821
     packages=packages,
     install_requires=[
-        "gymnasium",
+        "gymnasium>=1.1",
         "numpy",
         "pillow",
         "scipy",
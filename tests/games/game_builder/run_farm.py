@@ -42,13 +42,13 @@ def run_gym_xp(farm: object, agent: object, max_steps: object = np.infty, render
         os.chdir("../")
 
 
-def run_policy_xp(farm, policy, max_steps=np.infty):
+def run_policy_xp(farm, policy, max_steps=np.infty, seed=None):
     if farm.monitor is not None:
         farm.monitor = None
     cumreward = 0.0
     cumcost = 0.0
     policy.reset()
-    observation = farm.reset()
+    observation = farm.reset(seed=seed)
     terminated = False
     i = 0
     while (not terminated) and i <= max_steps:
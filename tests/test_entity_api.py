@@ -0,0 +1,218 @@
+import numpy as np
+
+import farmgym.v2.specifications.specification_manager as sm
+from farmgym.v2.entities import Plant, Soil, Weather
+from farmgym.v2.entities.Weather import irradiance_perday
+from farmgym.v2.entity_api import (
+    Condition,
+    Range,
+    RangeArray,
+    checkissubclass,
+    expglm,
+    fillarray,
+)
+from farmgym.v2.field import Field
+
+
+def test_fillarray_is_array_backed():
+    ar = fillarray(2, 3, (0, 10), 4.0)
+    assert isinstance(ar, RangeArray)
+    assert ar.shape == (2, 3)
+    assert ar.values.dtype == np.float64
+    assert np.all(ar.values == 4.0)
+
+
+def test_rangearray_single_plot_access():
+    ar = fillarray(2, 2, (0, 10), 0.0)
+    plot = ar[1, 0]
+    assert isinstance(plot, Range)
+    plot.set_value(20.0)
+    assert ar[1, 0].value == 10
+    assert ar.values[1, 0] == 10
+    assert ar.values[0, 0] == 0.0
+
+
+def test_rangearray_vectorized_writes_are_clamped():
+    ar = fillarray(2, 2, (0, 10), 0.0)
+    ar.set_values(np.array([[-1.0, 5.0], [12.0, 3.0]]))
+    assert ar.values.tolist() == [[0.0, 5.0], [10.0, 3.0]]
+    ar.set_values(7.0, ar.values > 4)
+    assert ar.values.tolist() == [[0.0, 7.0], [7.0, 3.0]]
+
+
+def test_rangearray_categorical():
+    ar = fillarray(1, 2, ["a", "b", "c"], "b")
+    assert ar[0, 0].value == "b"
+    ar[0, 1].set_value("c")
+    ar[0, 0].set_value("z")
+    assert ar[0, 0].value == "b"
+    assert ar[0, 1].value == "c"
+    assert ar[0, 1].gym_value() == 2
+
+
+def test_categorical_values_are_int_codes():
+    stages = ["none", "seed", "grow", "fruit"]
+    ar = fillarray(2, 2, stages, "seed")
+    assert ar.values.dtype == np.int8
+    assert np.all(ar.values == 1)
+    ar[1, 1].set_value("fruit")
+    assert ar.isin("fruit").tolist() == [[False, False], [False, True]]
+    assert ar.isin("seed", "fruit").all()
+    ar.set_values(np.array([["grow", "unknown"], ["none", "none"]], dtype=object))
+    assert ar.decode(ar.values).tolist() == [["grow", "seed"], ["none", "none"]]
+
+
+def test_range_list_lookup():
+    day = Range(list(range(365)), 0)
+    day.set_value(42)
+    assert day.value == 42
+    assert day.gym_value() == 42
+    day.set_value(400)
+    assert day.value == 42
+    day.set_value([1, 2])
+    assert day.value == 42
+
+
+def test_condition_matches_expglm():
+    p = {"theta_0": 0.3, "theta_T": 0.8, "T_min": 11, "T_max": 38, "tol": 0.1}
+    condition = Condition(
+        p,
+        "theta_0",
+        [("theta_T", "T_min", "T_max"), (np.inf, -np.inf, "tol"), (2.0, 0, np.inf)],
+    )
+    temperatures = np.array([[5.0, 20.0], [40.0, 11.0]])
+    amounts = np.array([[0.0, 0.5], [0.1, 0.0]])
+    values = condition.expglm(temperatures, amounts, 1.5)
+    assert values.shape == (2, 2)
+    for x in range(2):
+        for y in range(2):
+            q = [
+                (0.8, temperatures[x, y], 11, 38),
+                (np.inf, amounts[x, y], -np.inf, 0.1),
+                (2.0, 1.5, 0, np.inf),
+            ]
+            assert values[x, y] == expglm(0.3, q)
+    assert condition.expglm(20.0, 0.0, 1.5) == expglm(0.3, [(0.8, 20.0, 11, 38)])
+
+
+class CustomPlant(Plant):
+    pass
+
+
+def test_checkissubclass_follows_mro():
+    assert checkissubclass(CustomPlant, "Plant")
+    assert checkissubclass(CustomPlant, "Entity_API")
+    assert not checkissubclass(CustomPlant, "Soil")
+
+
+def test_field_entities_by_role():
+    field = Field(
+        localization={"latitude#°": 43, "longitude#°": 4, "altitude#m": 150},
+        shape={"length#nb": 1, "width#nb": 2, "scale#m": 1.0},
+        entities_specifications=[
+            (Weather, "montpellier"),
+            (Soil, "clay"),
+            (CustomPlant, "bean"),
+        ],
+    )
+    plant = field.entities["CustomPlant-0"]
+    assert field.get_entities("Plant") == [plant]
+    assert field.get_entities("CustomPlant") == [plant]
+    assert field.get_entities("Soil") == [field.entities["Soil-0"]]
+    assert field.get_entities("Birds") == []
+    assert plant.parameters == Plant(field, "bean").parameters
+
+
+def _soil_field(width):
+    return Field(
+        localization={"latitude#°": 43, "longitude#°": 4, "altitude#m": 150},
+        shape={"length#nb": 1, "width#nb": width, "scale#m": 1.0},
+        entities_specifications=[
+            (Weather, "montpellier"),
+            (Soil, "clay"),
+            (Plant, "bean"),
+        ],
+    )
+
+
+def test_soil_update_is_plotwise():
+    field = _soil_field(2)
+    singles = [_soil_field(1), _soil_field(1)]
+    for f in [field] + singles:
+        f.np_random = np.random.default_rng(0)
+        f.reset()
+        f.entities["Weather-0"].variables["rain_amount#mm.day-1"].set_value(30.0)
+    for i, water in enumerate([50.0, 400.0]):
+        field.entities["Soil-0"].variables["available_Water#L"][0, i].set_value(water)
+        single = singles[i].entities["Soil-0"]
+        single.variables["available_Water#L"][0, 0].set_value(water)
+    field.entities["Soil-0"].update_variables(field, field.entities)
+    for i, f in enumerate(singles):
+        f.entities["Soil-0"].update_variables(f, f.entities)
+        for name in ["available_Water#L", "available_N#g", "microlife_health_index#%"]:
+            assert (
+                field.entities["Soil-0"].variables[name].values[0, i]
+                == f.entities["Soil-0"].variables[name].values[0, 0]
+            )
+
+
+def test_plant_stage_transitions():
+    field = _soil_field(4)
+    field.np_random = np.random.default_rng(0)
+    field.reset()
+    plant = field.entities["Plant-0"]
+    for i, stage in enumerate(["entered_grow", "entered_fruit", "dead", "none"]):
+        plant.variables["stage"][0, i].set_value(stage)
+    plant.variables["population#nb"].set_values(np.array([[1.0, 1.0, 1.0, 0.0]]))
+    plant.variables["flowers_pollinated_per_plant#nb"][0, 1].set_value(7)
+    plant.update_variables(field, field.entities)
+    stage = plant.variables["stage"]
+    assert stage.decode(stage.values).tolist() == [["grow", "fruit", "none", "none"]]
+    assert plant.variables["size#cm"][0, 0].value == 0.1
+    assert plant.variables["fruits_per_plant#nb"][0, 1].value == 7
+
+
+def test_weather_table_matches_csv():
+    weather = _soil_field(1).entities["Weather-0"]
+    assert weather.weather_table.shape == (365, 8)
+    tables, alphas = sm.load_weather_table(weather.parameters["one_year_data_filename"])
+    for day in [0, 17, 364]:
+        for column in weather.datakeys.values():
+            expected = 0
+            for table, alpha in zip(tables, alphas):
+                expected += table[column][day] * alpha
+            assert weather.read_weathercsv(column, day) == expected
+
+
+def test_weather_forecast_slots():
+    field = _soil_field(1)
+    field.np_random = np.random.default_rng(0)
+    field.reset()
+    weather = field.entities["Weather-0"]
+    forecast = weather.variables["forecast"]["air_temperature"]["mean#°C"]
+    lookahead = weather.parameters["forecast_lookahead"]
+    assert forecast.shape == (lookahead,)
+    forecast[0].set_value(-50.0)
+    assert forecast[1].value != -50.0
+    day = weather.variables["day#int365"].value
+    weather.update_forecast(day)
+    humidity = weather.variables["forecast"]["humidity#%"]
+    # montpellier has no noise on the current day and forecast_noise=0.1 per day ahead.
+    assert humidity[0].value == weather.read_weathercsv("Humidity", day)
+    for i in range(1, lookahead):
+        expected = weather.read_weathercsv("Humidity", (day + i) % 365)
+        assert abs(humidity[i].value - expected) < i
+
+
+def test_weather_evaporation_is_cached():
+    field = _soil_field(1)
+    field.np_random = np.random.default_rng(0)
+    field.reset()
+    weather = field.entities["Weather-0"]
+    weather.variables["day#int365"].set_value(172)
+    assert weather.irradiances[172] == irradiance_perday(4, 172)
+    evaporation = weather.evaporation(field)
+    assert weather.evaporation_cache[1] == evaporation > 0
+    assert weather.evaporation(field) == evaporation
+    weather.variables["humidity#%"].set_value(weather.variables["humidity#%"].value / 2)
+    assert weather.evaporation(field) > evaporation
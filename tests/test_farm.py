@@ -1,5 +1,6 @@
 from unittest import mock
 
+import numpy as np
 import pytest
 
 from farmgym.v2.entities import (
@@ -13,9 +14,11 @@ from farmgym.v2.entities import (
     Weather,
     Weeds,
 )
-from farmgym.v2.farm import Farm
+from farmgym.v2.entity_api import variable_gym_space
+from farmgym.v2.farm import Farm, observation_gym_space
 from farmgym.v2.farmers.BasicFarmer import BasicFarmer
 from farmgym.v2.field import Field
+from farmgym.v2.planning import branch_rollouts, rollout
 from farmgym.v2.policy_api import Policy_helper
 from farmgym.v2.rendering.monitoring import (
     MonitorTensorBoard,
@@ -300,3 +303,287 @@ def test_monitor_tensorboard(mock_tf_summary, sample_farm):
 
     # Stop monitoring
     monitor.stop()
+
+
+def test_get_set_state_replays_exactly(sample_farm):
+    farm = sample_farm
+    farm.reset(seed=3)
+    water = (
+        "BasicFarmer-0",
+        "Field-0",
+        "Soil-0",
+        "water_discrete",
+        {"plot": (0, 0), "amount#L": 5.0},
+    )
+
+    def run(days):
+        outputs = []
+        for _ in range(days):
+            farm.farmgym_step([])
+            _, reward, terminated, _, _ = farm.farmgym_step([water])
+            outputs.append((reward, terminated, str(farm.fields["Field-0"])))
+        return outputs
+
+    run(10)
+    farm.farmgym_step([])
+    state = farm.get_state()
+    assert not state["is_new_day"]
+    _, reward, _, _, _ = farm.farmgym_step([water])
+    expected = [reward] + run(30)
+    farm.reset(seed=4)
+    farm.set_state(state)
+    _, reward, _, _, _ = farm.farmgym_step([water])
+    assert [reward] + run(30) == expected
+
+
+def test_branch_rollouts(sample_farm):
+    farm = sample_farm
+    farm.reset(seed=5)
+    for _ in range(5):
+        farm.farmgym_step([])
+        farm.farmgym_step([])
+    state = farm.get_state()
+    water = (
+        "BasicFarmer-0",
+        "Field-0",
+        "Soil-0",
+        "water_discrete",
+        {"plot": (0, 0), "amount#L": 5.0},
+    )
+    candidates = [[], [water], []]
+    before = str(farm.fields["Field-0"])
+    results = branch_rollouts(farm, candidates, horizon=20, nb_rollouts=3, seed=1)
+    assert str(farm.fields["Field-0"]) == before
+    assert farm.get_state()["np_random"] == state["np_random"]
+    assert [len(r["rewards"]) for r in results] == [3, 3, 3]
+    # Common random numbers: identical candidates have identical rollouts.
+    assert results[0]["rewards"].tolist() == results[2]["rewards"].tolist()
+
+    seeds = np.random.SeedSequence(1).spawn(3)
+    farm.set_state(state)
+    farm.np_random.bit_generator.state = np.random.PCG64(seeds[2]).state
+    assert rollout(farm, [water], 20) == results[1]["rewards"][2]
+    assert results[1]["mean"] == np.mean(results[1]["rewards"])
+
+
+def test_discretized_action_decoding(sample_farm):
+    farm = sample_farm
+    n = farm.count_farmgym_intervention_actions()
+    assert farm.discretized_action_ends[-1] == n
+    ll = len(farm.farmgym_observation_actions)
+    offsets = {}
+    start = 0
+    for (fa, fi, e, a, f_a, g, ng), end in zip(
+        farm.farmgym_intervention_actions, farm.discretized_action_ends
+    ):
+        offsets[(e, a)] = ll + start
+        assert end == start + ng
+        start = end
+
+    sow = offsets[("Plant-0", "sow")] + 4 * 3 + 2
+    water = offsets[("Soil-0", "water_continuous")] + 6
+    harvest = offsets[("Plant-0", "harvest")]
+    nbins = farm.discretization_nbins
+    assert farm.gymaction_to_discretized_farmgymaction([sow, water, harvest]) == [
+        (
+            "BasicFarmer-0",
+            "Field-0",
+            "Plant-0",
+            "sow",
+            {"plot": (0, 0), "amount#seed": 10, "spacing#cm": 15},
+        ),
+        (
+            "BasicFarmer-0",
+            "Field-0",
+            "Soil-0",
+            "water_continuous",
+            {"plot": (0, 0), "amount#L": pytest.approx(6 / (nbins + 1) * 20.0)},
+        ),
+        ("BasicFarmer-0", "Field-0", "Plant-0", "harvest", {}),
+    ]
+
+    batch = [list(range(i, ll + n, 5)) for i in range(5)] + [[]]
+    assert farm.gymactions_to_discretized_farmgymactions(batch) == [
+        farm.gymaction_to_discretized_farmgymaction(actions) for actions in batch
+    ]
+
+
+def test_discretized_action_encoding(sample_farm):
+    farm = sample_farm
+    n = len(farm.farmgym_observation_actions)
+    n += farm.count_farmgym_intervention_actions()
+    for i in range(n):
+        action = farm.gymaction_to_discretized_farmgymaction([i])
+        assert farm.discretized_farmgymaction_to_gymaction(action) == [i]
+
+    helper = Policy_helper(farm)
+    observe = helper.create_plant_observe().api.triggered_observations[0][1][0]
+    water = helper.create_water_soil(amount=5).api.triggered_interventions[0][1][0]
+    actions = [observe, water["action"]]
+    gym_actions = farm.discretized_farmgymaction_to_gymaction(actions)
+    assert len(gym_actions) == 2
+    assert farm.gymaction_to_discretized_farmgymaction(gym_actions) == actions
+
+    unknown = (
+        "BasicFarmer-0",
+        "Field-0",
+        "Soil-0",
+        "water_discrete",
+        {"plot": (3, 3), "amount#L": 5},
+    )
+    assert farm.discretized_farmgymaction_to_gymaction([unknown]) == []
+
+
+def test_observation_actions_are_lazy(sample_farm):
+    farm = sample_farm
+    actions = farm.farmgym_observation_actions
+    listed = list(actions)
+    assert len(listed) == len(actions)
+    assert actions[-1] == listed[-1]
+    assert actions[2:40:3] == listed[2:40:3]
+    assert actions.decode([7, 0, 7]) == [listed[7], listed[0], listed[7]]
+    for i, action in enumerate(listed):
+        assert actions.index(action) == i
+    outside = ("BasicFarmer-0", "Field-0", "Soil-0", "depth#m", [(5, 5)])
+    assert actions.position(outside) is None
+
+    forecast = ("BasicFarmer-0", "Field-0", "Weather-0", "forecast")
+    mean = forecast + (("air_temperature", "mean#°C"),)
+    groups = [g for g in actions.groups if g[:5] == mean]
+    assert len(groups) == 1 and groups[0][5] == ["*", 0, 1, 2, 3, 4]
+    assert actions.index(forecast + (["air_temperature", "mean#°C", 3],)) == (
+        actions.index(forecast + (["air_temperature", "mean#°C"],)) + 4
+    )
+
+
+def test_observation_spaces_are_lazy(sample_farm):
+    farm = sample_farm
+    spaces = farm.observation_space.spaces
+    actions = farm.farmgym_observation_actions
+    free = farm.rules.free_observations
+    assert len(spaces) == len(free) + len(actions)
+    assert spaces.spaces == {}
+
+    mean = ["air_temperature", "mean#°C"]
+    forecast = ("BasicFarmer-0", "Field-0", "Weather-0", "forecast")
+    a = spaces[len(free) + actions.index(forecast + (mean + [0],))]
+    b = spaces[len(free) + actions.index(forecast + (mean + [3],))]
+    assert len(spaces.spaces) == 2
+    a = a["BasicFarmer-0"]["Field-0"]["Weather-0"]["forecast"][str(mean + [0])]
+    b = b["BasicFarmer-0"]["Field-0"]["Weather-0"]["forecast"][str(mean + [3])]
+    assert a is b
+
+    for observation, space in zip(free + list(actions), spaces):
+        variable = spaces.variable(observation[:5])
+        assert space == observation_gym_space(observation, variable_gym_space(variable))
+    assert farm.observation_space.sample() is not None
+
+
+def test_action_mask(sample_farm):
+    farm = sample_farm
+    farm.reset(seed=0)
+    ll = len(farm.farmgym_observation_actions)
+    mask = farm.action_mask()
+    assert mask.shape == (farm.action_space.space.n,)
+    assert mask[:ll].all() and not mask[ll:].any()
+
+    farm.farmgym_step([])
+    plant = farm.fields["Field-0"].entities["Plant-0"]
+
+    def allowed(name):
+        actions = farm.gymaction_to_discretized_farmgymaction(
+            np.flatnonzero(farm.action_mask())
+        )
+        return ("BasicFarmer-0", "Field-0", "Plant-0", name) in [a[:4] for a in actions]
+
+    plant.variables["stage"][0, 0].set_value("grow")
+    assert not farm.action_mask()[:ll].any()
+    assert not allowed("sow") and not allowed("micro_harvest") and allowed("remove")
+    plant.variables["stage"][0, 0].set_value("fruit")
+    assert not allowed("sow") and allowed("micro_harvest")
+    plant.variables["stage"][0, 0].set_value("none")
+    assert allowed("sow") and not allowed("micro_harvest")
+
+    mask = farm.action_mask()
+    for actions in [farm.action_space.sample(mask=mask) for _ in range(20)]:
+        assert all(mask[i] for i in actions)
+
+    farm.farmers["BasicFarmer-0"].nb_interventions_in_day = 1
+    assert not farm.action_mask().any()
+    assert farm.action_space.sample(mask=farm.action_mask()) == []
+
+
+def test_masked_samples_fit_remaining_interventions(sample_farm):
+    farm = sample_farm
+    farm.reset(seed=0)
+    farm.farmgym_step([])
+    farmer = farm.farmers["BasicFarmer-0"]
+    farmer.max_daily_interventions = 3
+    farm.action_space.maxnonzero = 5
+    for done, remaining in [(0, 3), (1, 2), (2, 1)]:
+        farmer.nb_interventions_in_day = done
+        assert farm.remaining_actions() == remaining
+        mask = (farm.remaining_actions(), farm.action_mask())
+        sizes = [len(farm.action_space.sample(mask=mask)) for _ in range(50)]
+        assert max(sizes) == remaining
+
+
+def test_is_allowed_action(sample_farm):
+    rules = sample_farm.rules
+    farmer = ("BasicFarmer-0", "Field-0")
+    water = farmer + ("Soil-0", "water_discrete", {"plot": (0, 0), "amount#L": 5})
+    assert rules.is_allowed_action(water, False)
+    assert not rules.is_allowed_action(water, True)
+    assert not rules.is_allowed_action(farmer + ("Soil-0", "dig", {}), False)
+
+    soil = [a for a in sample_farm.farmgym_observation_actions if a[2] == "Soil-0"]
+    assert len(soil) > 0
+    for action in soil:
+        assert rules.is_allowed_action(action, True)
+        assert not rules.is_allowed_action(action, False)
+    temperature = farmer + ("Weather-0", "air_temperature")
+    assert rules.is_allowed_action(temperature + ([],), True)
+    assert rules.is_allowed_action(temperature + (["min#°C"],), True)
+    assert not rules.is_allowed_action(temperature + (["median#°C"],), True)
+    stage = farmer + ("Plant-0", "stage")
+    assert rules.is_allowed_action(stage + ([(0, 0)],), True)
+    assert not rules.is_allowed_action(stage + ([(1, 0)],), True)
+    assert not rules.is_allowed_action(("Nobody",) + stage[1:] + ([],), True)
+
+
+def test_terminal_conditions(sample_farm, capsys):
+    farm = sample_farm
+    rules = farm.rules
+    farm.reset(seed=0)
+    weather = farm.fields["Field-0"].entities["Weather-0"]
+
+    def condition(variable, function, operator, value):
+        return {
+            "state_variable": ["Field-0"] + variable + [[]],
+            "function": function,
+            "operator": operator,
+            "ref_value": value,
+        }
+
+    day = condition(["Weather-0", "day#int365"], "value", ">=", 200)
+    dead = condition(["Plant-0", "global_stage"], "value", "ni", "ea")
+    missing = condition(["Plant-1", "global_stage"], "value", "==", "dead")
+    water = condition(["Soil-0", "available_Water#L"], "sum", "<", 0)
+    rules.terminal_CNF_conditions = [[day, missing], [dead, water]]
+    rules.compile_terminal_conditions(farm.fields)
+    assert "[Farmgym Warning] Terminal condition" in capsys.readouterr().out
+    assert [len(clause) for clause in rules.terminal_conditions] == [1, 2]
+
+    weather.variables["day#int365"].set_value(150)
+    assert not rules.is_terminal(farm.fields)
+    weather.variables["day#int365"].set_value(250)
+    assert rules.is_terminal(farm.fields)
+
+    rules.terminal_CNF_conditions = [[dead], [missing]]
+    rules.compile_terminal_conditions(farm.fields)
+    assert not rules.terminal_conditions[0][0]()
+    plant = farm.fields["Field-0"].entities["Plant-0"]
+    plant.variables["global_stage"].set_value("dead")
+    assert rules.terminal_conditions[0][0]()
+    # A clause whose conditions are all ignored is true.
+    assert rules.terminal_conditions[1] == []
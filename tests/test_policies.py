@@ -1,6 +1,25 @@
+import os
+import pickle
+
+import numpy as np
 import pytest
 
-from farmgym.v2.policy_api import Policy_API
+from farmgym.v2.policy_api import (
+    CombinedPolicy,
+    ObservationIndex,
+    Policy_API,
+    aggregate,
+    day_modulo,
+    evaluate_policy,
+    membership,
+    run_policy_xp,
+    threshold,
+)
+from farmgym.v2.make_farm import make_farm
+
+FARM0 = os.path.join(
+    os.path.dirname(__file__), "games", "game_catalogue", "farm0", "farm0.yaml"
+)
 
 
 @pytest.fixture
@@ -232,3 +251,129 @@ def test_or_condition_all_true(or_conditions_policy):
     for trigger, actions in policy.triggered_interventions:
         trigger_on = policy.is_trigger_on(trigger, obs)
     assert trigger_on, "Both conditions are verified, should trigger"
+
+
+def test_observation_index():
+    obs = [
+        ("Free", "Field-0", "Weather-0", "day#int365", [], 360),
+        ("BasicFarmer-0", "Field-0", "Weeds-0", "grow#nb", [(0, 0)], 1),
+        ("BasicFarmer-0", "Field-0", "Weeds-0", "grow#nb", [(0, 0)], 3),
+    ]
+    index = ObservationIndex(obs)
+    assert index == obs
+    assert index.values[("Field-0", "Weather-0", "day#int365", ())] == [360]
+    assert index.values[("Field-0", "Weeds-0", "grow#nb", ((0, 0),))] == [1, 3]
+
+
+def test_repeated_observations(single_condition_policy, or_conditions_policy):
+    obs = [
+        ("Free", "Field-0", "Weather-0", "day#int365", [], 361),
+        ("BasicFarmer-0", "Field-0", "Weeds-0", "grow#nb", [(0, 0)], 3),
+        ("BasicFarmer-0", "Field-0", "Weeds-0", "grow#nb", [(0, 0)], 1),
+    ]
+    index = ObservationIndex(obs)
+    for policy in [single_condition_policy, or_conditions_policy]:
+        for trigger, actions in policy.triggered_interventions:
+            # All observations of the variable must satisfy the condition.
+            assert not policy.is_trigger_on(trigger, obs)
+            assert not policy.is_trigger_on(trigger, index)
+
+
+def test_delayed_actions():
+    actions = [{"action": "a", "delay": 2}, {"action": "b", "delay": 0}]
+    policy = Policy_API([], [([[]], actions)])
+    schedules = [policy.intervention_schedule([]) for _ in range(4)]
+    # Actions due the same day come out most recently triggered first.
+    assert schedules == [["b"], ["b"], ["b", "a"], ["b", "a"]]
+    assert [a["delay"] for a in actions] == [2, 0]
+    policy.reset()
+    assert policy.intervention_schedule([]) == ["b"]
+
+
+def test_declarative_policy_serialization(tmp_path, and_conditions_policy):
+    weeds = ("Field-0", "Weeds-0", "grow#nb", [(0, 0)])
+    harvest = (
+        [[membership(("Field-0", "Plant-0", "stage", [(0, 0)]), ["fruit"])]],
+        [
+            {
+                "action": ("BasicFarmer-0", "Field-0", "Plant-0", "harvest", {}),
+                "delay": 1,
+            }
+        ],
+    )
+    remove = (
+        [[threshold(weeds, 2.0), day_modulo(5)]],
+        [
+            {
+                "action": (
+                    "BasicFarmer-0",
+                    "Field-0",
+                    "Weeds-0",
+                    "remove",
+                    {"plot": (0, 0)},
+                ),
+                "delay": 0,
+            }
+        ],
+    )
+    observe = (
+        [[aggregate(("Field-0", "Weeds-0", "grow#nb", []), "sum", ">", 1)]],
+        [("BasicFarmer-0",) + weeds],
+    )
+    policy = Policy_API([], [harvest]) + Policy_API([observe], [remove])
+    assert isinstance(policy, CombinedPolicy)
+
+    policy.save(tmp_path / "policy.yaml")
+    copies = [
+        pickle.loads(pickle.dumps(policy)),
+        Policy_API.load(tmp_path / "policy.yaml"),
+    ]
+    assert copies[1].to_dict() == policy.to_dict()
+    triggered = policy.policies[1].triggered_observations
+    assert copies[1].policies[1].triggered_observations == triggered
+
+    observations = [
+        ("BasicFarmer-0", "Field-0", "Weather-0", "day#int365", [], 10),
+        ("BasicFarmer-0", "Field-0", "Plant-0", "stage", [(0, 0)], "fruit"),
+        ("BasicFarmer-0", "Field-0", "Weeds-0", "grow#nb", [(0, 0)], 3.0),
+        ("BasicFarmer-0", "Field-0", "Weeds-0", "grow#nb", [], [[1.0, 0.5]]),
+    ]
+    for p in [policy] + copies:
+        assert p.observation_schedule(observations) == [("BasicFarmer-0",) + weeds]
+        assert p.intervention_schedule(observations) == [remove[1][0]["action"]]
+        assert p.intervention_schedule(observations) == [
+            harvest[1][0]["action"],
+            remove[1][0]["action"],
+        ]
+
+    with pytest.raises(TypeError):
+        and_conditions_policy.to_dict()
+
+
+def test_evaluate_policy():
+    water = {
+        "action": (
+            "BasicFarmer-0",
+            "Field-0",
+            "Soil-0",
+            "water_discrete",
+            {"plot": (0, 0), "amount#L": 1.0},
+        ),
+        "delay": 0,
+    }
+    policy = Policy_API([], [([[day_modulo(3)]], [water])])
+    results = evaluate_policy(FARM0, policy, 3, seed=7, max_steps=20, num_workers=2)
+    assert results["rewards"].shape == results["costs"].shape == (3,)
+    assert len(set(results["seeds"])) == 3
+    low, high = results["cost"]["ci"]
+    assert low <= results["cost"]["mean"] == results["costs"].mean() <= high
+
+    sequential = evaluate_policy(FARM0, policy, 3, seed=7, max_steps=20, num_workers=1)
+    assert np.array_equal(sequential["rewards"], results["rewards"])
+    assert np.array_equal(sequential["costs"], results["costs"])
+    farm = make_farm(FARM0)
+    reward, cost = run_policy_xp(farm, policy, 20, seed=int(results["seeds"][2]))
+    assert (reward, cost) == (results["rewards"][2], results["costs"][2])
+
+    with pytest.raises(AssertionError):
+        evaluate_policy(FARM0, policy, 0)
@@ -1,12 +1,19 @@
+import copy
 import os
+import pickle
 import re
 
+import numpy as np
+import pytest
 import yaml
 
+import farmgym.v2.specifications.specification_manager as sm
 from farmgym.v2.specifications.specification_manager import (
+    FrozenDict,
     build_actionsyaml,
     build_inityaml,
     build_scoreyaml,
+    load_weather_array,
     load_yaml,
 )
 
@@ -52,6 +59,31 @@ def test_load_yaml(tmp_path):
     assert loaded_data == "value2"
 
 
+def test_load_yaml_is_cached_and_frozen(tmp_path):
+    yaml_file = tmp_path / "test_specifications.yaml"
+    with open(yaml_file, "w") as file:
+        yaml.dump(
+            {"bean": {"size#cm": 5, "conditions": {"tol": 0.1}, "list": [1, 2]}}, file
+        )
+
+    parameters = load_yaml(str(yaml_file), "bean")
+    assert load_yaml(str(yaml_file), "bean") is parameters
+    assert parameters["list"] == (1, 2)
+    with pytest.raises(TypeError):
+        parameters["size#cm"] = 6
+    with pytest.raises(TypeError):
+        parameters["conditions"].update(tol=0.2)
+    assert copy.deepcopy(parameters) is parameters
+    assert isinstance(pickle.loads(pickle.dumps(parameters)), FrozenDict)
+    assert pickle.loads(pickle.dumps(parameters)) == parameters
+
+    # Modified files are parsed again.
+    with open(yaml_file, "w") as file:
+        yaml.dump({"bean": {"size#cm": 7}}, file)
+    os.utime(yaml_file, (0, os.stat(yaml_file).st_mtime + 10))
+    assert load_yaml(str(yaml_file), "bean") == {"size#cm": 7}
+
+
 def test_build_scoreyaml(tmp_path):
     # Create a temporary file path
     filepath = os.path.join(tmp_path, "score.yaml")
@@ -260,3 +292,21 @@ def test_build_actionsyaml(tmp_path):
     content = re.sub(r"[\n\t\s]*", "", content)
     expected_content = re.sub(r"[\n\t\s]*", "", expected_content)
     assert content == expected_content
+
+
+def test_load_weather_array_is_cached(tmp_path, monkeypatch):
+    monkeypatch.setenv("FARMGYM_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(sm, "WEATHER_ARRAYS", {})
+    filename = {"weather_data/lille.csv": 0.25, "weather_data/montpellier.csv": 0.75}
+    columns = ["Temperature", "Rain"]
+    array = load_weather_array(filename, columns)
+    assert array.shape == (365, 2)
+    assert isinstance(array, np.memmap)
+    assert not array.flags.writeable
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+    assert load_weather_array(dict(filename), columns) is array
+
+    # A fresh process reads the cached file instead of the csv files.
+    monkeypatch.setattr(sm, "WEATHER_ARRAYS", {})
+    assert np.array_equal(load_weather_array(filename, columns), array)
+    assert np.array_equal(array, sm.blend_weather_tables(filename, columns))
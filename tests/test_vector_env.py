@@ -0,0 +1,201 @@
+import os
+
+import numpy as np
+import pytest
+from gymnasium.error import ClosedEnvironmentError
+
+from farmgym.v2.batch import FarmBatch
+from farmgym.v2.entities import Birds, Pests, Plant, Pollinators, Soil, Weather, Weeds
+from farmgym.v2.entity_api import RangeArray, variable_leaves
+from farmgym.v2.farm import Farm
+from farmgym.v2.farmers.BasicFarmer import BasicFarmer
+from farmgym.v2.field import Field
+from farmgym.v2.make_farm import make_farm
+from farmgym.v2.rules.BasicRule import BasicRule
+from farmgym.v2.scorings.BasicScore import BasicScore
+from farmgym.v2.vector_env import (
+    AsyncFarmVectorEnv,
+    FarmVectorEnv,
+    ObservationEncoder,
+)
+
+FARM0 = os.path.join(
+    os.path.dirname(__file__), "games", "game_catalogue", "farm0", "farm0.yaml"
+)
+
+
+def flatten(x):
+    if isinstance(x, dict):
+        return [v for k in x for v in flatten(x[k])]
+    if isinstance(x, list):
+        return [v for xx in x for v in flatten(xx)]
+    return [x]
+
+
+def make_field_farm():
+    field = Field(
+        localization={"latitude#°": 43, "longitude#°": 4, "altitude#m": 150},
+        shape={"length#nb": 2, "width#nb": 3, "scale#m": 1.0},
+        entities_specifications=[
+            (Weather, "montpellier"),
+            (Soil, "clay"),
+            (Plant, "bean"),
+            (Pollinators, "bee"),
+            (Weeds, "base_weed"),
+            (Pests, "basic"),
+            (Birds, "base_bird"),
+        ],
+    )
+    return Farm(
+        [field],
+        [BasicFarmer(max_daily_interventions=10)],
+        BasicScore(score_configuration="test_batch_score.yaml"),
+        BasicRule(
+            init_configuration="test_batch_init.yaml",
+            actions_configuration="test_batch_actions.yaml",
+        ),
+    )
+
+
+def farm_values(farm):
+    return [
+        leaf.values.tolist() if isinstance(leaf, RangeArray) else leaf.value
+        for entity in farm.fields["Field-0"].entities.values()
+        for leaf in variable_leaves(entity.variables)
+    ]
+
+
+def test_farm_batch_matches_farms():
+    def schedule(day, i):
+        plots = [(x, y) for x in range(2) for y in range(3)]
+        if day == 0:
+            return [
+                (
+                    "BasicFarmer-0",
+                    "Field-0",
+                    "Plant-0",
+                    "sow",
+                    {"plot": p, "amount#seed": 5, "spacing#cm": 10},
+                )
+                for p in plots
+            ]
+        return [
+            (
+                "BasicFarmer-0",
+                "Field-0",
+                "Soil-0",
+                "water_discrete",
+                {"plot": plots[(day + i) % 6], "amount#L": 5.0},
+            )
+        ]
+
+    farms = [make_field_farm() for _ in range(3)]
+    expected = [make_field_farm() for _ in range(3)]
+    for i in range(3):
+        farms[i].reset(seed=i)
+        expected[i].reset(seed=i)
+    batch = FarmBatch(farms)
+    stacked = batch.fields["Field-0"].entities["Plant-0"].variables["stage"]
+    assert stacked.shape == (3, 2, 3)
+
+    for day in range(60):
+        if day == 30:
+            # Resetting a farm replaces some of its variables.
+            farms[1].reset(seed=7)
+            expected[1].reset(seed=7)
+            batch.restack(1)
+        batch.farmgym_step([[] for _ in farms])
+        outputs = batch.farmgym_step([schedule(day, i) for i in range(3)])
+        for i in range(3):
+            expected[i].farmgym_step([])
+            output = expected[i].farmgym_step(schedule(day, i))
+            assert outputs[i][1:] == output[1:]
+            assert farm_values(farms[i]) == farm_values(expected[i])
+    plant = farms[2].fields["Field-0"].entities["Plant-0"]
+    assert stacked.values[2] is not plant.variables["stage"].values
+    assert np.shares_memory(stacked.values, plant.variables["stage"].values)
+
+
+def test_observation_encoder_matches_gym_observations():
+    farm = make_farm(FARM0)
+    encoder = ObservationEncoder(farm)
+    observations, _ = farm.farmgym_reset(seed=1)
+    encoded = encoder.encode(observations)
+    assert encoded["values"].shape == (encoder.size,)
+    assert encoded["mask"].all()
+    assert encoded in encoder.observation_space
+    assert encoded["values"].tolist() == flatten(
+        farm.farmgym_to_gym_observations(observations)
+    )
+
+
+def test_vector_env_autoreset():
+    env = FarmVectorEnv(FARM0, 3)
+    observations, _ = env.reset(seed=0)
+    assert observations["values"].shape == (3, env.encoder.size)
+    first_day = observations["values"][0, 0]
+
+    farm = make_farm(FARM0)
+    farm.reset(seed=0)
+    for _ in range(400):
+        actions = [[] for _ in range(env.num_envs)]
+        observations, rewards, terminations, truncations, _ = env.step(actions)
+        _, reward, terminated, _, _ = farm.step([])
+        assert rewards[0] == reward
+        assert terminations[0] == terminated
+        if terminations.any():
+            break
+    assert terminations.all()
+
+    observations, rewards, terminations, _, _ = env.step(
+        [[] for _ in range(env.num_envs)]
+    )
+    assert np.all(observations["values"][:, 0] == first_day)
+    assert np.all(rewards == 0.0)
+    assert not terminations.any()
+
+
+def test_async_vector_env_matches_sync():
+    sync = FarmVectorEnv(FARM0, 3)
+    env = AsyncFarmVectorEnv(FARM0, 3, num_workers=2)
+    try:
+        assert env.bounds == [(0, 2), (2, 3)]
+        expected, _ = sync.reset(seed=[4, 5, 6])
+        observations, infos = env.reset(seed=[4, 5, 6])
+        assert np.array_equal(observations["values"], expected["values"])
+        assert infos["intervention cost"].tolist() == [0, 0, 0]
+        actions = [[] for _ in range(3)]
+        for _ in range(20):
+            expected = sync.step(actions)
+            outputs = env.step(actions)
+            assert np.array_equal(outputs[0]["values"], expected[0]["values"])
+            assert np.array_equal(outputs[0]["mask"], expected[0]["mask"])
+            for a, b in zip(outputs[1:4], expected[1:4]):
+                assert np.array_equal(a, b)
+    finally:
+        env.close()
+    assert env.closed
+
+
+def make_broken_farm():
+    farm = make_farm(FARM0)
+
+    def farmgym_step(action_schedule):
+        raise ValueError("Broken farm.")
+
+    farm.farmgym_step = farmgym_step
+    return farm
+
+
+def test_async_vector_env_closes_after_worker_error():
+    env = AsyncFarmVectorEnv(make_broken_farm, 3, num_workers=2)
+    env.reset(seed=0)
+    with pytest.raises(RuntimeError, match="Broken farm."):
+        env.step([[] for _ in range(3)])
+    assert env.closed
+    assert not any(process.is_alive() for process in env.processes)
+    with pytest.raises(ClosedEnvironmentError):
+        env.step([[] for _ in range(3)])
+    with pytest.raises(ClosedEnvironmentError):
+        env.reset(seed=0)
+    env.close()